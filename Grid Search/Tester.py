@@ -1,4 +1,5 @@
 import os
+import sys
 import base64
 from io import BytesIO
 import pandas as pd
@@ -87,7 +88,8 @@ def grid_search_on_images(image_folder, param_ranges):
 
 # Configurações e execução
 if __name__ == "__main__":
-    image_folder = r'C:/Users/IsraelAntunes/Desktop/Scrape-Art/Grid Search/images'  # Ajuste para o caminho correto
+    # Pasta de imagens rotuladas: primeiro argumento ou a pasta images ao lado deste script
+    image_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
     param_ranges = {
         "th1": range(185, 190, 5),
         "th2": range(145, 160, 5),
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from storage import _comprimir, _descomprimir, zstandard
+
+# Campos cujo JSON passa deste tamanho (em bytes) vão para o armazém de blobs
+LIMIAR_BLOB = 4096
+CHAVE_BLOB = "$blob"
+BLOBS_EM_CACHE = 256
+_MAGICO_ZSTD = b"\x28\xb5\x2f\xfd"
+
+
+def _serializar(valor) -> bytes:
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def eh_referencia(valor) -> bool:
+    return type(valor) is dict and CHAVE_BLOB in valor and len(valor) == 2
+
+
+class ArmazemBlobs:
+    """ Armazém de blobs endereçado pelo conteúdo
+
+    Cada valor é gravado uma única vez, comprimido (zstd quando disponível,
+    senão gzip), em <pasta>/<2 primeiros hex>/<sha256 do JSON>. Valores
+    repetidos entre registros (o mesmo HTML ou a mesma lista de
+    movimentações) ocupam um só arquivo. A gravação usa temporário + rename,
+    então vários processos podem escrever na mesma pasta. A compressão é
+    detectada pelo conteúdo na leitura, e um armazém pode misturar as duas.
+
+    Args:
+        pasta: pasta do armazém
+        compressao: "zstd" ou "gzip", zstd por padrão quando instalado
+        limiar: campos cujo JSON passa deste tamanho, em bytes, são descarregados
+        em_cache: quantidade de blobs decodificados mantidos em memória
+    """
+
+    def __init__(self, pasta: str, compressao: str = None, limiar: int = LIMIAR_BLOB, em_cache: int = BLOBS_EM_CACHE):
+        self.pasta = pasta
+        self.limiar = limiar
+        self.compressao = compressao or ("zstd" if zstandard is not None else "gzip")
+        if self.compressao == "zstd" and zstandard is None:
+            raise ImportError("Compressão zstd requer o pacote zstandard")
+        self.em_cache = em_cache
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"pasta": self.pasta, "compressao": self.compressao, "limiar": self.limiar, "em_cache": self.em_cache}
+
+    def __setstate__(self, estado):
+        self.__init__(**estado)
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.pasta, chave[:2], chave)
+
+    def guardar(self, valor) -> dict:
+        """ Grava o valor (se ainda não existir) e devolve a referência que o substitui no registro
+
+        Returns:
+            {"$blob": sha256, "bytes": tamanho do JSON}
+        """
+        dados = _serializar(valor)
+        chave = hashlib.sha256(dados).hexdigest()
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+            with open(temporario, "wb") as f:
+                f.write(_comprimir(dados, self.compressao))
+            os.replace(temporario, caminho)
+        return {CHAVE_BLOB: chave, "bytes": len(dados)}
+
+    def carregar(self, chave: str):
+        """Valor de um blob; os mais recentes ficam em cache"""
+        with self.lock:
+            valor = self.cache.get(chave)
+            if valor is not None:
+                self.cache.move_to_end(chave)
+        if valor is None:
+            with open(self._caminho(chave), "rb") as f:
+                dados = f.read()
+            valor = json.loads(_descomprimir(dados, "zstd" if dados.startswith(_MAGICO_ZSTD) else "gzip"))
+            with self.lock:
+                self.cache[chave] = valor
+                if len(self.cache) > self.em_cache:
+                    self.cache.popitem(last=False)
+        # Listas em cache não podem ser alteradas por quem as recebe
+        return list(valor) if isinstance(valor, list) else valor
+
+    def estatisticas(self) -> dict:
+        """Quantidade de blobs e bytes em disco"""
+        blobs, total = 0, 0
+        for raiz, _, arquivos in os.walk(self.pasta):
+            for arquivo in arquivos:
+                if not arquivo.endswith(".tmp"):
+                    blobs += 1
+                    total += os.path.getsize(os.path.join(raiz, arquivo))
+        return {"blobs": blobs, "bytes": total}
+
+
+def _grande(valor, limiar: int) -> bool:
+    if isinstance(valor, str):
+        # Caracteres limitam os bytes por baixo; só serializa quando pode passar do limiar
+        return len(valor) > limiar or (len(valor) * 4 > limiar and len(_serializar(valor)) > limiar)
+    return len(_serializar(valor)) > limiar
+
+
+def descarregar_campos(valor, blobs: ArmazemBlobs, limiar: int = None):
+    """ Cópia do registro com os campos grandes trocados por referências ao armazém de blobs
+
+    Dicionários e listas de dicionários são percorridos, mantendo a estrutura
+    do registro (fontes, instâncias, envolvidos) navegável sem ler nenhum
+    blob. Textos e listas de valores simples (HTML, fragmentos,
+    movimentoDecisao) maiores que o limiar viram {"$blob": ..., "bytes": ...}.
+
+    Args:
+        valor: registro (ou parte dele)
+        blobs: armazém de destino
+        limiar: tamanho mínimo do JSON do campo, em bytes; o do armazém por padrão
+
+    Returns:
+        registro compacto
+    """
+    limiar = blobs.limiar if limiar is None else limiar
+    if eh_referencia(valor):
+        return valor
+    if isinstance(valor, dict):
+        # dict.items: num RegistroPreguicoso, os campos ainda não lidos seguem como referências
+        return {chave: descarregar_campos(item, blobs, limiar) for chave, item in dict.items(valor)}
+    if isinstance(valor, list):
+        itens = list(list.__iter__(valor))
+        if itens and all(isinstance(item, dict) for item in itens):
+            return [descarregar_campos(item, blobs, limiar) for item in itens]
+        return blobs.guardar(itens) if _grande(itens, limiar) else itens
+    if isinstance(valor, str) and _grande(valor, limiar):
+        return blobs.guardar(valor)
+    return valor
+
+
+def _resolver(valor, blobs: ArmazemBlobs):
+    if eh_referencia(valor):
+        valor = blobs.carregar(valor[CHAVE_BLOB])
+    if type(valor) is dict:
+        return RegistroPreguicoso(valor, blobs)
+    if type(valor) is list:
+        return ListaPreguicosa(valor, blobs)
+    return valor
+
+
+class RegistroPreguicoso(dict):
+    """ Registro compacto que lê cada blob só quando o campo é acessado
+
+    É um dict (isinstance continua valendo para export_parquet, merge e o
+    índice textual): __getitem__, get, values e items trocam a referência
+    pelo valor na primeira leitura e o guardam no lugar. Campos nunca lidos
+    nunca saem do disco. Para serializar o registro completo, use
+    `materializar`.
+    """
+    __slots__ = ("_blobs",)
+
+    def __init__(self, dados: dict, blobs: ArmazemBlobs):
+        super().__init__(dados)
+        self._blobs = blobs
+
+    def _valor(self, chave, valor):
+        resolvido = _resolver(valor, self._blobs)
+        if resolvido is not valor:
+            dict.__setitem__(self, chave, resolvido)
+        return resolvido
+
+    def __getitem__(self, chave):
+        return self._valor(chave, dict.__getitem__(self, chave))
+
+    def get(self, chave, padrao=None):
+        return self[chave] if chave in self else padrao
+
+    def values(self):
+        return [self[chave] for chave in self]
+
+    def items(self):
+        return [(chave, self[chave]) for chave in self]
+
+    def pop(self, chave, *padrao):
+        return _resolver(dict.pop(self, chave, *padrao), self._blobs)
+
+    def __reduce__(self):
+        # Referências seguem como estão; quem recebe o registro carrega os blobs que ler
+        return RegistroPreguicoso, (dict(dict.items(self)), self._blobs)
+
+
+class ListaPreguicosa(list):
+    """Lista do registro compacto; os itens são resolvidos como em RegistroPreguicoso"""
+    __slots__ = ("_blobs",)
+
+    def __init__(self, itens: list, blobs: ArmazemBlobs):
+        super().__init__(itens)
+        self._blobs = blobs
+
+    def _valor(self, indice, valor):
+        resolvido = _resolver(valor, self._blobs)
+        if resolvido is not valor:
+            list.__setitem__(self, indice, resolvido)
+        return resolvido
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        return self._valor(indice, list.__getitem__(self, indice))
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield self[indice]
+
+    def __reduce__(self):
+        return ListaPreguicosa, (list(list.__iter__(self)), self._blobs)
+
+
+def materializar(valor, blobs: ArmazemBlobs = None):
+    """ Cópia em dicts e listas simples, com todos os blobs carregados
+
+    Aceita registros preguiçosos ou registros compactos com referências
+    (esses pedem `blobs`).
+    """
+    if isinstance(valor, RegistroPreguicoso):
+        blobs = blobs or valor._blobs
+    elif isinstance(valor, ListaPreguicosa):
+        blobs = blobs or valor._blobs
+    if eh_referencia(valor):
+        valor = blobs.carregar(valor[CHAVE_BLOB])
+    if isinstance(valor, dict):
+        return {chave: materializar(item, blobs) for chave, item in dict.items(valor)}
+    if isinstance(valor, list):
+        return [materializar(item, blobs) for item in list.__iter__(valor)]
+    return valor
+
+
+def cru(valor):
+    """Cópia em dicts e listas simples sem carregar nada: campos ainda não lidos continuam como referências"""
+    if isinstance(valor, dict):
+        return {chave: cru(item) for chave, item in dict.items(valor)}
+    if isinstance(valor, list):
+        return [cru(item) for item in list.__iter__(valor)]
+    return valor
+
+
+def registros_compactos(registros, blobs: ArmazemBlobs, limiar: int = None):
+    """Gerador de registros com os campos grandes descarregados (para EscritorRegistros)"""
+    for registro in registros:
+        yield descarregar_campos(registro, blobs, limiar)
+
+
+def registros_preguicosos(registros, blobs: ArmazemBlobs):
+    """ Gerador de RegistroPreguicoso a partir de registros compactos
+
+    Ex: registros_preguicosos(iterar_array_json("informacoes_compacto.json"), ArmazemBlobs("blobs"))
+    """
+    for registro in registros:
+        yield RegistroPreguicoso(registro, blobs)
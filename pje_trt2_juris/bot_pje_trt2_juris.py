@@ -1,19 +1,22 @@
 import json
-import os
-import requests
-from datetime import datetime
 from captcha_local_solver import solve_captcha_local
-from parsing import parse_cnj
-from lxml import etree
-from pdf_proc import main as process_pdfs, merge_json_files
+from http_client import criar_sessao, iterar_documentos, MENSAGEM_CAPTCHA_INCORRETO, URL_API
+from metrics import (REGISTRO, CAPTCHAS, CAPTCHA_SEGUNDOS, DOCUMENTOS, GRAVACAO_SEGUNDOS, PAGINAS,
+                     TENTATIVAS_PAGINA, iniciar_servidor_ambiente)
+from pdf_proc import FilaDetalhes, salvar_dados_especificos, merge_json_files
+from process_store import BancoProcessos, TAMANHO_LOTE
+from enrichment import enriquecer_documentos
+from records import EscritorRegistros
+from paths import PASTA_DOCUMENTOS, ARQUIVO_INFORMACOES, ARQUIVO_DADOS, ARQUIVO_BANCO
+from storage import ArmazemSegmentos, fonte_documentos
+from tracing import span
 
-URL_CAPTCHA = 'https://pje.trt2.jus.br/juris-backend/api/captcha'
-URL_DOCUMENTOS = 'https://pje.trt2.jus.br/juris-backend/api/documentos'
-PASTA_DOCUMENTOS = "processos"
-ARQUIVO_INFORMACOES = "informacoes_processos_completo.json"
+URL_CAPTCHA = f'{URL_API}/captcha'
+URL_DOCUMENTOS = f'{URL_API}/documentos'
 
 class Bot_trt2_pje_juris:
-    def __init__(self, assunto: str, procs_por_pagina: int, max_paginas: int = 0):
+    def __init__(self, assunto: str, procs_por_pagina: int, max_paginas: int = 0, workers_detalhes: int = 1, fila_detalhes=None, armazem=None,
+                 workers_enriquecimento: int = 1, blobs=None):
         """ Classe para pesquisa de jurisprudência no TRT 2. 
 
         Arquivos: 
@@ -24,23 +27,33 @@ class Bot_trt2_pje_juris:
             assunto: Assunto para pesquisa interessada
             procs_por_pagina: Processos por pagina para ser pesquisado
             max_paginas: numero de paginas a ser pesquisada
+            workers_detalhes: threads que buscam os detalhes dos processos durante a pesquisa
+            fila_detalhes: destino dos linkIds encontrados, por padrão uma FilaDetalhes local
+            armazem: armazem de segmentos das paginas, por padrão um em PASTA_DOCUMENTOS
+            workers_enriquecimento: processos que montam os registros a partir dos documentos
+            blobs: ArmazemBlobs para os campos grandes das páginas e da base, se houver
         
         """
         self.assunto = assunto
         self.procs_por_pagina = int(procs_por_pagina)
         self.max_paginas = max_paginas
-        self.sessao = requests.Session()
+        self.sessao = criar_sessao()
         self.token_desafio = None
         self.resposta_captcha = None
         self.url_post = None
         self.cookies = {}
+        self.fila_detalhes = fila_detalhes or FilaDetalhes(workers_detalhes)
+        self.blobs = blobs
+        self.armazem = armazem or ArmazemSegmentos(PASTA_DOCUMENTOS, blobs=blobs)
+        self.workers_enriquecimento = workers_enriquecimento
 
     def fazer_requisicao_captcha(self):
         """Fazer a requisicao do captcha para ser resolvido (GET)"""
         try:
-            resposta = self.sessao.get(URL_CAPTCHA, headers={'Accept': 'application/json'})
-            resposta.raise_for_status()
-            dados = resposta.json()
+            with span("captcha_busca"):
+                resposta = self.sessao.get(URL_CAPTCHA, headers={'Accept': 'application/json'})
+                resposta.raise_for_status()
+                dados = resposta.json()
             self.token_desafio = dados.get('tokenDesafio')
             self.resolver_captcha(dados.get('imagem'))
         except Exception as e:
@@ -51,7 +64,8 @@ class Bot_trt2_pje_juris:
         try:
             if (base64_string):
                 base64_string = base64_string.split(',')[1] if base64_string.startswith('data:image') else base64_string
-                self.resposta_captcha = solve_captcha_local(base64_string)
+                with span("captcha_resolucao"), CAPTCHA_SEGUNDOS.cronometrar(etapa="pesquisa"):
+                    self.resposta_captcha = solve_captcha_local(base64_string)
                 print(f"Resposta do CAPTCHA: \033[1;32m{self.resposta_captcha}\033[0m")
                 self.url_post = f"{URL_DOCUMENTOS}?tokenDesafio={self.token_desafio}&resposta={self.resposta_captcha}"
                 self.configurar_cookies()
@@ -67,16 +81,29 @@ class Bot_trt2_pje_juris:
         }
         self.sessao.cookies.update(self.cookies)
 
-    def salvar_em_arquivo(self, pasta, nome_arquivo, conteudo):
-        """Salva os arquivos necessario do programa"""
-        os.makedirs(pasta, exist_ok=True)
-        caminho = os.path.join(pasta, nome_arquivo)
-        try:
-            with open(caminho, 'w', encoding='utf-8') as arquivo:
-                json.dump(conteudo, arquivo, ensure_ascii=False, indent=4)
-            print(f"Arquivo salvo em: {caminho}")
-        except Exception as e:
-            print(f"Erro ao salvar o arquivo: {e}")
+    def salvar_documentos(self, pagina, documentos, info):
+        """Le a pagina inteira do stream e so depois grava os documentos no armazem
+
+        O armazem e so de acrescimo: uma pagina interrompida no meio do stream ou
+        com CAPTCHA incorreto e descartada sem ser gravada, e a nova tentativa nao
+        duplica documentos. Os linkIds tambem so vao para a fila de detalhes depois disso.
+        """
+        documentos = list(documentos)
+        if info.get("mensagem") == MENSAGEM_CAPTCHA_INCORRETO:
+            return None
+        with GRAVACAO_SEGUNDOS.cronometrar(destino="armazem"):
+            for doc in self.encaminhar_link_ids(documentos):
+                self.armazem.gravar(doc, assunto=self.assunto, pagina=pagina)
+        DOCUMENTOS.inc(len(documentos))
+        print(f"Página {pagina} armazenada: {len(documentos)} documentos")
+        return len(documentos)
+
+    def encaminhar_link_ids(self, documentos):
+        """Envia cada documento para a fila de detalhes assim que ele e lido (a fila usa o linkId e, se priorizar, os metadados)"""
+        for doc in documentos:
+            if doc.get("linkId"):
+                self.fila_detalhes.adicionar([doc])
+            yield doc
 
     def enviar_documento(self, pagina):
         """Envia os itens necessarios para a coleta dos processos"""
@@ -91,38 +118,29 @@ class Bot_trt2_pje_juris:
             "ordenarPor": "dataPublicacao",
         }
         try:
-            resposta = self.sessao.post(self.url_post, json=payload, headers={'Content-Type': 'application/json'})
-            timestamp = datetime.now().strftime("%d-%m-%Y")
+            with span("pagina_post", pagina=pagina), \
+                    self.sessao.post(self.url_post, json=payload, headers={'Content-Type': 'application/json'},
+                                     stream=True) as resposta:
+                if resposta.status_code == 200:
+                    info = {}
+                    salvos = self.salvar_documentos(pagina, iterar_documentos(resposta, info), info)
             if resposta.status_code == 200:
-                documentos = resposta.json()
-                if documentos.get("mensagem") == "A resposta informada é incorreta":
+                if salvos is None:
                     print("\033[1;31mCAPTCHA incorreto.\033[0m Gerando novo...")
+                    CAPTCHAS.inc(etapa="pesquisa", resultado="incorreto")
+                    PAGINAS.inc(resultado="captcha_incorreto")
                     self.url_post = None
                 else:
-                    nome_arquivo = f"assunto_{self.assunto}_pagina_{pagina}_data_{timestamp}.json"
-                    self.salvar_em_arquivo(PASTA_DOCUMENTOS, nome_arquivo, documentos)
+                    CAPTCHAS.inc(etapa="pesquisa", resultado="correto")
+                    PAGINAS.inc(resultado="ok")
                     return True
+            else:
+                PAGINAS.inc(resultado=f"http_{resposta.status_code}")
         except Exception as e:
             print(f"Erro ao processar a página {pagina}: {e}")
+            PAGINAS.inc(resultado="erro")
         return False
 
-    def coletar_links_processos(self, pagina_html):
-        """Coleta os links dos processos da página de resultados e os exibe no terminal"""
-        try:
-            parser = etree.HTMLParser()
-            tree = etree.fromstring(pagina_html, parser)
-            links_processos = []
-            for i in range(1, 5):  
-                xpath = f'//*[@id="divListaResultados"]/mat-list-item[{i}]/div/div[2]/div[1]/a'
-                link = tree.xpath(xpath)
-                if (link):
-                    href = link[0].get('href')
-                    links_processos.append(href)
-            return links_processos
-        except Exception as e:
-            print(f"Erro ao coletar links dos processos: {e}")
-            return []
-
     def iniciar_sessao(self):
         """Inicia a sessão na ordem correta necessaria para o programa funcionar"""
         print("\033[1;33m==== Iniciando a Sessão ====\033[0m")
@@ -135,20 +153,19 @@ class Bot_trt2_pje_juris:
 
             if self.url_post and self.enviar_documento(pagina):
                 print(f"Página \033[34m{pagina}\033[0m processada com sucesso!")
-                pagina_html = self.sessao.get(self.url_post).text
-                links_processos = self.coletar_links_processos(pagina_html)
-                for link in links_processos:
-                    self.obter_detalhes_processo(link)
+                TENTATIVAS_PAGINA.observar(retries)
                 pagina += 1
                 retries = 1
             else:
                 retries += 1
 
     def extrair_link_ids(self, documentos):
-        """Extrai os linkIds dos documentos"""
+        """Extrai os linkIds dos documentos (pagina com "documents" ou iteravel de documentos)"""
         try:
             link_ids = []
-            for doc in documentos.get("documents", []):
+            if isinstance(documentos, dict):
+                documentos = documentos.get("documents", [])
+            for doc in documentos:
                 link_id = doc.get("linkId")
                 if link_id:
                     link_ids.append(link_id)
@@ -159,258 +176,83 @@ class Bot_trt2_pje_juris:
 
     def run(self):
         """Run the bot to start the session and process documents."""
-        self.iniciar_sessao()
-        documentos_unificados = coletar_documentos(PASTA_DOCUMENTOS)
-        link_ids = self.extrair_link_ids(documentos_unificados)
+        iniciar_servidor_ambiente()
+        self.fila_detalhes.iniciar()
+        try:
+            self.iniciar_sessao()
+        finally:
+            self.armazem.fechar()
+            print("\n\033[1;33m==== Aguardando Processamento de PDFs ====\033[0m")
+            dados_processados = self.fila_detalhes.finalizar()
+
+        documentos = fonte_documentos(PASTA_DOCUMENTOS, assunto=self.assunto, blobs=self.blobs)
         campos = ["sigiloso", "anoProcesso", "tipoDocumento", "instancia", "dataDistribuicao", 
                  "processo", "classeJudicial", "classeJudicialSigla", "dataPublicacao", 
                  "orgaoJulgador", "magistrado"]
-        coletar_informacoes_memoria(documentos_unificados, campos, ARQUIVO_INFORMACOES)
-        
-        print("\n\033[1;33m==== Iniciando Processamento de PDFs ====\033[0m")
-        process_pdfs(link_ids)
+        with BancoProcessos(ARQUIVO_BANCO, blobs=self.blobs) as banco:
+            coletar_informacoes_memoria(documentos, campos, ARQUIVO_INFORMACOES, banco=banco,
+                                        workers=self.workers_enriquecimento)
+            salvar_dados_especificos(dados_processados, banco=banco)
         
         print("\n\033[1;33m==== Mesclando Arquivos JSON ====\033[0m")
         merge_json_files()
+        REGISTRO.salvar_resumo()
         
         return True
 
-def coletar_documentos(pasta_origem):
-    """Coleta as paginas dos processos e retorna os documentos unificados"""
-    documentos_unificados = {"documents": []}
-    arquivos_json = [f for f in os.listdir(pasta_origem) if f.endswith('.json')]
-    for arquivo in arquivos_json:
-        try:
-            with open(os.path.join(pasta_origem, arquivo), 'r', encoding='utf-8') as f:
-                conteudo = json.load(f)
-                documentos_unificados["documents"].extend(conteudo.get("documents", []))
-        except Exception as e:
-            print(f"Erro ao processar o arquivo {arquivo}: {e}")
-    
-    print("Documentos unificados em memória")
-    return documentos_unificados
-
 def ler_dados_especificos():
     """Lê o arquivo dados_especificos.json e retorna seus dados"""
     try:
-        with open('dados_especificos.json', 'r', encoding='utf-8') as f:
+        with open(ARQUIVO_DADOS, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception as e:
-        print(f"Erro ao ler dados_especificos.json: {e}")
+        print(f"Erro ao ler {ARQUIVO_DADOS}: {e}")
         return {}
 
-def coletar_informacoes_memoria(documentos_unificados, campos, arquivo_saida):
+def coletar_informacoes_memoria(documentos, campos, arquivo_saida, formato="json", compativel=True, banco=None,
+                                workers=1):
     """
-    Coleta as informações dos documentos unificados em memória e as salva em arquivo JSON
-    com o formato BD e valores nulos para campos ausentes.
+    Coleta as informações dos documentos, consumidos um a um do iteravel, e as grava em
+    streaming no arquivo com o formato BD e valores nulos para campos ausentes.
+    Também aceita o dicionario unificado antigo ({"documents": [...]}).
+    O formato padrão reproduz byte a byte o antigo json.dump(..., indent=4); formato="ndjson"
+    ou compativel=False geram a saída compacta. Com `banco`, os registros também são
+    gravados em lotes no BancoProcessos. Com `workers` > 1 os registros são montados num
+    pool de processos, na mesma ordem; documentos com erro são descartados e listados
+    sem interromper a gravação dos demais.
     """
     try:
-        dados = documentos_unificados.get("documents", [])
-        informacoes_completas = []
+        if isinstance(documentos, dict):
+            documentos = documentos.get("documents", [])
         dados_especificos = ler_dados_especificos()
-
-        for doc in dados:
-            numero_processo = doc.get("processo", None)
-            area_code, tribunal_code, vara_code, ano, area, tribunal = parse_cnj(numero_processo) if numero_processo else (None, None, None, None, None, None)
-            informacoes = {
-                "linkId": doc.get("linkId", None),
-                "numero": numero_processo,
-                "area_code": area_code,
-                "tribunal_code": tribunal_code,
-                "vara_code": vara_code,
-                "ano": ano,
-                "area:": area,
-                "tribunal": tribunal,
-                "comarca": None,
-                "valor_causa": doc.get("valorCausa", None),
-                "moeda_causa": "R$",
-                "fontes": [
-                    {
-                        "provider": "Interno",
-                        "provider_fonte_id": "Interno",
-                        "sigla": doc.get("sistema", "PJE-TRT2"),
-                        "sistema": "PJE",
-                        "tipo": "TRIBUNAL",
-                        "instancias": [
-                            {
-                                "url": "https://pje.trt2.jus.br/jurisprudencia/",
-                                "grau": doc.get("instancia", None),
-                                "classe": doc.get("classeJudicialSigla", None),
-                                "orgao_julgador": doc.get("orgaoJulgador", None),
-                                "justica_gratuita": doc.get("justicaGratuita", None),
-                                "assunto_principal": doc.get("assunto", [None])[0],
-                                "assuntos": doc.get("assunto", []),
-                                "envolvidos": [
-                                    {
-                                        "nome": doc.get("poloAtivo", []),
-                                        "tipo": doc.get("reclamante", "RECLAMANTE"),
-                                        "polo": doc.get("polo", "ATIVO"),
-                                        "id_sistema": {
-                                            "login": None,
-                                        },
-                                        "documento": [
-                                            {"tipo": "CPF", "uf": None, "valor": None}
-                                        ],
-                                        "endereco": {},
-                                        "representantes": [
-                                            {
-                                                "nome": doc.get("nome_adv", None),
-                                                "tipo": "ADVOGADO",
-                                                "polo": "ATIVO",
-                                                "id_sistema": {
-                                                    "login": None,
-                                                },
-                                                "documento": [
-                                                    {"tipo": "CPF", "uf": None, "valor": doc.get("cpf", None)},
-                                                    {"tipo": "RG", "uf": None, "valor": None},
-                                                    {"tipo": "OAB-ADVOGADO", "uf": None, "valor": None}
-                                                ],
-                                                "endereco": {
-                                                    "logradouro": doc.get("longradouro", None),
-                                                    "numero": doc.get("numero", None),
-                                                    "complemento": doc.get("complemento", None),
-                                                    "bairro": doc.get("bairro", None),
-                                                    "municipio": doc.get("municipio", None),
-                                                    "estado": doc.get("estado", None),
-                                                    "cep": doc.get("cep", None),
-                                                }
-                                            }
-                                        ]
-                                    },
-                                    {
-                                        "nome": doc.get("poloPassivo", []), 
-                                        "tipo": doc.get("reclamado", "RECLAMADO"),
-                                        "polo": doc.get("polo", "PASSIVO"),
-                                        "id_sistema": {
-                                            "login": None,
-                                        },
-                                        "documento": [
-                                            {"tipo": "CPF", "uf": None, "valor": None}
-                                        ],
-                                        "endereco": {},
-                                        "representantes": [
-                                            {
-                                                "nome": doc.get("nome_adv", None),
-                                                "tipo": "ADVOGADO",
-                                                "polo": "PASSIVO",
-                                                "id_sistema": {
-                                                    "login": None
-                                                },
-                                                "documento": [
-                                                    {"tipo": "CPF", "uf": None, "valor": None},
-                                                    {"tipo": "RG", "uf": None, "valor": None},
-                                                    {"tipo": "OAB-ADVOGADO", "uf": None, "valor": None}
-                                                ],
-                                                "endereco": {
-                                                    "logradouro": None,
-                                                    "numero": None,
-                                                    "complemento": None,
-                                                    "bairro": None,
-                                                    "municipio": None,
-                                                    "estado": None,
-                                                    "cep": None
-                                                }
-                                            }
-                                        ]
-                                    },
-                                    {
-                                        "nome": doc.get("nome_perito", None),
-                                        "tipo": "PERITO",
-                                        "polo": doc.get("polo", "OUTROS"),
-                                        "id_sistema": {
-                                            "login": None
-                                        },
-                                        "documento": [],
-                                        "endereco": {},
-                                        "representantes": []
-                                    }
-                                ],
-                                "movimentacoes": doc.get("movimentacoes", [
-                                    {
-                                        "titulo": doc.get("movimentoDecisao", []),
-                                        "tipoConteudo": doc.get("html", None),
-                                        "data": doc.get("dataPublicacao", None),
-                                        "ativo": doc.get("ativo", None),
-                                        "documento": doc.get("f_ou_t", None),
-                                        "mostrarHeaderData": doc.get("header_data", None),
-                                        "usuarioCriador": doc.get("usuarioCriador", None),
-                                    },
-                                    {
-                                        "titulo": doc.get("titulo", None),
-                                        "tipoConteudo": doc.get("html", None),
-                                        "data": doc.get("dataPublicacao", None),
-                                        "ativo": doc.get("ativo", None),
-                                        "documento": doc.get("f_ou_t", None),
-                                        "mostrarHeaderData": doc.get("header_data", None),
-                                        "usuarioCriador": doc.get("usuarioCriador", None),
-                                    },
-                                    {
-                                        "id": doc.get("id", None),
-                                        "idUnicoDocumento": doc.get("idUnicoDocumento", None),
-                                        "titulo": doc.get("titulo", None),
-                                        "tipo": doc.get("tipoDocumento", None),
-                                        "tipoConteudo": doc.get("tipoConteudo","RTF"),
-                                        "data": doc.get("dataPublicacao", None),
-                                        "ativo": doc.get("ativo", None),
-                                        "documentoSigiloso": doc.get("sigiloso", None),
-                                        "usuarioPerito": doc.get("usuarioPerito", None),
-                                        "documento": doc.get("tipo_doc", None),
-                                        "publico": doc.get("tipo_publico", None),
-                                        "usuarioJuntada": doc.get("usuarioJuntada", None),
-                                        "usuarioCriador": doc.get("usuarioCriador", None),
-                                        "instancia": doc.get("instancia", None)
-                                    }
-                                ])
-                            }
-                        ]
-                    }
-                ],
-                "nome": doc.get("poloAtivo", []),
-                "poloPassivo": ", ".join(doc.get("poloPassivo", [])),
-                "classeJudicial": doc.get("classeJudicial", ""),
-                "anoProcesso": doc.get("anoProcesso", ""),
-                "tipoDocumento": doc.get("tipoDocumento", ""),
-                "movimentoDecisao": doc.get("movimentoDecisao", [])
-            }
-
-            # Mapeamento de campos do dados_especificos.json para informacoes_completas
-            if numero_processo in dados_especificos:
-                dados_proc = dados_especificos[numero_processo]
-                
-                # Atualiza os envolvidos com os dados específicos
-                for envolvido in informacoes["fontes"][0]["instancias"][0]["envolvidos"]:
-                    if envolvido["polo"] == "ATIVO" and "poloAtivo" in dados_proc:
-                        envolvido["nome"] = [dados_proc["poloAtivo"]]
-                    elif envolvido["polo"] == "PASSIVO" and "poloPassivo" in dados_proc:
-                        envolvido["nome"] = [dados_proc["poloPassivo"]]
-                    
-                    # Atualiza documentos se disponíveis
-                    if "documentos" in dados_proc:
-                        if envolvido["polo"] == "ATIVO" and "cpf_ativo" in dados_proc["documentos"]:
-                            envolvido["documento"][0]["valor"] = dados_proc["documentos"]["cpf_ativo"]
-                        elif envolvido["polo"] == "PASSIVO" and "cpf_passivo" in dados_proc["documentos"]:
-                            envolvido["documento"][0]["valor"] = dados_proc["documentos"]["cpf_passivo"]
-
-                    # Atualiza representantes se disponíveis
-                    for representante in envolvido.get("representantes", []):
-                        if representante["tipo"] == "ADVOGADO":
-                            if envolvido["polo"] == "ATIVO" and "advogado_ativo" in dados_proc:
-                                representante["nome"] = dados_proc["advogado_ativo"]
-                            elif envolvido["polo"] == "PASSIVO" and "advogado_passivo" in dados_proc:
-                                representante["nome"] = dados_proc["advogado_passivo"]
-
-            informacoes_completas.append(informacoes)
-
-        with open(arquivo_saida, 'w', encoding='utf-8') as f:
-            json.dump(informacoes_completas, f, ensure_ascii=False, indent=4)
-        print(f"Informações salvas em: \033[32m{arquivo_saida}\033[0m")
+        lote, erros = [], []
+        with EscritorRegistros(arquivo_saida, formato, compativel) as escritor:
+            for informacoes in enriquecer_documentos(documentos, dados_especificos, workers, erros=erros):
+                escritor.escrever(informacoes)
+                if banco is not None:
+                    lote.append(informacoes)
+                    if len(lote) >= TAMANHO_LOTE:
+                        banco.salvar_processos(lote)
+                        lote = []
+        if banco is not None and lote:
+            banco.salvar_processos(lote)
+        for link_id, erro in erros:
+            print(f"\033[31mDocumento {link_id} descartado:\033[0m {erro}")
+        print(f"Informações salvas em: \033[32m{arquivo_saida}\033[0m ({escritor.total} registros, {len(erros)} erros)")
     except Exception as e:
         print(f"Erro ao processar informações: {e}")
 
 if __name__ == "__main__":
-    procs_por_pagina = input("Digite o número de processos por página: ")
-    assunto = input("Digite o assunto de interesse: ")
-    sessao = Bot_trt2_pje_juris(assunto, procs_por_pagina)
-    sessao.run()
+    # Atalho para `cli.py search`; pasta de dados, URL, métricas e trace vêm das variáveis PJE_*
+    import argparse
+    parser = argparse.ArgumentParser(description="Pesquisa de jurisprudência no PJE TRT2")
+    parser.add_argument("assunto")
+    parser.add_argument("--procs-por-pagina", type=int, default=10)
+    parser.add_argument("--max-paginas", type=int, default=10)
+    parser.add_argument("--workers-detalhes", type=int, default=1)
+    parser.add_argument("--workers-enriquecimento", type=int, default=1)
+    args = parser.parse_args()
+    Bot_trt2_pje_juris(args.assunto, args.procs_por_pagina, args.max_paginas, args.workers_detalhes,
+                       workers_enriquecimento=args.workers_enriquecimento).run()
 
 
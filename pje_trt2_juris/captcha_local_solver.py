@@ -2,17 +2,6 @@ import os
 import base64
 from io import BytesIO
  
-import numpy as np
-import pytesseract
-from PIL import Image
-from PIL import ImageFilter
-from scipy.ndimage import gaussian_filter
- 
- 
-# Check if running on windows computer and if so, adds pytesseract to path
-if os.name == "nt":
-    pytesseract.pytesseract.tesseract_cmd = 'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
- 
  
 def solve_captcha_local(bytes_data, th0: int = 185, th1: int = 105, sig1: int = 1.1, th2: int = 105, sig2: int = 1.0) -> str:
     """ Attempts to solve captcha with pytesseract
@@ -28,6 +17,17 @@ def solve_captcha_local(bytes_data, th0: int = 185, th1: int = 105, sig1: int =
     Returns:
         Captcha response
     """
+    # Heavy imports are deferred to the first solve so importing the bot stays fast
+    import numpy as np
+    import pytesseract
+    from PIL import Image
+    from PIL import ImageFilter
+    from scipy.ndimage import gaussian_filter
+
+    # Check if running on windows computer and if so, adds pytesseract to path
+    if os.name == "nt":
+        pytesseract.pytesseract.tesseract_cmd = 'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
+
     original = Image.open(BytesIO(base64.b64decode(bytes_data)))
  
     # converting to black and white
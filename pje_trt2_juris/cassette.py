@@ -0,0 +1,186 @@
+import atexit
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from io import BytesIO
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+# Variáveis de ambiente lidas por http_client.criar_sessao
+VARIAVEL_CASSETTE = "PJE_CASSETTE"
+VARIAVEL_MODO = "PJE_CASSETTE_MODO"
+VARIAVEL_LATENCIA = "PJE_CASSETTE_LATENCIA"
+MODOS = ("gravar", "reproduzir")
+
+# Campos do corpo que mudam a cada CAPTCHA e não distinguem a requisição
+CAMPOS_VOLATEIS = ("resposta", "tokenDesafio")
+_CABECALHOS_DESCARTADOS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+def chave_requisicao(request) -> str:
+    """ Chave de reprodução da requisição: método, caminho e corpo sem os campos do CAPTCHA
+
+    A query string é ignorada (ela só carrega tokenDesafio e resposta).
+    """
+    corpo = request.body or b""
+    if isinstance(corpo, str):
+        corpo = corpo.encode("utf-8")
+    try:
+        dados = json.loads(corpo) if corpo else None
+        if isinstance(dados, dict):
+            dados = {k: v for k, v in dados.items() if k not in CAMPOS_VOLATEIS}
+        corpo = json.dumps(dados, sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        corpo = base64.b64encode(corpo).decode("ascii")
+    return f"{request.method} {urlparse(request.url).path} {corpo}"
+
+
+def _resposta_bruta(status: int, cabecalhos: dict, corpo: bytes) -> HTTPResponse:
+    """Resposta urllib3 em memória, lida em stream como a original (corpo já descomprimido)"""
+    cabecalhos = {k: v for k, v in cabecalhos.items() if k.lower() not in _CABECALHOS_DESCARTADOS}
+    cabecalhos["Content-Length"] = str(len(corpo))
+    return HTTPResponse(body=BytesIO(corpo), headers=cabecalhos, status=status, preload_content=False,
+                        decode_content=False)
+
+
+class Cassette:
+    """ Arquivo de interações HTTP gravadas: NDJSON comprimido com gzip
+
+    Cada linha guarda a chave da requisição, status, cabeçalhos, corpo
+    (descomprimido, em base64) e a duração original. Na reprodução, as
+    respostas de uma mesma chave são servidas na ordem em que foram gravadas
+    e recomeçam do início quando acabam, então um cassette curto sustenta um
+    benchmark longo.
+    """
+
+    def __init__(self, caminho: str, modo: str):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de cassette desconhecido: {modo}")
+        self.caminho = caminho
+        self.modo = modo
+        self.lock = threading.Lock()
+        self.arquivo = None
+        self.interacoes = {}
+        self.posicoes = {}
+        if modo == "gravar":
+            self.arquivo = gzip.open(caminho, "at", encoding="utf-8")
+            atexit.register(self.fechar)
+        else:
+            with gzip.open(caminho, "rt", encoding="utf-8") as f:
+                for linha in f:
+                    interacao = json.loads(linha)
+                    interacao["corpo"] = base64.b64decode(interacao["corpo"])
+                    self.interacoes.setdefault(interacao["chave"], []).append(interacao)
+
+    def fechar(self):
+        with self.lock:
+            if self.arquivo is not None:
+                self.arquivo.close()
+                self.arquivo = None
+
+    def gravar(self, chave: str, status: int, cabecalhos: dict, corpo: bytes, duracao: float):
+        linha = json.dumps({"chave": chave, "status": status, "cabecalhos": cabecalhos, "duracao": round(duracao, 6),
+                            "corpo": base64.b64encode(corpo).decode("ascii")}, ensure_ascii=False)
+        with self.lock:
+            self.arquivo.write(linha + "\n")
+
+    def proxima(self, chave: str) -> dict:
+        """Próxima resposta gravada para a chave (cíclica), ou None se a chave não foi gravada"""
+        lista = self.interacoes.get(chave)
+        if not lista:
+            return None
+        with self.lock:
+            posicao = self.posicoes.get(chave, 0)
+            self.posicoes[chave] = posicao + 1
+        return lista[posicao % len(lista)]
+
+
+class AdaptadorCassette(HTTPAdapter):
+    """ Adaptador de transporte que grava ou reproduz as respostas de um Cassette
+
+    Montado na sessão de criar_sessao, fica abaixo de tudo o que o bot faz
+    (cookies, hooks, stream=True, ijson), então o pipeline roda igual online
+    e offline.
+
+    Latência na reprodução:
+        None ou 0: nenhuma, o mais rápido que a CPU permitir
+        "gravada": a duração original de cada resposta
+        número: segundos fixos por resposta
+    """
+
+    def __init__(self, cassette: Cassette, latencia=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latencia = latencia
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        chave = chave_requisicao(request)
+        if self.cassette.modo == "reproduzir":
+            return self._reproduzir(request, chave)
+
+        inicio = time.perf_counter()
+        resposta = super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        try:
+            corpo = resposta.raw.read(decode_content=True)
+        finally:
+            resposta.raw.release_conn()
+        duracao = time.perf_counter() - inicio
+        cabecalhos = dict(resposta.headers)
+        self.cassette.gravar(chave, resposta.status_code, cabecalhos, corpo, duracao)
+        return self.build_response(request, _resposta_bruta(resposta.status_code, cabecalhos, corpo))
+
+    def _reproduzir(self, request, chave: str):
+        interacao = self.cassette.proxima(chave)
+        if interacao is None:
+            return self.build_response(request, _resposta_bruta(
+                599, {"Content-Type": "application/json"},
+                json.dumps({"mensagem": f"Requisição fora do cassette: {chave[:200]}"}).encode("utf-8")))
+        if self.latencia == "gravada":
+            time.sleep(interacao["duracao"])
+        elif self.latencia:
+            time.sleep(float(self.latencia))
+        return self.build_response(request, _resposta_bruta(interacao["status"], interacao["cabecalhos"],
+                                                            interacao["corpo"]))
+
+
+_cassettes = {}
+_lock = threading.Lock()
+
+
+def abrir_cassette(caminho: str, modo: str) -> Cassette:
+    """Cassette compartilhado pelo processo para o caminho (todas as sessões gravam no mesmo arquivo)"""
+    with _lock:
+        cassette = _cassettes.get((caminho, modo))
+        if cassette is None:
+            cassette = _cassettes[(caminho, modo)] = Cassette(caminho, modo)
+        return cassette
+
+
+def montar_cassette(sessao, caminho: str, modo: str, latencia=None):
+    """ Monta o adaptador de cassette em http:// e https:// da sessão
+
+    Args:
+        sessao: requests.Session
+        caminho: arquivo do cassette (.ndjson.gz)
+        modo: "gravar" ou "reproduzir"
+        latencia: latência simulada na reprodução (ver AdaptadorCassette)
+    """
+    adaptador = AdaptadorCassette(abrir_cassette(caminho, modo), latencia)
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    return sessao
+
+
+def cassette_ambiente():
+    """(caminho, modo, latência) de PJE_CASSETTE, PJE_CASSETTE_MODO e PJE_CASSETTE_LATENCIA, ou None"""
+    caminho = os.environ.get(VARIAVEL_CASSETTE)
+    if not caminho:
+        return None
+    modo = os.environ.get(VARIAVEL_MODO) or ("reproduzir" if os.path.exists(caminho) else "gravar")
+    latencia = os.environ.get(VARIAVEL_LATENCIA) or None
+    return caminho, modo, latencia
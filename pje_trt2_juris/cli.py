@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import sys
+
+# Opções globais repassadas às variáveis de ambiente lidas na importação dos módulos (paths, http_client,
+# tracing, cassette e metrics). Por isso os módulos do pipeline só são importados dentro de cada subcomando,
+# depois de _configurar_ambiente: `--help` e os subcomandos leves não carregam requests, OCR nem pyarrow.
+_VARIAVEIS = {
+    "dados": "PJE_DADOS",
+    "url": "PJE_JURIS_URL",
+    "metricas_porta": "PJE_METRICAS_PORTA",
+    "trace": "PJE_TRACE",
+    "perfil": "PJE_PERFIL",
+    "perfil_modo": "PJE_PERFIL_MODO",
+    "perfil_saida": "PJE_PERFIL_SAIDA",
+    "cassette": "PJE_CASSETTE",
+    "cassette_modo": "PJE_CASSETTE_MODO",
+    "cassette_latencia": "PJE_CASSETTE_LATENCIA",
+}
+
+
+def _configurar_ambiente(args):
+    for opcao, variavel in _VARIAVEIS.items():
+        valor = getattr(args, opcao, None)
+        if valor is not None:
+            os.environ[variavel] = str(valor)
+
+
+def _opcoes_comuns() -> argparse.ArgumentParser:
+    # SUPPRESS: a opção vale antes ou depois do subcomando sem que o padrão do subparser a apague
+    comum = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    grupo = comum.add_argument_group("opções comuns")
+    grupo.add_argument("--dados", help="pasta dos arquivos de dados (padrão: pasta atual ou PJE_DADOS)")
+    grupo.add_argument("--url", help="URL base da API de jurisprudência (PJE_JURIS_URL)")
+    grupo.add_argument("--metricas-porta", type=int, help="serve /metrics do Prometheus nesta porta")
+    grupo.add_argument("--trace", help="grava cada span como uma linha JSON neste arquivo")
+    grupo.add_argument("--perfil", help="etapa perfilada (captcha_busca, pagina_post, detalhe, registro...)")
+    grupo.add_argument("--perfil-modo", choices=["amostragem", "cprofile"])
+    grupo.add_argument("--perfil-saida", help="arquivo de pilhas colapsadas do perfil")
+    grupo.add_argument("--cassette", help="grava ou reproduz as respostas HTTP neste arquivo (.ndjson.gz)")
+    grupo.add_argument("--cassette-modo", choices=["gravar", "reproduzir"])
+    grupo.add_argument("--cassette-latencia", help='latência na reprodução: "gravada" ou segundos')
+    return comum
+
+
+def _opcoes_blobs() -> argparse.ArgumentParser:
+    opcoes = argparse.ArgumentParser(add_help=False)
+    opcoes.add_argument("--blobs", action="store_true",
+                        help="campos grandes no armazém de blobs (pasta blobs na pasta de dados)")
+    opcoes.add_argument("--limiar-blob", type=int, help="tamanho mínimo do campo descarregado, em bytes")
+    return opcoes
+
+
+def _armazem_blobs(args):
+    if not args.blobs:
+        return None
+    from blob_store import ArmazemBlobs, LIMIAR_BLOB
+    from paths import PASTA_BLOBS
+    return ArmazemBlobs(PASTA_BLOBS, limiar=args.limiar_blob or LIMIAR_BLOB)
+
+
+def _ler_link_ids(arquivo: str) -> list:
+    """linkIds de um JSON ({"link_ids": [...]} ou lista) ou de um texto com um por linha"""
+    with open(arquivo, "r", encoding="utf-8") as f:
+        conteudo = f.read()
+    try:
+        dados = json.loads(conteudo)
+    except ValueError:
+        return [linha.strip() for linha in conteudo.splitlines() if linha.strip()]
+    return dados.get("link_ids", []) if isinstance(dados, dict) else list(dados)
+
+
+def _pesos(valores) -> dict:
+    """NOME ou NOME=PESO (peso 1.0 por padrão) -> {nome: peso}"""
+    pesos = {}
+    for valor in valores or []:
+        nome, _, peso = valor.rpartition("=") if "=" in valor else (valor, "", "1")
+        pesos[nome] = float(peso)
+    return pesos
+
+
+def comando_search(args):
+    from bot_pje_trt2_juris import Bot_trt2_pje_juris
+
+    Bot_trt2_pje_juris(args.assunto, args.procs_por_pagina, args.max_paginas, args.workers_detalhes,
+                       workers_enriquecimento=args.workers_enriquecimento, blobs=_armazem_blobs(args)).run()
+
+
+def comando_fetch_details(args):
+    from detail_scheduler import PesosPrioridade
+    from metrics import REGISTRO, iniciar_servidor_ambiente
+    from pdf_proc import main as buscar_detalhes
+    from paths import ARQUIVO_BANCO, PASTA_DOCUMENTOS
+
+    link_ids = list(args.link_ids)
+    if args.arquivo:
+        link_ids.extend(_ler_link_ids(args.arquivo))
+    if args.assunto:
+        from storage import fonte_documentos
+        # Documentos inteiros: data de publicação, assuntos e número entram na prioridade
+        link_ids.extend(doc for doc in fonte_documentos(PASTA_DOCUMENTOS, assunto=args.assunto,
+                                                        blobs=_armazem_blobs(args)) if doc.get("linkId"))
+    if not link_ids:
+        print("Nenhum linkId informado: use argumentos, --arquivo ou --assunto")
+        return 1
+
+    pesos = PesosPrioridade(assuntos=_pesos(args.assunto_prioritario), tribunais=_pesos(args.tribunal_prioritario))
+    if args.meia_vida is not None:
+        pesos.meia_vida_dias = args.meia_vida
+    orcamento = {"pesos": pesos, "prazo": args.prazo, "max_requisicoes": args.max_requisicoes}
+
+    iniciar_servidor_ambiente()
+    if args.sem_banco:
+        pendentes = buscar_detalhes(link_ids, args.workers, **orcamento)
+    else:
+        from process_store import BancoProcessos
+        with BancoProcessos(ARQUIVO_BANCO, _armazem_blobs(args)) as banco:
+            pendentes = buscar_detalhes(link_ids, args.workers, banco, **orcamento)
+    if args.pendentes:
+        with open(args.pendentes, "w", encoding="utf-8") as f:
+            json.dump({"link_ids": pendentes}, f, ensure_ascii=False, indent=2)
+        print(f"{len(pendentes)} linkIds pendentes salvos em: \033[32m{args.pendentes}\033[0m")
+    REGISTRO.salvar_resumo()
+
+
+def comando_extract_text(args):
+    from paths import ARQUIVO_BANCO
+    from process_store import BancoProcessos
+    from text_extraction import WORKERS_PADRAO, extrair_corpus
+
+    with BancoProcessos(args.banco or ARQUIVO_BANCO, _armazem_blobs(args)) as banco:
+        total = extrair_corpus(banco, args.workers or WORKERS_PADRAO, reprocessar=args.reprocessar)
+    print(f"\033[32m{total}\033[0m documentos extraídos")
+
+
+def comando_merge(args):
+    from merge import mesclar_arquivos
+    from paths import ARQUIVO_DADOS, ARQUIVO_INFORMACOES
+
+    relatorio = mesclar_arquivos(args.informacoes or ARQUIVO_INFORMACOES, args.dados_especificos or ARQUIVO_DADOS)
+    print(f"{relatorio['atualizados']} processos atualizados")
+
+
+def comando_export(args):
+    from paths import ARQUIVO_BANCO, PASTA_PARQUET
+
+    if args.formato == "json":
+        from paths import ARQUIVO_DADOS, ARQUIVO_INFORMACOES
+        from process_store import BancoProcessos
+        with BancoProcessos(args.banco or ARQUIVO_BANCO, _armazem_blobs(args)) as banco:
+            banco.exportar_json(args.informacoes or ARQUIVO_INFORMACOES, args.dados_especificos or ARQUIVO_DADOS,
+                                compacto=args.compacto)
+            print(banco.contagem())
+        return
+
+    if args.formato == "delta":
+        from delta_export import descrever, exportar_delta
+        from paths import PASTA_DELTAS
+        from process_store import BancoProcessos
+        with BancoProcessos(args.banco or ARQUIVO_BANCO, _armazem_blobs(args)) as banco:
+            resultado = exportar_delta(banco, args.saida or PASTA_DELTAS, compacto=args.compacto)
+        print(descrever(resultado))
+        return
+
+    from export_parquet import exportar_incremental, exportar_parquet
+    saida = args.saida or PASTA_PARQUET
+    if args.json:
+        from merge import iterar_array_json
+        total = exportar_parquet(iterar_array_json(args.json), saida)
+    else:
+        from process_store import BancoProcessos
+        with BancoProcessos(args.banco or ARQUIVO_BANCO, _armazem_blobs(args)) as banco:
+            total = exportar_incremental(banco, saida)
+    print(f"\033[32m{total}\033[0m processos exportados para {saida}")
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    comum = _opcoes_comuns()
+    blobs = _opcoes_blobs()
+    parser = argparse.ArgumentParser(description="Coleta de jurisprudência do PJE TRT2", parents=[comum])
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    pesquisa = sub.add_parser("search", parents=[comum, blobs], help="pesquisa um assunto, busca os detalhes e mescla")
+    pesquisa.add_argument("assunto")
+    pesquisa.add_argument("--procs-por-pagina", type=int, default=10)
+    pesquisa.add_argument("--max-paginas", type=int, default=10)
+    pesquisa.add_argument("--workers-detalhes", type=int, default=1, help="threads que buscam os detalhes")
+    pesquisa.add_argument("--workers-enriquecimento", type=int, default=1, help="processos que montam os registros")
+    pesquisa.set_defaults(funcao=comando_search)
+
+    detalhes = sub.add_parser("fetch-details", parents=[comum, blobs], help="busca os detalhes de linkIds e os mescla")
+    detalhes.add_argument("link_ids", nargs="*")
+    detalhes.add_argument("--arquivo", help="JSON ({\"link_ids\": [...]} ou lista) ou texto com um linkId por linha")
+    detalhes.add_argument("--assunto", help="usa os linkIds já armazenados para este assunto")
+    detalhes.add_argument("--workers", type=int, default=1)
+    detalhes.add_argument("--sem-banco", action="store_true", help="não grava os detalhes no BancoProcessos")
+    detalhes.add_argument("--prazo", type=float, help="segundos para a busca; depois disso nenhum detalhe novo começa")
+    detalhes.add_argument("--max-requisicoes", type=int, help="requisições HTTP disponíveis para a busca")
+    detalhes.add_argument("--assunto-prioritario", action="append", metavar="ASSUNTO[=PESO]",
+                          help="soma o peso (1.0 por padrão) à prioridade dos documentos do assunto")
+    detalhes.add_argument("--tribunal-prioritario", action="append", metavar="TRIBUNAL[=PESO]",
+                          help="soma o peso à prioridade dos documentos do tribunal (ex: TRT-2=2)")
+    detalhes.add_argument("--meia-vida", type=float, help="dias em que o peso da recência cai pela metade")
+    detalhes.add_argument("--pendentes", help="grava os linkIds fora do orçamento (JSON aceito por --arquivo)")
+    detalhes.set_defaults(funcao=comando_fetch_details)
+
+    texto = sub.add_parser("extract-text", parents=[comum, blobs],
+                           help="extrai texto e seções (relatório, fundamentação, dispositivo) dos corpos HTML/RTF")
+    texto.add_argument("--banco", help="base SQLite (padrão: processos.db na pasta de dados)")
+    texto.add_argument("--workers", type=int, help="processos do pool (padrão: CPUs - 1)")
+    texto.add_argument("--reprocessar", action="store_true", help="refaz os documentos já extraídos")
+    texto.set_defaults(funcao=comando_extract_text)
+
+    mescla = sub.add_parser("merge", parents=[comum], help="mescla os dados específicos nas informações")
+    mescla.add_argument("--informacoes", help="padrão: informacoes_processos_completo.json na pasta de dados")
+    mescla.add_argument("--dados-especificos", help="padrão: dados_especificos.json na pasta de dados")
+    mescla.set_defaults(funcao=comando_merge)
+
+    exporta = sub.add_parser("export", parents=[comum, blobs],
+                             help="exporta a base para Parquet, para os JSON ou as alterações desde a última exportação")
+    exporta.add_argument("--formato", choices=["parquet", "json", "delta"], default="parquet",
+                         help="delta: NDJSON numerado só com os processos inseridos, atualizados e removidos")
+    exporta.add_argument("--banco", help="base SQLite (padrão: processos.db na pasta de dados)")
+    exporta.add_argument("--json", help="parquet: exporta um informacoes_processos_completo.json em vez da base")
+    exporta.add_argument("--saida", help="parquet/delta: pasta de saída (padrão: parquet ou deltas na pasta de dados)")
+    exporta.add_argument("--informacoes", help="json: arquivo de informações gerado")
+    exporta.add_argument("--dados-especificos", help="json: arquivo de dados específicos gerado")
+    exporta.add_argument("--compacto", action="store_true", help="json/delta: mantém as referências aos blobs nos arquivos")
+    exporta.set_defaults(funcao=comando_export)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = criar_parser().parse_args(argv)
+    _configurar_ambiente(args)
+    return args.funcao(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
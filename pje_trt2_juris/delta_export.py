@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from paths import ARQUIVO_BANCO, PASTA_DELTAS
+from process_store import BancoProcessos, chave_processo
+
+INSERIDO = "insert"
+ATUALIZADO = "update"
+REMOVIDO = "delete"
+
+TAMANHO_LOTE = 1000
+
+
+def hash_registro(registro: dict) -> str:
+    """ Hash estável do conteúdo do registro
+
+    SHA-256 do JSON com chaves ordenadas: não depende da ordem dos campos nem
+    de o registro estar compacto (as referências a blobs são materializadas
+    antes).
+    """
+    texto = json.dumps(registro, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _preparar_tabelas(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS cdc_versoes (
+            link_id TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            versao INTEGER NOT NULL,
+            removido INTEGER NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cdc_execucoes (
+            seq INTEGER PRIMARY KEY,
+            criado_em REAL NOT NULL,
+            atualizado_ate REAL NOT NULL,
+            inseridos INTEGER NOT NULL,
+            atualizados INTEGER NOT NULL,
+            removidos INTEGER NOT NULL,
+            arquivo TEXT NOT NULL
+        );
+    """)
+
+
+def _versoes(conn, chaves: list) -> dict:
+    marcadores = ",".join("?" * len(chaves))
+    return {link_id: (hash_, versao, removido) for link_id, hash_, versao, removido in conn.execute(
+        f"SELECT link_id, hash, versao, removido FROM cdc_versoes WHERE link_id IN ({marcadores})", chaves)}
+
+
+def exportar_delta(banco: BancoProcessos, pasta: str = PASTA_DELTAS, compacto: bool = False) -> dict:
+    """ Grava as alterações da base desde a última exportação como um delta NDJSON numerado
+
+    Cada processo (com os detalhes mesclados) tem um hash do conteúdo e uma
+    versão, guardados na própria base (tabela cdc_versoes). Só os processos
+    alterados desde a última execução são lidos; os que voltaram a ser
+    gravados com o mesmo conteúdo não entram no delta. Os que saíram da base
+    entram como remoção.
+
+    O arquivo é <pasta>/delta-<seq>.ndjson, uma linha por alteração:
+        {"seq", "op": "insert" | "update" | "delete", "linkId", "versao", "hash", "registro"}
+    (remoções sem "registro"). A sequência cresce de um em um entre as
+    execuções; uma execução sem alterações não grava arquivo nem consome número.
+
+    Args:
+        banco: base de processos
+        pasta: pasta dos deltas
+        compacto: com blobs, mantém as referências no lugar dos campos grandes do registro
+
+    Returns:
+        {"seq", "arquivo", "inseridos", "atualizados", "removidos"}; seq e arquivo None sem alterações
+    """
+    conn = banco.conn
+    _preparar_tabelas(conn)
+    seq, desde = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1, COALESCE(MAX(atualizado_ate), 0) "
+                              "FROM cdc_execucoes").fetchone()
+    completo = saida = None
+    if banco.blobs is not None:
+        from blob_store import cru, materializar
+        completo = lambda registro: materializar(registro, banco.blobs)
+        saida = cru if compacto else None
+    contagem = {INSERIDO: 0, ATUALIZADO: 0, REMOVIDO: 0}
+    marca = desde
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = os.path.join(pasta, f"delta-{seq:06d}.ndjson")
+    temporario = arquivo + ".tmp"
+
+    with open(temporario, "w", encoding="utf-8") as f:
+        def escrever(op, link_id, versao, hash_, registro=None):
+            linha = {"seq": seq, "op": op, "linkId": link_id, "versao": versao, "hash": hash_}
+            if registro is not None:
+                linha["registro"] = registro
+            f.write(json.dumps(linha, ensure_ascii=False, separators=(",", ":")) + "\n")
+            contagem[op] += 1
+
+        lote = []
+
+        def gravar_lote():
+            anteriores = _versoes(conn, [link_id for link_id, _, _ in lote])
+            linhas = []
+            for link_id, registro, hash_ in lote:
+                anterior = anteriores.get(link_id)
+                if anterior is not None and not anterior[2] and anterior[0] == hash_:
+                    continue
+                versao = anterior[1] + 1 if anterior else 1
+                escrever(ATUALIZADO if anterior and not anterior[2] else INSERIDO, link_id, versao, hash_, registro)
+                linhas.append((link_id, hash_, versao, seq))
+            conn.executemany("""
+                INSERT INTO cdc_versoes (link_id, hash, versao, removido, seq) VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(link_id) DO UPDATE SET
+                    hash = excluded.hash, versao = excluded.versao, removido = 0, seq = excluded.seq
+            """, linhas)
+            lote.clear()
+
+        for registro, alterado in banco.iterar_alterados(desde):
+            marca = max(marca, alterado)
+            conteudo = completo(registro) if completo else registro
+            lote.append((chave_processo(registro), saida(registro) if saida else conteudo, hash_registro(conteudo)))
+            if len(lote) >= TAMANHO_LOTE:
+                gravar_lote()
+        if lote:
+            gravar_lote()
+
+        removidos = conn.execute("""
+            SELECT v.link_id, v.versao, v.hash FROM cdc_versoes v
+            WHERE v.removido = 0 AND NOT EXISTS (SELECT 1 FROM processos p WHERE p.link_id = v.link_id)
+        """).fetchall()
+        for link_id, versao, hash_ in removidos:
+            escrever(REMOVIDO, link_id, versao + 1, hash_)
+        conn.executemany("UPDATE cdc_versoes SET removido = 1, versao = versao + 1, seq = ? WHERE link_id = ?",
+                         [(seq, link_id) for link_id, _, _ in removidos])
+
+    total = sum(contagem.values())
+    if total == 0:
+        conn.rollback()
+        os.remove(temporario)
+        return {"seq": None, "arquivo": None, "inseridos": 0, "atualizados": 0, "removidos": 0}
+
+    conn.execute("INSERT INTO cdc_execucoes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (seq, time.time(), marca, contagem[INSERIDO], contagem[ATUALIZADO], contagem[REMOVIDO], arquivo))
+    # Arquivo antes do commit: se a execução cair entre os dois, a próxima regrava o mesmo seq com um superconjunto
+    os.replace(temporario, arquivo)
+    conn.commit()
+    return {"seq": seq, "arquivo": arquivo, "inseridos": contagem[INSERIDO], "atualizados": contagem[ATUALIZADO],
+            "removidos": contagem[REMOVIDO]}
+
+
+def descrever(resultado: dict) -> str:
+    """Resumo de uma exportação para o terminal"""
+    if resultado["seq"] is None:
+        return "Nenhuma alteração desde a última exportação"
+    return (f"Delta \033[32m{resultado['seq']}\033[0m: {resultado['inseridos']} inseridos, "
+            f"{resultado['atualizados']} atualizados, {resultado['removidos']} removidos -> {resultado['arquivo']}")
+
+
+def ler_delta(arquivo: str):
+    """Gerador das alterações de um arquivo de delta"""
+    with open(arquivo, "r", encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                yield json.loads(linha)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta as alterações da base desde a última execução (NDJSON)")
+    parser.add_argument("--banco", default=ARQUIVO_BANCO)
+    parser.add_argument("--saida", default=PASTA_DELTAS)
+    args = parser.parse_args()
+
+    with BancoProcessos(args.banco) as banco:
+        resultado = exportar_delta(banco, args.saida)
+    print(descrever(resultado))
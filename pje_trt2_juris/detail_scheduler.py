@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from metrics import DETALHES
+from parsing import analisar_cnj
+from pdf_proc import PdfProcessor, link_id_de
+from tracing import span
+
+
+@dataclass
+class PesosPrioridade:
+    """ Pesos da nota de prioridade de cada documento na busca de detalhes
+
+    A nota é a soma de:
+        faltante: documento sem detalhe no BancoProcessos
+        recencia * 0.5 ** (idade em dias / meia_vida_dias): publicações recentes primeiro
+        assuntos[assunto]: maior peso entre os assuntos do documento
+        tribunais[tribunal]: peso do tribunal do documento (ex: {"TRT-2": 1.0})
+    """
+    faltante: float = 4.0
+    recencia: float = 2.0
+    meia_vida_dias: float = 365.0
+    assuntos: dict = field(default_factory=dict)
+    tribunais: dict = field(default_factory=dict)
+
+
+@dataclass
+class CandidatoDetalhe:
+    link_id: str
+    data_publicacao: str = None
+    assuntos: list = field(default_factory=list)
+    tribunal: str = None
+    faltante: bool = True
+
+
+def _data(texto) -> date:
+    """Data de publicação em AAAA-MM-DD (com ou sem hora) ou DD/MM/AAAA; None se não reconhecida"""
+    if not texto or not isinstance(texto, str):
+        return None
+    for formato, tamanho in (("%Y-%m-%d", 10), ("%d/%m/%Y", 10)):
+        try:
+            return datetime.strptime(texto[:tamanho], formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _lista(valor) -> list:
+    if not valor:
+        return []
+    return list(valor) if isinstance(valor, (list, tuple)) else [valor]
+
+
+def candidato_de_documento(doc: dict, faltante: bool = True) -> CandidatoDetalhe:
+    """Candidato a partir de um documento do resultado da pesquisa (campos dataPublicacao, assunto e processo)"""
+    campos, _ = analisar_cnj(doc.get("processo") or doc.get("numero") or "")
+    return CandidatoDetalhe(
+        link_id=doc.get("linkId"),
+        data_publicacao=doc.get("dataPublicacao"),
+        assuntos=_lista(doc.get("assunto")),
+        tribunal=campos[5] if campos else doc.get("tribunal"),
+        faltante=faltante,
+    )
+
+
+def prioridade(candidato: CandidatoDetalhe, pesos: PesosPrioridade, hoje: date = None) -> float:
+    """ Nota de prioridade do candidato; maior é buscado antes
+
+    Args:
+        candidato: documento candidato
+        pesos: pesos de cada critério
+        hoje: data de referência da recência, hoje por padrão
+
+    Returns:
+        nota
+    """
+    nota = pesos.faltante if candidato.faltante else 0.0
+    publicacao = _data(candidato.data_publicacao)
+    if publicacao is not None and pesos.meia_vida_dias > 0:
+        idade = max(0, ((hoje or date.today()) - publicacao).days)
+        nota += pesos.recencia * math.pow(0.5, idade / pesos.meia_vida_dias)
+    nota += max((pesos.assuntos.get(assunto, 0.0) for assunto in candidato.assuntos), default=0.0)
+    nota += pesos.tribunais.get(candidato.tribunal, 0.0)
+    return nota
+
+
+class AgendadorDetalhes:
+    """ Busca de detalhes por prioridade, dentro de um orçamento de tempo e de requisições
+
+    Substitui a FilaDetalhes (mesma interface: iniciar, adicionar,
+    finalizar) quando nem todos os documentos cabem numa execução: os
+    candidatos ficam num heap pela nota de `prioridade`, e cada thread sempre
+    retira o de maior nota ainda pendente. Quando o prazo vence ou as
+    requisições HTTP acabam, nenhum documento novo é iniciado; os que
+    estão em andamento terminam (o orçamento pode passar pelas
+    requisições de um documento por thread). Os que sobraram ficam em
+    `pendentes`, em ordem de prioridade, para a próxima execução.
+
+    Para que todos os documentos concorram pela ordem, adicione-os antes de
+    `iniciar`; adicionados depois (como na pesquisa em andamento), competem
+    só com os que ainda estão no heap.
+
+    Args:
+        num_workers: threads que buscam os detalhes
+        pesos: PesosPrioridade, os padrões se None
+        prazo: segundos a partir de `iniciar`, sem limite se None
+        max_requisicoes: requisições HTTP da execução, sem limite se None
+        banco: BancoProcessos consultado para os linkIds sem metadados e para
+            saber quais já têm detalhe
+    """
+
+    def __init__(self, num_workers: int = 1, pesos: PesosPrioridade = None, prazo: float = None,
+                 max_requisicoes: int = None, banco=None):
+        self.num_workers = max(1, int(num_workers))
+        self.pesos = pesos or PesosPrioridade()
+        self.prazo = prazo
+        self.max_requisicoes = max_requisicoes
+        self.banco = banco
+        self.heap = []
+        self.sequencia = itertools.count()
+        self.condicao = threading.Condition()
+        self.resultados = {}
+        self.vistos = set()
+        self.pendentes = []
+        self.requisicoes = 0
+        self.limite = None
+        self.encerrando = False
+        self.threads = []
+        self.hoje = date.today()
+
+    def _candidatos(self, itens) -> list:
+        candidatos, sem_metadados = [], []
+        for item in itens:
+            if isinstance(item, CandidatoDetalhe):
+                candidatos.append(item)
+            elif isinstance(item, dict):
+                if item.get("linkId"):
+                    candidatos.append(candidato_de_documento(item))
+            elif item:
+                sem_metadados.append(item)
+        if self.banco is None:
+            return candidatos + [CandidatoDetalhe(link_id) for link_id in sem_metadados]
+
+        metadados = self.banco.metadados_detalhe([c.link_id for c in candidatos] + sem_metadados)
+        for candidato in candidatos:
+            candidato.faltante = not metadados.get(candidato.link_id, {}).get("tem_detalhe", False)
+        for link_id in sem_metadados:
+            dados = metadados.get(link_id, {})
+            candidatos.append(CandidatoDetalhe(link_id, dados.get("data_publicacao"), dados.get("assuntos", []),
+                                               dados.get("tribunal"), not dados.get("tem_detalhe", False)))
+        return candidatos
+
+    def adicionar(self, itens):
+        """ Agenda os documentos ainda não vistos
+
+        Args:
+            itens: linkIds, documentos da pesquisa ou CandidatoDetalhe
+        """
+        novos = []
+        with self.condicao:
+            for item in itens:
+                link_id = item.link_id if isinstance(item, CandidatoDetalhe) else link_id_de(item)
+                if link_id and link_id not in self.vistos:
+                    self.vistos.add(link_id)
+                    novos.append(item)
+        if not novos:
+            return
+        candidatos = self._candidatos(novos)
+        with self.condicao:
+            for candidato in candidatos:
+                nota = prioridade(candidato, self.pesos, self.hoje)
+                heapq.heappush(self.heap, (-nota, next(self.sequencia), candidato.link_id))
+            self.condicao.notify(len(candidatos))
+
+    def iniciar(self):
+        """Inicia as threads de trabalho; o prazo conta a partir daqui"""
+        if self.prazo is not None:
+            self.limite = time.monotonic() + self.prazo
+        for _ in range(self.num_workers):
+            thread = threading.Thread(target=self._trabalhar, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def orcamento_esgotado(self) -> bool:
+        if self.limite is not None and time.monotonic() >= self.limite:
+            return True
+        return self.max_requisicoes is not None and self.requisicoes >= self.max_requisicoes
+
+    def _contar_requisicao(self, resposta, *args, **kwargs):
+        with self.condicao:
+            self.requisicoes += 1
+        return resposta
+
+    def _proximo(self):
+        """LinkId de maior prioridade, ou None quando a fila terminou ou o orçamento acabou"""
+        with self.condicao:
+            while True:
+                if self.orcamento_esgotado():
+                    return None
+                if self.heap:
+                    return heapq.heappop(self.heap)[2]
+                if self.encerrando:
+                    return None
+                # Acorda periodicamente para respeitar o prazo mesmo sem novos documentos
+                self.condicao.wait(timeout=1.0)
+
+    def _trabalhar(self):
+        while True:
+            link_id = self._proximo()
+            if link_id is None:
+                with self.condicao:
+                    self.condicao.notify_all()
+                return
+            try:
+                print(f"\nProcessando ID: {link_id}")
+                processador = PdfProcessor(link_id)
+                processador.sessao.hooks["response"].append(self._contar_requisicao)
+                with span("detalhe", link_id=link_id):
+                    result = processador.processar()
+                if result:
+                    with self.condicao:
+                        self.resultados[link_id] = result
+            except Exception as e:
+                print(f"Erro ao processar o ID {link_id}: {e}")
+
+    def finalizar(self):
+        """ Aguarda os documentos agendados (ou o fim do orçamento) e retorna os dados coletados por linkId
+
+        Os linkIds que não couberam no orçamento ficam em `pendentes`.
+        """
+        with self.condicao:
+            self.encerrando = True
+            self.condicao.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        with self.condicao:
+            self.pendentes = [link_id for _, _, link_id in sorted(self.heap)]
+            self.heap = []
+        if self.pendentes:
+            DETALHES.inc(len(self.pendentes), resultado="fora_do_orcamento")
+            print(f"\033[33m{len(self.pendentes)} detalhes ficaram fora do orçamento "
+                  f"({self.requisicoes} requisições)\033[0m")
+        return self.resultados
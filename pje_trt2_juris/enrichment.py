@@ -0,0 +1,138 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from blob_store import RegistroPreguicoso, materializar
+from records import construir_registro, aplicar_dados_especificos
+from role_extractor import completar_envolvidos
+from tracing import descarregar_perfil, span
+
+TAMANHO_CHUNK = 256
+WORKERS_PADRAO = max(1, (os.cpu_count() or 2) - 1)
+
+# Dados específicos por número do processo, definidos em cada processo do pool pelo inicializador
+_dados_especificos = {}
+
+
+def _iniciar_worker(dados_especificos: dict):
+    global _dados_especificos
+    _dados_especificos = dados_especificos
+
+
+def enriquecer_documento(doc: dict, dados_especificos: dict) -> dict:
+    """ Monta o registro completo de um documento da pesquisa
+
+    Completa perito e advogado a partir do texto, constrói o registro (com o
+    CNJ parseado) e sobrepõe os dados específicos do processo, se houver.
+
+    Args:
+        doc: documento da página de resultados
+        dados_especificos: dados específicos chaveados pelo número do processo
+
+    Returns:
+        registro no formato de informacoes_processos_completo.json
+    """
+    if isinstance(doc, RegistroPreguicoso):
+        # O registro usa quase todos os campos; carregados de uma vez, ele sai sem referências
+        doc = materializar(doc)
+    registro = construir_registro(completar_envolvidos(doc))
+    numero_processo = registro["numero"]
+    if numero_processo in dados_especificos:
+        aplicar_dados_especificos(registro, dados_especificos[numero_processo])
+    return registro
+
+
+def _enriquecer_chunk(docs: list, dados_especificos: dict = None) -> tuple[list, list]:
+    """ Enriquece um chunk isolando as falhas por documento
+
+    Returns:
+        (registros na ordem dos documentos, sem os que falharam; [(linkId, erro)])
+    """
+    dados_especificos = _dados_especificos if dados_especificos is None else dados_especificos
+    registros, erros = [], []
+    for doc in docs:
+        try:
+            with span("registro"):
+                registros.append(enriquecer_documento(doc, dados_especificos))
+        except Exception as e:
+            erros.append((doc.get("linkId") if isinstance(doc, dict) else None, f"{type(e).__name__}: {e}"))
+    descarregar_perfil()
+    return registros, erros
+
+
+def _chunks(documentos, tamanho: int):
+    chunk = []
+    for doc in documentos:
+        chunk.append(doc)
+        if len(chunk) >= tamanho:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def enriquecer_documentos(documentos, dados_especificos: dict, workers: int = 1, tamanho_chunk: int = TAMANHO_CHUNK,
+                          erros: list = None):
+    """ Estágio de enriquecimento em paralelo, com saída em streaming e ordem estável
+
+    O fluxo de documentos é dividido em chunks processados num pool de
+    processos; no máximo 2 chunks por worker ficam em voo, então a memória
+    não depende do tamanho do corpus. Os registros saem na ordem dos
+    documentos. Uma falha num documento descarta só aquele documento; uma
+    falha do chunk inteiro (ex: documento que não pode ser serializado) faz
+    o chunk ser refeito localmente, documento a documento. Se o pool quebrar
+    (um worker morreu), os chunks em voo e os restantes são processados no
+    processo atual.
+
+    Args:
+        documentos: iterável de documentos da pesquisa
+        dados_especificos: dados específicos chaveados pelo número do processo
+        workers: processos do pool; com 1 tudo roda no processo atual
+        tamanho_chunk: documentos por tarefa do pool
+        erros: lista que recebe (linkId, erro) de cada documento descartado
+
+    Returns:
+        gerador de registros
+    """
+    erros = [] if erros is None else erros
+    if workers <= 1:
+        for chunk in _chunks(documentos, tamanho_chunk):
+            registros, falhas = _enriquecer_chunk(chunk, dados_especificos)
+            erros.extend(falhas)
+            yield from registros
+        return
+
+    chunks = _chunks(documentos, tamanho_chunk)
+    with ProcessPoolExecutor(workers, initializer=_iniciar_worker, initargs=(dados_especificos,)) as pool:
+        em_voo = deque()
+        for chunk in chunks:
+            try:
+                em_voo.append((chunk, pool.submit(_enriquecer_chunk, chunk)))
+            except BrokenProcessPool:
+                print("\033[31mPool de processos quebrado; continuando no processo atual\033[0m")
+                em_voo.append((chunk, None))
+                break
+            if len(em_voo) >= 2 * workers:
+                yield from _resultado_chunk(*em_voo.popleft(), dados_especificos, erros)
+        while em_voo:
+            yield from _resultado_chunk(*em_voo.popleft(), dados_especificos, erros)
+    # Sobra algo só se o pool quebrou: o resto do fluxo roda localmente
+    for chunk in chunks:
+        registros, falhas = _enriquecer_chunk(chunk, dados_especificos)
+        erros.extend(falhas)
+        yield from registros
+
+
+def _resultado_chunk(chunk: list, futuro, dados_especificos: dict, erros: list) -> list:
+    if futuro is None:
+        registros, falhas = _enriquecer_chunk(chunk, dados_especificos)
+        erros.extend(falhas)
+        return registros
+    try:
+        registros, falhas = futuro.result()
+    except Exception as e:
+        print(f"\033[31mErro no chunk de {len(chunk)} documentos ({e}); refazendo localmente\033[0m")
+        registros, falhas = _enriquecer_chunk(chunk, dados_especificos)
+    erros.extend(falhas)
+    return registros
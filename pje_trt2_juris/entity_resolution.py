@@ -0,0 +1,277 @@
+import argparse
+import json
+import re
+import sqlite3
+import struct
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from parsing import parse_nome
+from paths import ARQUIVO_PARTES
+from process_store import chave_processo
+from role_extractor import dobrar
+
+NUM_PERMUTACOES = 64
+LINHAS_POR_BANDA = 4
+TAMANHO_SHINGLE = 3
+LIMIAR_SIMILARIDADE = 0.7
+# Limite dos caches em memória (nomes normalizados, shingles e ids); o resto é lido da tabela nomes
+TAMANHO_CACHE = 65536
+
+_PRIMO = (1 << 61) - 1
+_MASCARA = (1 << 32) - 1
+
+# Termos societários e de ligação que não distinguem uma parte da outra
+_TERMOS_IGNORADOS = re.compile(r"\b(?:LTDA|S ?A|S ?/ ?A|EIRELI|EPP|ME|CIA|COMPANHIA|DE|DA|DO|DAS|DOS|E)\b")
+_NAO_ALFANUMERICO = re.compile(r"[^A-Z0-9 ]+")
+_NUMEROS = re.compile(r"\d+")
+
+
+def _permutacoes(quantidade: int) -> list[tuple[int, int]]:
+    """Coeficientes (a, b) fixos das permutações universais, para assinaturas estáveis entre execuções"""
+    coeficientes, semente = [], 0x9E3779B97F4A7C15
+    while len(coeficientes) < quantidade:
+        semente = (semente * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        a = (semente >> 3) % _PRIMO
+        semente = (semente * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        if a:
+            coeficientes.append((a, (semente >> 3) % _PRIMO))
+    return coeficientes
+
+
+_PERMUTACOES = _permutacoes(NUM_PERMUTACOES)
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def normalizar_parte(nome: str) -> str:
+    """ Chave de comparação do nome: sem acento, sem pontuação e sem termos societários
+
+    Args:
+        nome: nome da parte como veio do processo
+
+    Returns:
+        nome normalizado (vazio se não sobrar nada)
+    """
+    nome = dobrar(parse_nome(nome, rem_comp_indent=True) or "")
+    nome = _TERMOS_IGNORADOS.sub(" ", _NAO_ALFANUMERICO.sub(" ", nome))
+    return " ".join(nome.split())
+
+
+def shingles(nome: str, tamanho: int = TAMANHO_SHINGLE) -> set[str]:
+    """Conjunto de n-gramas de caracteres do nome normalizado"""
+    texto = f" {nome} "
+    if len(texto) <= tamanho:
+        return {texto}
+    return {texto[i:i + tamanho] for i in range(len(texto) - tamanho + 1)}
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _shingles(normalizado: str) -> frozenset[str]:
+    return frozenset(shingles(normalizado))
+
+
+def assinatura_minhash(conjunto: set[str]) -> list[int]:
+    """ Assinatura MinHash do conjunto de shingles
+
+    Returns:
+        NUM_PERMUTACOES valores mínimos, um por permutação
+    """
+    valores = [zlib.crc32(s.encode("utf-8")) for s in conjunto]
+    return [min((a * v + b) % _PRIMO for v in valores) & _MASCARA for a, b in _PERMUTACOES]
+
+
+def chaves_bandas(assinatura: list[int], linhas: int = LINHAS_POR_BANDA) -> list[tuple[int, int]]:
+    """Chaves LSH (banda, hash das linhas da banda) da assinatura"""
+    return [(banda, zlib.crc32(struct.pack(f"{linhas}I", *assinatura[i:i + linhas])))
+            for banda, i in enumerate(range(0, len(assinatura), linhas))]
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class ResolvedorPartes:
+    """ Resolução de entidades das partes com blocagem MinHash/LSH
+
+    Cada nome normalizado distinto recebe uma assinatura MinHash dos seus
+    shingles de caracteres e é gravado nos baldes LSH de cada banda. Um nome
+    novo só é comparado (Jaccard exato dos shingles) com os nomes que
+    compartilham algum balde e têm os mesmos números; se o melhor passar do
+    limiar ele herda o id da parte, senão vira uma parte nova. Os ids ficam
+    no SQLite e nunca mudam: a atribuição é incremental à medida que chegam
+    processos novos.
+
+    As menções são pares (processo, parte) gravados uma vez só, então rodar
+    de novo sobre os mesmos processos não altera as contagens. Os caches em
+    memória são LRU de TAMANHO_CACHE entradas; fora deles, o id vem da
+    tabela nomes.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_PARTES, limiar: float = LIMIAR_SIMILARIDADE):
+        self.limiar = limiar
+        self.conn = sqlite3.connect(caminho)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS partes (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL,
+                                               mencoes INTEGER NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS nomes (normalizado TEXT PRIMARY KEY, parte_id INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS baldes (banda INTEGER, chave INTEGER, normalizado TEXT,
+                                               PRIMARY KEY (banda, chave, normalizado)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_nomes_parte ON nomes (parte_id);
+            CREATE TABLE IF NOT EXISTS mencoes (processo TEXT NOT NULL, parte_id INTEGER NOT NULL,
+                                                PRIMARY KEY (processo, parte_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_mencoes_parte ON mencoes (parte_id);
+        """)
+        self.ids = OrderedDict()
+        self.mencoes = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        self.descarregar()
+        self.conn.close()
+
+    def descarregar(self):
+        """Grava as menções (processo, parte) novas, atualiza a contagem das partes afetadas e confirma a transação"""
+        if self.mencoes:
+            self.conn.executemany("INSERT OR IGNORE INTO mencoes (processo, parte_id) VALUES (?, ?)",
+                                  sorted(self.mencoes))
+            self.conn.executemany("""
+                UPDATE partes SET mencoes = (SELECT COUNT(*) FROM mencoes WHERE parte_id = ?) WHERE id = ?
+            """, [(parte_id, parte_id) for parte_id in {parte_id for _, parte_id in self.mencoes}])
+            self.mencoes = set()
+        self.conn.commit()
+
+    def _candidatos(self, chaves: list[tuple[int, int]]) -> dict[str, int]:
+        """Nomes que compartilham algum balde LSH, com o id da parte de cada um"""
+        candidatos = {}
+        for banda, chave in chaves:
+            candidatos.update(self.conn.execute("""
+                SELECT b.normalizado, n.parte_id FROM baldes b JOIN nomes n ON n.normalizado = b.normalizado
+                WHERE b.banda = ? AND b.chave = ?
+            """, (banda, chave)))
+        return candidatos
+
+    def resolver(self, nome: str) -> int:
+        """ Id estável da parte para o nome, criando uma parte nova se nenhum nome parecido existir
+
+        Args:
+            nome: nome da parte como veio do processo
+
+        Returns:
+            id da parte, ou None para nome vazio
+        """
+        if not isinstance(nome, str):
+            return None
+        normalizado = normalizar_parte(nome)
+        if not normalizado:
+            return None
+
+        parte_id = self.ids.get(normalizado)
+        if parte_id is not None:
+            self.ids.move_to_end(normalizado)
+            return parte_id
+        row = self.conn.execute("SELECT parte_id FROM nomes WHERE normalizado = ?", (normalizado,)).fetchone()
+        parte_id = row[0] if row else self._novo_nome(normalizado, nome)
+        self.ids[normalizado] = parte_id
+        if len(self.ids) > TAMANHO_CACHE:
+            self.ids.popitem(last=False)
+        return parte_id
+
+    def _novo_nome(self, normalizado: str, nome: str) -> int:
+        conjunto = _shingles(normalizado)
+        chaves = chaves_bandas(assinatura_minhash(conjunto))
+        numeros = _NUMEROS.findall(normalizado)
+
+        melhor, parte_id = self.limiar, None
+        for candidato, candidato_id in self._candidatos(chaves).items():
+            if _NUMEROS.findall(candidato) != numeros:
+                continue
+            similaridade = jaccard(conjunto, _shingles(candidato))
+            if similaridade >= melhor:
+                melhor, parte_id = similaridade, candidato_id
+        if parte_id is None:
+            parte_id = self.conn.execute("INSERT INTO partes (nome) VALUES (?)", (nome,)).lastrowid
+
+        self.conn.execute("INSERT INTO nomes (normalizado, parte_id) VALUES (?, ?)", (normalizado, parte_id))
+        self.conn.executemany("INSERT OR IGNORE INTO baldes (banda, chave, normalizado) VALUES (?, ?, ?)",
+                              [(banda, chave, normalizado) for banda, chave in chaves])
+        return parte_id
+
+    def atribuir(self, registro: dict) -> dict:
+        """ Acrescenta ao registro os ids das partes dos envolvidos e representantes
+
+        Cada envolvido recebe "partes_ids", alinhada com a lista de nomes, e
+        cada representante recebe "parte_id". Cada parte conta uma menção por
+        processo (linkId ou número), gravada em `descarregar`.
+
+        Args:
+            registro: registro no formato de construir_registro, alterado no lugar
+
+        Returns:
+            o próprio registro
+        """
+        ids = []
+        for fonte in registro.get("fontes") or []:
+            for instancia in fonte.get("instancias") or []:
+                for envolvido in instancia.get("envolvidos") or []:
+                    nomes = envolvido.get("nome")
+                    nomes = nomes if isinstance(nomes, list) else [nomes]
+                    envolvido["partes_ids"] = [self.resolver(n) for n in nomes]
+                    ids.extend(envolvido["partes_ids"])
+                    for representante in envolvido.get("representantes") or []:
+                        representante["parte_id"] = self.resolver(representante.get("nome"))
+                        ids.append(representante["parte_id"])
+        if registro.get("linkId") or registro.get("numero"):
+            processo = chave_processo(registro)
+            self.mencoes.update((processo, parte_id) for parte_id in ids if parte_id is not None)
+        return registro
+
+    def atribuir_lote(self, registros, tamanho_lote: int = 1000):
+        """Gerador que atribui os ids a cada registro, confirmando a cada `tamanho_lote`"""
+        for n, registro in enumerate(registros, 1):
+            yield self.atribuir(registro)
+            if n % tamanho_lote == 0:
+                self.descarregar()
+        self.descarregar()
+
+    def variantes(self, parte_id: int) -> list[str]:
+        """Nomes normalizados atribuídos à parte"""
+        return [n for (n,) in self.conn.execute("SELECT normalizado FROM nomes WHERE parte_id = ? ORDER BY normalizado",
+                                                (parte_id,))]
+
+    def maiores(self, limite: int = 20) -> list[tuple[int, str, int, int]]:
+        """Partes com mais menções: (id, nome, menções, variantes)"""
+        self.descarregar()
+        return self.conn.execute("""
+            SELECT p.id, p.nome, p.mencoes, COUNT(n.normalizado) FROM partes p JOIN nomes n ON n.parte_id = p.id
+            GROUP BY p.id ORDER BY p.mencoes DESC LIMIT ?
+        """, (limite,)).fetchall()
+
+
+if __name__ == "__main__":
+    from process_store import BancoProcessos, ARQUIVO_BANCO
+
+    parser = argparse.ArgumentParser(description="Resolução de entidades das partes dos processos")
+    parser.add_argument("--partes", default=ARQUIVO_PARTES)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    res = sub.add_parser("resolver", help="atribui ids de parte aos processos da base")
+    res.add_argument("--banco", default=ARQUIVO_BANCO)
+    res.add_argument("--limiar", type=float, default=LIMIAR_SIMILARIDADE)
+    mai = sub.add_parser("maiores", help="lista as partes com mais menções")
+    mai.add_argument("--limite", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.comando == "resolver":
+        with ResolvedorPartes(args.partes, args.limiar) as resolvedor, BancoProcessos(args.banco) as banco:
+            total = banco.salvar_processos(resolvedor.atribuir_lote(banco.iterar_processos()))
+            print(f"\033[32m{total}\033[0m processos com ids de parte")
+    else:
+        with ResolvedorPartes(args.partes) as resolvedor:
+            for parte_id, nome, mencoes, variantes in resolvedor.maiores(args.limite):
+                print(json.dumps({"id": parte_id, "nome": nome, "mencoes": mencoes, "variantes": variantes},
+                                 ensure_ascii=False))
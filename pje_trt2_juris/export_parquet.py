@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from merge import iterar_array_json
+from paths import ARQUIVO_BANCO, PASTA_PARQUET
+from process_store import BancoProcessos
+
+ARQUIVO_ESTADO = "_estado_exportacao.json"
+REGISTROS_POR_LOTE = 20000
+
+_texto = pa.string()
+_lista_texto = pa.list_(pa.string())
+
+ESQUEMAS = {
+    "processos": pa.schema([
+        ("link_id", _texto), ("numero", _texto), ("area_code", _texto), ("tribunal_code", _texto),
+        ("vara_code", _texto), ("ano", _texto), ("area", _texto), ("tribunal", _texto), ("valor_causa", _texto),
+        ("grau", _texto), ("classe", _texto), ("orgao_julgador", _texto), ("assunto_principal", _texto),
+        ("assuntos", _lista_texto), ("classe_judicial", _texto), ("ano_processo", _texto),
+        ("tipo_documento", _texto), ("data_publicacao", _texto), ("exportado_em", pa.float64()),
+    ]),
+    "envolvidos": pa.schema([
+        ("link_id", _texto), ("numero", _texto), ("tribunal", _texto), ("ano", _texto),
+        ("envolvido", pa.int32()), ("nomes", _lista_texto), ("tipo", _texto), ("polo", _texto), ("cpf", _texto),
+        ("exportado_em", pa.float64()),
+    ]),
+    "representantes": pa.schema([
+        ("link_id", _texto), ("numero", _texto), ("tribunal", _texto), ("ano", _texto),
+        ("envolvido", pa.int32()), ("nome", _texto), ("tipo", _texto), ("polo", _texto), ("cpf", _texto),
+        ("oab", _texto), ("municipio", _texto), ("estado", _texto), ("cep", _texto),
+        ("exportado_em", pa.float64()),
+    ]),
+    "movimentacoes": pa.schema([
+        ("link_id", _texto), ("numero", _texto), ("tribunal", _texto), ("ano", _texto),
+        ("ordem", pa.int32()), ("titulo", _texto), ("tipo", _texto), ("tipo_conteudo", _texto),
+        ("data", _texto), ("ativo", _texto), ("sigiloso", _texto),
+        ("exportado_em", pa.float64()),
+    ]),
+}
+
+
+def _str(valor):
+    """Converte o valor para texto, mantendo None"""
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+def _lista(valor) -> list:
+    if valor is None:
+        return []
+    if isinstance(valor, list):
+        return [_str(v) for v in valor]
+    return [_str(valor)]
+
+
+def _documento(documentos: list, tipo: str):
+    for documento in documentos or []:
+        if isinstance(documento, dict) and documento.get("tipo") == tipo:
+            return _str(documento.get("valor"))
+    return None
+
+
+def achatar_registro(registro: dict, exportado_em: float, tabelas: dict):
+    """ Distribui um registro de processo nas linhas das quatro tabelas colunares
+
+    Args:
+        registro: registro de informacoes_processos_completo.json
+        exportado_em: instante da exportação, gravado em todas as tabelas para deduplicar
+            versões de um mesmo linkId (as linhas filhas da versão mais recente têm o maior exportado_em)
+        tabelas: mapa nome da tabela -> lista de linhas, acrescentadas no lugar
+    """
+    chave = {"link_id": _str(registro.get("linkId")), "numero": _str(registro.get("numero")),
+             "tribunal": _str(registro.get("tribunal")) or "desconhecido", "ano": _str(registro.get("ano")) or "desconhecido",
+             "exportado_em": exportado_em}
+    instancia = {}
+    fontes = registro.get("fontes") or []
+    if fontes and fontes[0].get("instancias"):
+        instancia = fontes[0]["instancias"][0]
+
+    movimentacoes = instancia.get("movimentacoes") or []
+    data_publicacao = next((m.get("data") for m in movimentacoes if isinstance(m, dict) and m.get("data")), None)
+
+    tabelas["processos"].append({
+        **chave,
+        "area_code": _str(registro.get("area_code")), "tribunal_code": _str(registro.get("tribunal_code")),
+        "vara_code": _str(registro.get("vara_code")), "area": _str(registro.get("area:")),
+        "valor_causa": _str(registro.get("valor_causa")), "grau": _str(instancia.get("grau")),
+        "classe": _str(instancia.get("classe")), "orgao_julgador": _str(instancia.get("orgao_julgador")),
+        "assunto_principal": _str(instancia.get("assunto_principal")), "assuntos": _lista(instancia.get("assuntos")),
+        "classe_judicial": _str(registro.get("classeJudicial")), "ano_processo": _str(registro.get("anoProcesso")),
+        "tipo_documento": _str(registro.get("tipoDocumento")), "data_publicacao": _str(data_publicacao),
+    })
+
+    for i, envolvido in enumerate(instancia.get("envolvidos") or []):
+        tabelas["envolvidos"].append({
+            **chave, "envolvido": i, "nomes": _lista(envolvido.get("nome")), "tipo": _str(envolvido.get("tipo")),
+            "polo": _str(envolvido.get("polo")), "cpf": _documento(envolvido.get("documento"), "CPF"),
+        })
+        for representante in envolvido.get("representantes") or []:
+            endereco = representante.get("endereco") or {}
+            tabelas["representantes"].append({
+                **chave, "envolvido": i, "nome": _str(representante.get("nome")),
+                "tipo": _str(representante.get("tipo")), "polo": _str(representante.get("polo")),
+                "cpf": _documento(representante.get("documento"), "CPF"),
+                "oab": _documento(representante.get("documento"), "OAB-ADVOGADO"),
+                "municipio": _str(endereco.get("municipio")), "estado": _str(endereco.get("estado")),
+                "cep": _str(endereco.get("cep")),
+            })
+
+    for ordem, movimentacao in enumerate(movimentacoes):
+        if not isinstance(movimentacao, dict):
+            continue
+        tabelas["movimentacoes"].append({
+            **chave, "ordem": ordem, "titulo": _str(movimentacao.get("titulo")), "tipo": _str(movimentacao.get("tipo")),
+            "tipo_conteudo": _str(movimentacao.get("tipoConteudo")), "data": _str(movimentacao.get("data")),
+            "ativo": _str(movimentacao.get("ativo")), "sigiloso": _str(movimentacao.get("documentoSigiloso")),
+        })
+
+
+def _gravar_lote(pasta: str, tabelas: dict):
+    """Grava as linhas acumuladas como novos arquivos Parquet, sem tocar nos existentes"""
+    lote = uuid.uuid4().hex
+    for nome, linhas in tabelas.items():
+        if not linhas:
+            continue
+        tabela = pa.Table.from_pylist(linhas, schema=ESQUEMAS[nome])
+        ds.write_dataset(
+            tabela, os.path.join(pasta, nome), format="parquet",
+            partitioning=ds.partitioning(pa.schema([("tribunal", _texto), ("ano", _texto)]), flavor="hive"),
+            basename_template=f"parte-{lote}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        linhas.clear()
+
+
+def exportar_parquet(registros, pasta: str = PASTA_PARQUET, registros_por_lote: int = REGISTROS_POR_LOTE) -> int:
+    """ Exporta registros de processo para Parquet particionado por tribunal e ano
+
+    Cada lote vira arquivos novos com nome único dentro das partições
+    `tribunal=<x>/ano=<y>` de cada tabela (processos, envolvidos,
+    representantes, movimentacoes). Partições e arquivos já existentes nunca
+    são reescritos; um processo reexportado aparece de novo com um
+    `exportado_em` mais recente.
+
+    Args:
+        registros: iterável de registros de processo
+        pasta: pasta raiz do dataset
+        registros_por_lote: processos acumulados antes de cada gravação
+
+    Returns:
+        quantidade de processos exportados
+    """
+    tabelas = {nome: [] for nome in ESQUEMAS}
+    exportado_em = time.time()
+    total = 0
+    for registro in registros:
+        achatar_registro(registro, exportado_em, tabelas)
+        total += 1
+        if total % registros_por_lote == 0:
+            _gravar_lote(pasta, tabelas)
+    _gravar_lote(pasta, tabelas)
+    return total
+
+
+def exportar_incremental(banco: BancoProcessos, pasta: str = PASTA_PARQUET) -> int:
+    """ Exporta apenas os processos alterados na base desde a última exportação
+
+    Args:
+        banco: base de processos
+        pasta: pasta raiz do dataset, onde também fica o estado da exportação
+
+    Returns:
+        quantidade de processos exportados
+    """
+    caminho_estado = os.path.join(pasta, ARQUIVO_ESTADO)
+    estado = {"atualizado_ate": 0.0}
+    if os.path.exists(caminho_estado):
+        with open(caminho_estado, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+
+    marca = {"atualizado_ate": estado["atualizado_ate"]}
+
+    def alterados():
+        for registro, atualizado_em in banco.iterar_alterados(estado["atualizado_ate"]):
+            marca["atualizado_ate"] = max(marca["atualizado_ate"], atualizado_em)
+            yield registro
+
+    total = exportar_parquet(alterados(), pasta)
+    os.makedirs(pasta, exist_ok=True)
+    with open(caminho_estado + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(marca, f)
+    os.replace(caminho_estado + ".tmp", caminho_estado)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta os processos para Parquet particionado por tribunal/ano")
+    parser.add_argument("--saida", default=PASTA_PARQUET)
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--banco", default=ARQUIVO_BANCO, help="exporta incrementalmente da base SQLite")
+    origem.add_argument("--json", help="exporta um informacoes_processos_completo.json inteiro")
+    args = parser.parse_args()
+
+    if args.json:
+        total = exportar_parquet(iterar_array_json(args.json), args.saida)
+    else:
+        with BancoProcessos(args.banco) as banco:
+            total = exportar_incremental(banco, args.saida)
+    print(f"\033[32m{total}\033[0m processos exportados para {args.saida}")
@@ -0,0 +1,136 @@
+import json
+import os
+import requests
+from urllib.parse import urlparse
+from cassette import cassette_ambiente, montar_cassette
+from metrics import BYTES_BAIXADOS, HTTP_RESPOSTAS, HTTP_SEGUNDOS
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import brotli  # noqa: F401  (o urllib3 decodifica "br" quando o brotli esta instalado)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+MENSAGEM_CAPTCHA_INCORRETO = "A resposta informada é incorreta"
+
+# Base da API de jurisprudência; PJE_JURIS_URL aponta os bots para outro servidor (ex: mock_backend.py)
+URL_API = os.environ.get("PJE_JURIS_URL", "https://pje.trt2.jus.br/juris-backend/api").rstrip("/")
+
+
+def criar_sessao() -> requests.Session:
+    """ Cria a sessão HTTP usada pelos bots, negociando compressão com o servidor
+
+    Com PJE_CASSETTE=<arquivo> a sessão grava as respostas no cassette ou as
+    reproduz dele (ver cassette.py), sem acessar o servidor.
+
+    Returns:
+        sessão com Accept-Encoding gzip/deflate (e brotli quando disponível)
+    """
+    sessao = requests.Session()
+    sessao.headers.update({"Accept-Encoding": ACCEPT_ENCODING})
+    sessao.hooks["response"].append(_medir_resposta)
+    ambiente = cassette_ambiente()
+    if ambiente is not None:
+        montar_cassette(sessao, *ambiente)
+    return sessao
+
+
+def _rota(url: str) -> str:
+    """Rota da API para os rótulos das métricas: captcha, documentos ou detalhe"""
+    partes = urlparse(url).path.rstrip("/").split("/")
+    if partes[-1] in ("captcha", "documentos"):
+        return partes[-1]
+    return "detalhe" if len(partes) > 1 and partes[-2] == "documentos" else "outra"
+
+
+def _medir_resposta(resposta: requests.Response, *args, **kwargs):
+    """Hook da sessão: latência até os cabeçalhos e status de cada resposta"""
+    rota = _rota(resposta.url)
+    HTTP_SEGUNDOS.observar(resposta.elapsed.total_seconds(), rota=rota)
+    HTTP_RESPOSTAS.inc(rota=rota, status=resposta.status_code)
+
+
+def _contar_bytes(resposta: requests.Response):
+    """Soma aos bytes baixados o corpo lido do stream (comprimido, como veio da rede)"""
+    try:
+        BYTES_BAIXADOS.inc(resposta.raw.tell(), rota=_rota(resposta.url))
+    except Exception:
+        pass
+
+
+def _corpo_descomprimido(resposta: requests.Response):
+    """ Retorna o corpo da resposta como stream já descomprimido
+
+    Args:
+        resposta: resposta obtida com stream=True
+
+    Returns:
+        objeto com read() entregando o corpo descomprimido
+    """
+    resposta.raw.decode_content = True
+    return resposta.raw
+
+
+def iterar_documentos(resposta: requests.Response, info: dict = None):
+    """ Decodifica incrementalmente o array "documents" de uma página de resultados
+
+    Cada documento é entregue assim que termina de ser lido do stream, sem
+    carregar a página inteira em memória. Os demais campos escalares do topo
+    do JSON (ex: "mensagem") são copiados para `info` ao final da leitura.
+
+    Args:
+        resposta: resposta obtida com stream=True
+        info: dicionário que recebe os campos de topo da resposta
+
+    Returns:
+        gerador de documentos
+    """
+    info = {} if info is None else info
+
+    if ijson is None:
+        conteudo = resposta.json()
+        BYTES_BAIXADOS.inc(len(resposta.content), rota=_rota(resposta.url))
+        info.update({k: v for k, v in conteudo.items() if k != "documents"})
+        yield from conteudo.get("documents", [])
+        return
+
+    documento, profundidade = None, 0
+    for prefixo, evento, valor in ijson.parse(_corpo_descomprimido(resposta), use_float=True):
+        if documento is not None:
+            documento.event(evento, valor)
+            if evento in ("start_map", "start_array"):
+                profundidade += 1
+            elif evento in ("end_map", "end_array"):
+                profundidade -= 1
+            if profundidade == 0:
+                yield documento.value
+                documento = None
+        elif prefixo == "documents.item" and evento == "start_map":
+            documento, profundidade = ijson.ObjectBuilder(), 1
+            documento.event(evento, valor)
+        elif prefixo and "." not in prefixo and evento in ("string", "number", "boolean", "null"):
+            info[prefixo] = valor
+    _contar_bytes(resposta)
+
+
+def ler_json(resposta: requests.Response):
+    """ Decodifica o corpo JSON da resposta uma única vez, direto do stream
+
+    Args:
+        resposta: resposta obtida com stream=True
+
+    Returns:
+        conteúdo decodificado
+    """
+    conteudo = json.load(_corpo_descomprimido(resposta))
+    _contar_bytes(resposta)
+    return conteudo
@@ -0,0 +1,180 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+from urllib.parse import urlparse
+
+import requests
+
+import http_client
+from mock_backend import adicionar_argumentos, estado_de_argumentos, iniciar_em_segundo_plano
+
+
+class SolverOraculo:
+    """ Solver de CAPTCHA que conhece os rótulos do servidor falso
+
+    Isola o desempenho do pipeline do custo e da taxa de acerto do OCR: cada
+    imagem é respondida com o seu rótulo, e uma fração (1 - acuracia) das
+    respostas é trocada por um texto errado para exercitar as novas tentativas.
+
+    Args:
+        captchas: [(rótulo, data URI)] do mock_backend
+        acuracia: probabilidade de responder certo
+    """
+
+    def __init__(self, captchas: list, acuracia: float = 1.0, semente: int = None):
+        self.rotulos = {imagem.split(",", 1)[1]: rotulo for rotulo, imagem in captchas}
+        self.acuracia = acuracia
+        self.rng = random.Random(semente)
+        self.lock = threading.Lock()
+
+    def __call__(self, base64_string: str, *args, **kwargs) -> str:
+        rotulo = self.rotulos.get(base64_string, "")
+        with self.lock:
+            acertou = self.rng.random() < self.acuracia
+        return rotulo if acertou else rotulo[::-1] + "x"
+
+
+def instalar_solver(solver):
+    """ Troca o solve_captcha_local usado pelo bot e pelo PdfProcessor
+
+    Deve ser chamada antes de importar o bot: se o módulo de OCR (e suas
+    dependências) não estiver disponível, o oráculo o substitui por completo.
+    """
+    try:
+        import captcha_local_solver
+    except ImportError:
+        captcha_local_solver = sys.modules["captcha_local_solver"] = types.ModuleType("captcha_local_solver")
+    captcha_local_solver.solve_captcha_local = solver
+    for modulo in ("bot_pje_trt2_juris", "pdf_proc"):
+        if modulo in sys.modules:
+            sys.modules[modulo].solve_captcha_local = solver
+
+
+def estatisticas_servidor(url_api: str) -> dict:
+    url = urlparse(url_api)
+    resposta = requests.get(f"{url.scheme}://{url.netloc}/estatisticas", timeout=10)
+    resposta.raise_for_status()
+    return resposta.json()
+
+
+def _total(contador) -> float:
+    return sum(contador.valores.values())
+
+
+def executar_rodada(workers: int, assunto: str, paginas: int, procs_por_pagina: int, url_api: str,
+                    detalhes: bool = True, max_retries: int = 5) -> dict:
+    """ Coleta `paginas` páginas com `workers` bots em paralelo e mede o pipeline de ponta a ponta
+
+    Cada thread tem o seu bot e o seu ArmazemSegmentos (numa pasta temporária)
+    e processa as páginas i, i + workers, ...; os linkIds vão para uma
+    FilaDetalhes compartilhada com `workers` threads, como no run() do bot.
+
+    Returns:
+        documentos, detalhes, segundos, documentos por segundo, CAPTCHAs por
+        documento (pedidos ao servidor) e falhas
+    """
+    from bot_pje_trt2_juris import Bot_trt2_pje_juris
+    from metrics import DOCUMENTOS
+    from pdf_proc import FilaDetalhes
+    from storage import ArmazemSegmentos
+
+    class _SemDetalhes:
+        def adicionar(self, link_ids):
+            pass
+
+    fila = FilaDetalhes(workers) if detalhes else _SemDetalhes()
+    antes_servidor, antes_documentos = estatisticas_servidor(url_api), _total(DOCUMENTOS)
+    falhas = []
+
+    def trabalhar(indice: int, pasta: str):
+        with ArmazemSegmentos(os.path.join(pasta, str(indice))) as armazem:
+            bot = Bot_trt2_pje_juris(assunto, procs_por_pagina, fila_detalhes=fila, armazem=armazem)
+            for pagina in range(indice + 1, paginas + 1, workers):
+                for _ in range(max_retries):
+                    if not bot.url_post:
+                        bot.fazer_requisicao_captcha()
+                    if bot.url_post and bot.enviar_documento(pagina):
+                        break
+                else:
+                    falhas.append(pagina)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        inicio = time.perf_counter()
+        if detalhes:
+            fila.iniciar()
+        threads = [threading.Thread(target=trabalhar, args=(i, pasta)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        resultados = fila.finalizar() if detalhes else {}
+        segundos = time.perf_counter() - inicio
+
+    depois = estatisticas_servidor(url_api)
+    documentos = int(_total(DOCUMENTOS) - antes_documentos)
+    captchas = depois.get("captchas", 0) - antes_servidor.get("captchas", 0)
+    return {
+        "workers": workers,
+        "documentos": documentos,
+        "detalhes": len(resultados),
+        "segundos": round(segundos, 3),
+        "documentos_por_segundo": round(documentos / segundos, 2) if segundos > 0 else None,
+        "captchas_por_documento": round(captchas / documentos, 3) if documentos else None,
+        "throttled": depois.get("throttled", 0) - antes_servidor.get("throttled", 0),
+        "erros_injetados": depois.get("erros_injetados", 0) - antes_servidor.get("erros_injetados", 0),
+        "paginas_falhas": sorted(falhas),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do bot contra o juris-backend falso")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="quantidades de workers testadas")
+    parser.add_argument("--paginas", type=int, default=20, help="páginas coletadas por rodada")
+    parser.add_argument("--procs-por-pagina", type=int, default=10)
+    parser.add_argument("--assunto", default="teste")
+    parser.add_argument("--sem-detalhes", action="store_true", help="não busca as páginas de detalhe")
+    parser.add_argument("--url", help="URL base de um servidor já em execução (por padrão sobe um mock local)")
+    parser.add_argument("--solver", choices=["oraculo", "ocr"], default="oraculo",
+                        help="oraculo responde pelos rótulos; ocr usa o captcha_local_solver")
+    parser.add_argument("--acuracia", type=float, default=0.9, help="taxa de acerto do oráculo")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída do bot")
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    estado = estado_de_argumentos(args)
+    url_api = args.url
+    if url_api is None:
+        _, url_api = iniciar_em_segundo_plano(estado)
+    # http_client já foi importado pelo mock_backend: a URL vai no módulo (para os bots) e no ambiente
+    os.environ["PJE_JURIS_URL"] = http_client.URL_API = url_api
+    if args.solver == "oraculo":
+        instalar_solver(SolverOraculo(estado.captchas, args.acuracia, args.semente))
+
+    print(f"Servidor: \033[32m{url_api}\033[0m")
+    print(f"{'workers':>8} {'docs':>7} {'detalhes':>9} {'seg':>8} {'docs/s':>9} {'captchas/doc':>13} {'429':>5} {'500':>5}")
+    resultados = []
+    for workers in args.workers:
+        saida = contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(io.StringIO())
+        with saida:
+            resultado = executar_rodada(workers, args.assunto, args.paginas, args.procs_por_pagina, url_api,
+                                        detalhes=not args.sem_detalhes)
+        resultados.append(resultado)
+        print(f"{workers:>8} {resultado['documentos']:>7} {resultado['detalhes']:>9} {resultado['segundos']:>8} "
+              f"{resultado['documentos_por_segundo']!s:>9} {resultado['captchas_por_documento']!s:>13} "
+              f"{resultado['throttled']:>5} {resultado['erros_injetados']:>5}")
+        if resultado["paginas_falhas"]:
+            print(f"\033[31mPáginas que falharam: {resultado['paginas_falhas']}\033[0m")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Resultados salvos em: \033[32m{args.saida}\033[0m")
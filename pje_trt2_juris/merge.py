@@ -0,0 +1,148 @@
+import hashlib
+import json
+from metrics import MESCLAGEM_PROCESSOS, MESCLAGEM_SEGUNDOS
+from records import EscritorRegistros, aplicar_dados_especificos
+from tracing import span
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def hash_numero(numero: str) -> str:
+    """Chave MD5 do número do processo, usada pelos dados específicos antigos"""
+    return hashlib.md5(numero.encode()).hexdigest()
+
+
+def iterar_array_json(caminho: str):
+    """ Lê um array JSON de registros um por vez (com ijson) ou de uma vez (sem ijson)
+
+    Args:
+        caminho: arquivo com um array JSON
+
+    Returns:
+        gerador de registros
+    """
+    with open(caminho, "rb") as f:
+        if ijson is None:
+            yield from json.load(f)
+        else:
+            yield from ijson.items(f, "item", use_float=True)
+
+
+class IndiceDetalhes:
+    """ Índices hash dos dados específicos pelas três chaves usadas no projeto
+
+    Os dados específicos chegam chaveados por linkId (pdf_proc), por número CNJ
+    (coletar_informacoes_memoria) ou pelo MD5 do número (merginJSON). Cada
+    entrada é indexada uma única vez pela chave original e, quando traz o
+    número do processo, também pelo número e pelo hash dele.
+    """
+
+    def __init__(self, dados_especificos: dict):
+        self.dados = dados_especificos
+        self.por_chave = dict(dados_especificos)
+        for chave, dados in dados_especificos.items():
+            numero = (dados.get("numero") or dados.get("processo")) if isinstance(dados, dict) else None
+            if isinstance(numero, str) and numero:
+                self.por_chave.setdefault(numero, dados)
+                self.por_chave.setdefault(hash_numero(numero), dados)
+
+    def buscar(self, processo: dict):
+        """ Procura os dados do processo por linkId, número e hash do número, nessa ordem
+
+        Returns:
+            (tipo de chave, dados) ou (None, None)
+        """
+        link_id = processo.get("linkId")
+        if link_id is not None and link_id in self.por_chave:
+            return "linkId", self.por_chave[link_id]
+        numero = processo.get("numero")
+        if numero:
+            if numero in self.por_chave:
+                return "numero", self.por_chave[numero]
+            hash_id = hash_numero(numero)
+            if hash_id in self.por_chave:
+                return "hash", self.por_chave[hash_id]
+        return None, None
+
+
+def mesclar_processo(processo: dict, dados: dict):
+    """ Aplica os dados específicos a um registro de processo
+
+    Os campos de topo são sobrescritos (como fazia merge_json_files) e os
+    envolvidos/representantes são atualizados pelos campos poloAtivo,
+    poloPassivo, documentos e advogados (como em coletar_informacoes_memoria
+    e merginJSON).
+    """
+    processo.update(dados)
+    try:
+        aplicar_dados_especificos(processo, dados)
+    except (KeyError, IndexError, TypeError):
+        pass
+
+
+def mesclar_registros(processos, dados_especificos: dict, relatorio: dict = None):
+    """ Mescla os dados específicos nos registros em uma única passagem
+
+    Args:
+        processos: iterável de registros de processo
+        dados_especificos: dados específicos chaveados por linkId, número ou hash do número
+        relatorio: dicionário que recebe as contagens de acertos e faltas
+
+    Returns:
+        gerador dos registros atualizados
+    """
+    indice = IndiceDetalhes(dados_especificos)
+    relatorio = {} if relatorio is None else relatorio
+    relatorio.update({"processos": 0, "atualizados": 0, "sem_detalhes": 0,
+                      "por_chave": {"linkId": 0, "numero": 0, "hash": 0}})
+    usados = set()
+    for processo in processos:
+        relatorio["processos"] += 1
+        tipo_chave, dados = indice.buscar(processo)
+        if dados is None:
+            relatorio["sem_detalhes"] += 1
+        else:
+            mesclar_processo(processo, dados)
+            usados.add(id(dados))
+            relatorio["atualizados"] += 1
+            relatorio["por_chave"][tipo_chave] += 1
+        yield processo
+    relatorio["detalhes_sem_processo"] = sum(1 for dados in dados_especificos.values() if id(dados) not in usados)
+
+
+def mesclar_arquivos(arquivo_informacoes: str, dados_especificos, compativel: bool = True) -> dict:
+    """ Mescla os dados específicos no arquivo de informações, com escrita atômica
+
+    O arquivo é lido em streaming, gravado num temporário ao lado e só então
+    renomeado sobre o original, então uma falha no meio nunca deixa o arquivo
+    truncado.
+
+    Args:
+        arquivo_informacoes: informacoes_processos_completo.json
+        dados_especificos: caminho de dados_especificos.json ou o dicionário já carregado
+        compativel: mantém o layout indentado do arquivo original
+
+    Returns:
+        relatório com as contagens de acertos por chave e de faltas
+    """
+    if isinstance(dados_especificos, str):
+        with open(dados_especificos, "r", encoding="utf-8") as f:
+            dados_especificos = json.load(f)
+
+    relatorio = {}
+    # EscritorRegistros grava num temporário e só substitui o arquivo lido ao terminar sem erro
+    with span("mesclagem"), MESCLAGEM_SEGUNDOS.cronometrar(), \
+            EscritorRegistros(arquivo_informacoes, compativel=compativel) as escritor:
+        for processo in mesclar_registros(iterar_array_json(arquivo_informacoes), dados_especificos, relatorio):
+            escritor.escrever(processo)
+
+    por_chave = relatorio["por_chave"]
+    MESCLAGEM_PROCESSOS.inc(relatorio["atualizados"], resultado="atualizado")
+    MESCLAGEM_PROCESSOS.inc(relatorio["sem_detalhes"], resultado="sem_detalhes")
+    print(f"Mesclagem: \033[32m{relatorio['atualizados']}\033[0m de {relatorio['processos']} processos atualizados "
+          f"(linkId {por_chave['linkId']}, número {por_chave['numero']}, hash {por_chave['hash']}); "
+          f"\033[31m{relatorio['detalhes_sem_processo']}\033[0m detalhes sem processo")
+    return relatorio
@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from paths import ARQUIVO_METRICAS
+
+# Limites dos baldes de histograma, em segundos
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+VARIAVEL_PORTA = "PJE_METRICAS_PORTA"
+
+
+def _chave(rotulos: dict) -> tuple:
+    return tuple(sorted((k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in rotulos.items()))
+
+
+def _rotulos_texto(chave: tuple, extra: tuple = ()) -> str:
+    pares = chave + extra
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, lock: threading.Lock):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.lock = lock
+        self.valores = {}
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (requisições, documentos, bytes)"""
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = _chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def linhas(self):
+        for chave, valor in self.valores.items():
+            yield f"{self.nome}{_rotulos_texto(chave)} {valor}"
+
+    def resumo(self):
+        return {_rotulos_texto(chave) or "total": valor for chave, valor in self.valores.items()}
+
+
+class Medidor(_Metrica):
+    """Valor instantâneo que sobe e desce (fila, documentos por segundo)"""
+    tipo = "gauge"
+
+    def set(self, valor: float, **rotulos):
+        with self.lock:
+            self.valores[_chave(rotulos)] = valor
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = _chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    linhas = Contador.linhas
+    resumo = Contador.resumo
+
+
+class Histograma(_Metrica):
+    """Distribuição de valores (latências) em baldes cumulativos, com soma e contagem"""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, lock: threading.Lock, baldes: tuple = BALDES_LATENCIA):
+        super().__init__(nome, ajuda, lock)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor: float, **rotulos):
+        chave = _chave(rotulos)
+        with self.lock:
+            estado = self.valores.get(chave)
+            if estado is None:
+                estado = self.valores[chave] = {"baldes": [0] * len(self.baldes), "soma": 0.0, "contagem": 0,
+                                                "min": valor, "max": 0.0}
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    estado["baldes"][i] += 1
+                    break
+            estado["soma"] += valor
+            estado["contagem"] += 1
+            estado["min"] = min(estado["min"], valor)
+            estado["max"] = max(estado["max"], valor)
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        """Observa a duração do bloco em segundos"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def linhas(self):
+        for chave, estado in self.valores.items():
+            acumulado = 0
+            for limite, quantidade in zip(self.baldes, estado["baldes"]):
+                acumulado += quantidade
+                yield f"{self.nome}_bucket{_rotulos_texto(chave, (('le', str(limite)),))} {acumulado}"
+            yield f"{self.nome}_bucket{_rotulos_texto(chave, (('le', '+Inf'),))} {estado['contagem']}"
+            yield f"{self.nome}_sum{_rotulos_texto(chave)} {estado['soma']}"
+            yield f"{self.nome}_count{_rotulos_texto(chave)} {estado['contagem']}"
+
+    def _quantil(self, estado: dict, q: float) -> float:
+        """Estimativa do quantil por interpolação linear dentro do balde que o contém, limitada ao mínimo e ao máximo observados"""
+        alvo, acumulado, inferior = q * estado["contagem"], 0, 0.0
+        for limite, quantidade in zip(self.baldes, estado["baldes"]):
+            if quantidade and acumulado + quantidade >= alvo:
+                estimativa = inferior + (limite - inferior) * (alvo - acumulado) / quantidade
+                return round(min(max(estimativa, estado["min"]), estado["max"]), 6)
+            acumulado += quantidade
+            inferior = limite
+        return round(estado["max"], 6)
+
+    def resumo(self):
+        return {
+            _rotulos_texto(chave) or "total": {
+                "contagem": estado["contagem"], "soma": round(estado["soma"], 6),
+                "media": round(estado["soma"] / estado["contagem"], 6) if estado["contagem"] else None,
+                "p50": self._quantil(estado, 0.5), "p95": self._quantil(estado, 0.95), "max": round(estado["max"], 6),
+            }
+            for chave, estado in self.valores.items()
+        }
+
+
+class RegistroMetricas:
+    """ Registro das métricas do pipeline
+
+    As métricas são criadas uma vez por nome (chamadas repetidas devolvem a
+    mesma instância) e podem ter rótulos livres em cada observação. O estado
+    é exposto em texto do Prometheus (`texto_prometheus`, também servido por
+    `iniciar_servidor`) e como um resumo JSON (`resumo`).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metricas = {}
+        self.inicio = time.time()
+
+    def _obter(self, classe, nome: str, ajuda: str, **kwargs):
+        with self.lock:
+            metrica = self.metricas.get(nome)
+            if metrica is None:
+                metrica = self.metricas[nome] = classe(nome, ajuda, self.lock, **kwargs)
+        return metrica
+
+    def contador(self, nome: str, ajuda: str = "") -> Contador:
+        return self._obter(Contador, nome, ajuda)
+
+    def medidor(self, nome: str, ajuda: str = "") -> Medidor:
+        return self._obter(Medidor, nome, ajuda)
+
+    def histograma(self, nome: str, ajuda: str = "", baldes: tuple = BALDES_LATENCIA) -> Histograma:
+        return self._obter(Histograma, nome, ajuda, baldes=baldes)
+
+    def texto_prometheus(self) -> str:
+        """Todas as métricas no formato de exposição em texto do Prometheus"""
+        linhas = []
+        with self.lock:
+            for metrica in self.metricas.values():
+                if metrica.ajuda:
+                    linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+                linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+                linhas.extend(metrica.linhas())
+        return "\n".join(linhas) + "\n"
+
+    def resumo(self) -> dict:
+        """Resumo das métricas para o fim da execução, com duração e documentos por segundo"""
+        duracao = time.time() - self.inicio
+        with self.lock:
+            resumo = {nome: metrica.resumo() for nome, metrica in self.metricas.items()}
+        documentos = sum(resumo.get("pje_documentos_total", {}).values())
+        resumo["duracao_segundos"] = round(duracao, 3)
+        resumo["documentos_por_segundo"] = round(documentos / duracao, 3) if duracao > 0 else None
+        return resumo
+
+    def salvar_resumo(self, caminho: str = ARQUIVO_METRICAS) -> dict:
+        """Grava o resumo JSON e o retorna"""
+        resumo = self.resumo()
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+        print(f"Métricas salvas em: \033[32m{caminho}\033[0m")
+        return resumo
+
+    def iniciar_servidor(self, porta: int, endereco: str = "127.0.0.1"):
+        """ Serve /metrics em texto do Prometheus numa thread em segundo plano
+
+        Returns:
+            o servidor, para ser encerrado com shutdown()
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registro = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                corpo = registro.texto_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        servidor = ThreadingHTTPServer((endereco, porta), Manipulador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        print(f"Métricas em: \033[32mhttp://{endereco}:{porta}/metrics\033[0m")
+        return servidor
+
+
+REGISTRO = RegistroMetricas()
+
+CAPTCHAS = REGISTRO.contador("pje_captchas_total", "CAPTCHAs resolvidos, por etapa e resultado")
+CAPTCHA_SEGUNDOS = REGISTRO.histograma("pje_captcha_resolucao_segundos", "Tempo de resolução do CAPTCHA")
+HTTP_SEGUNDOS = REGISTRO.histograma("pje_http_requisicao_segundos", "Latência HTTP até os cabeçalhos da resposta")
+HTTP_RESPOSTAS = REGISTRO.contador("pje_http_respostas_total", "Respostas HTTP por rota e status")
+BYTES_BAIXADOS = REGISTRO.contador("pje_bytes_baixados_total", "Bytes recebidos no corpo das respostas")
+PAGINAS = REGISTRO.contador("pje_paginas_total", "Páginas de pesquisa por resultado")
+DOCUMENTOS = REGISTRO.contador("pje_documentos_total", "Documentos da pesquisa armazenados")
+TENTATIVAS_PAGINA = REGISTRO.histograma("pje_tentativas_por_pagina", "Tentativas até cada página ser aceita",
+                                        baldes=(1, 2, 3, 4, 5, 10))
+DETALHES = REGISTRO.contador("pje_detalhes_total", "Páginas de detalhe por resultado")
+TENTATIVAS_DETALHE = REGISTRO.histograma("pje_tentativas_por_detalhe", "Tentativas até cada detalhe ser obtido",
+                                         baldes=(1, 2, 3, 4, 5, 10))
+GRAVACAO_SEGUNDOS = REGISTRO.histograma("pje_gravacao_segundos", "Tempo de gravação em disco, por destino")
+MESCLAGEM_SEGUNDOS = REGISTRO.histograma("pje_mesclagem_segundos", "Duração de cada mesclagem de arquivos")
+MESCLAGEM_PROCESSOS = REGISTRO.contador("pje_mesclagem_processos_total", "Processos vistos na mesclagem, por resultado")
+
+
+def iniciar_servidor_ambiente():
+    """Inicia o servidor de métricas se a variável PJE_METRICAS_PORTA estiver definida"""
+    porta = os.environ.get(VARIAVEL_PORTA)
+    if porta:
+        try:
+            return REGISTRO.iniciar_servidor(int(porta))
+        except Exception as e:
+            print(f"Erro ao iniciar o servidor de métricas: {e}")
+    return None
@@ -0,0 +1,339 @@
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from http_client import MENSAGEM_CAPTCHA_INCORRETO
+from parsing import digito_verificador_cnj
+
+PASTA_IMAGENS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Grid Search", "images")
+PREFIXO_API = "/juris-backend/api"
+PORTA_PADRAO = 8765
+MAX_TOKENS = 100000
+
+_TIPOS_MIME = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+_CLASSES = ["Recurso Ordinário Trabalhista", "Agravo de Petição", "Ação Trabalhista - Rito Ordinário",
+            "Agravo de Instrumento em Recurso Ordinário", "Embargos de Declaração"]
+_TIPOS_DOCUMENTO = ["Acórdão", "Sentença", "Decisão"]
+_NOMES = ["Maria", "José", "Ana", "João", "Carlos", "Paula", "Lucas", "Bruna", "Pedro", "Luiza"]
+_SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Almeida", "Ferreira", "Gomes"]
+_EMPRESAS = ["Comércio", "Indústria", "Serviços", "Transportes", "Logística", "Alimentos", "Tecnologia"]
+
+
+def carregar_captchas(pasta: str = PASTA_IMAGENS) -> list[tuple[str, str]]:
+    """ Lê as imagens rotuladas do Grid Search
+
+    Returns:
+        lista de (rótulo, data URI em base64); o rótulo é o nome do arquivo sem extensão
+    """
+    captchas = []
+    for nome in sorted(os.listdir(pasta)):
+        rotulo, extensao = os.path.splitext(nome)
+        mime = _TIPOS_MIME.get(extensao.lower())
+        if mime is None:
+            continue
+        with open(os.path.join(pasta, nome), "rb") as f:
+            captchas.append((rotulo, f"data:{mime};base64,{base64.b64encode(f.read()).decode('ascii')}"))
+    if not captchas:
+        raise ValueError(f"Nenhuma imagem de CAPTCHA em {pasta}")
+    return captchas
+
+
+def numero_cnj(rng: random.Random) -> str:
+    """Número CNJ sintético da Justiça do Trabalho da 2ª Região, com dígito verificador válido"""
+    sequencial, ano, vara = rng.randint(1, 9999999), str(rng.randint(2015, 2024)), f"{rng.randint(1, 90):04d}"
+    digito = digito_verificador_cnj(str(sequencial), ano, "5", "02", vara)
+    return f"{sequencial:07d}-{digito}.{ano}.5.02.{vara}"
+
+
+def documento_sintetico(assunto: str, link_id: str) -> dict:
+    """Documento de resultado de pesquisa determinístico para o linkId, com os campos lidos pelo bot"""
+    rng = random.Random(link_id)
+    numero = numero_cnj(rng)
+    pessoa = f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)} {rng.choice(_SOBRENOMES)}"
+    empresa = f"{rng.choice(_SOBRENOMES)} {rng.choice(_EMPRESAS)} {rng.choice(['Ltda', 'S/A', 'Eireli'])}"
+    advogado = f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)}"
+    data = f"{rng.randint(2019, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return {
+        "linkId": link_id,
+        "processo": numero,
+        "sigiloso": False,
+        "anoProcesso": numero[11:15],
+        "tipoDocumento": rng.choice(_TIPOS_DOCUMENTO),
+        "instancia": rng.choice(["PRIMEIRO_GRAU", "SEGUNDO_GRAU"]),
+        "dataDistribuicao": data,
+        "dataPublicacao": data,
+        "classeJudicial": rng.choice(_CLASSES),
+        "classeJudicialSigla": "ROT",
+        "orgaoJulgador": f"{rng.randint(1, 18)}ª Turma",
+        "magistrado": f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)}",
+        "assunto": [assunto, rng.choice(["Horas Extras", "Dano Moral", "Verbas Rescisórias"])],
+        "poloAtivo": [pessoa],
+        "poloPassivo": [empresa],
+        "movimentoDecisao": [rng.choice(["Provimento", "Não Provimento", "Provimento em Parte"])],
+        "valorCausa": round(rng.uniform(1000, 500000), 2),
+        "highlight": [f"RECLAMANTE: {pessoa}\nADVOGADO: {advogado}\nRECLAMADO: {empresa}\n"
+                      f"Dá-se à causa o valor de R$ {rng.randint(1, 400)}.000,00. {assunto}."],
+    }
+
+
+def _rtf(texto: str) -> str:
+    """Texto em RTF mínimo (cabeçalho, fontes e acentos em \\'hh), como os documentos do PJe"""
+    corpo = "".join(f"\\'{ord(c):02x}" if 127 < ord(c) < 256 else c for c in texto)
+    corpo = corpo.replace("\n", "\\par\n")
+    return "{\\rtf1\\ansi\\ansicpg1252{\\fonttbl{\\f0 Arial;}}{\\*\\generator PJe;}\\f0 " + corpo + "}"
+
+
+def documento_detalhe(assunto: str, link_id: str) -> dict:
+    """ Resposta do detalhe: o documento da pesquisa com o corpo da decisão em HTML ou RTF
+
+    O corpo tem relatório, fundamentação e dispositivo, com o valor da causa,
+    o advogado e o resultado no texto.
+    """
+    doc = documento_sintetico(assunto, link_id)
+    rng = random.Random(f"corpo:{link_id}")
+    paragrafos = [
+        f"PROCESSO nº {doc['processo']} ({doc['classeJudicialSigla']})",
+        f"RECORRENTE: {doc['poloAtivo'][0]}",
+        f"RECORRIDO: {doc['poloPassivo'][0]}",
+        "RELATÓRIO",
+        f"Inconformado com a sentença, recorre o reclamante, representado por {doc['highlight'][0].split(chr(10))[1]}, "
+        f"postulando {assunto.lower()} e {doc['assunto'][1].lower()}.",
+        f"Dá-se à causa o valor de R$ {doc['valorCausa']:.2f}".replace(".", ","),
+        "FUNDAMENTAÇÃO",
+        "Conheço do recurso, pois presentes os pressupostos de admissibilidade.",
+        "MÉRITO",
+        f"Quanto a {doc['assunto'][1].lower()}, a prova oral {rng.choice(['confirma', 'não confirma'])} a tese inicial.",
+        f"Ante o exposto, decido dar {doc['movimentoDecisao'][0].lower()} ao recurso.",
+    ]
+    if rng.random() < 0.5:
+        doc["tipoConteudo"] = "HTML"
+        doc["conteudo"] = "<html><body>" + "".join(f"<p>{p}</p>" for p in paragrafos) + "</body></html>"
+    else:
+        doc["tipoConteudo"] = "RTF"
+        doc["conteudo"] = _rtf("\n".join(paragrafos))
+    return doc
+
+
+class EstadoBackend:
+    """ Estado compartilhado do servidor falso: CAPTCHAs emitidos, falhas injetadas e estatísticas
+
+    Args:
+        captchas: [(rótulo, data URI)] servidos em rodízio aleatório
+        total_documentos: documentos por assunto, distribuídos nas páginas
+        latencia: atraso médio por resposta em segundos (com variação de ±50%)
+        taxa_erro: probabilidade de responder 500
+        limite_rps: requisições por segundo aceitas antes de responder 429 (0 = sem limite)
+        usos_por_token: páginas aceitas por CAPTCHA resolvido (0 = sem limite, como o servidor real)
+    """
+
+    def __init__(self, captchas: list, total_documentos: int = 10000, latencia: float = 0.0, taxa_erro: float = 0.0,
+                 limite_rps: float = 0, usos_por_token: int = 0, semente: int = None):
+        self.captchas = captchas
+        self.total_documentos = total_documentos
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.limite_rps = limite_rps
+        self.usos_por_token = usos_por_token
+        self.rng = random.Random(semente)
+        self.lock = threading.Lock()
+        self.tokens = OrderedDict()
+        self.estatisticas = Counter()
+        self.fichas = float(limite_rps)
+        self.ultima_recarga = time.monotonic()
+
+    def emitir_captcha(self) -> dict:
+        with self.lock:
+            rotulo, imagem = self.rng.choice(self.captchas)
+            token = uuid.uuid4().hex
+            self.tokens[token] = [rotulo, 0]
+            if len(self.tokens) > MAX_TOKENS:
+                self.tokens.popitem(last=False)
+            self.estatisticas["captchas"] += 1
+        return {"tokenDesafio": token, "imagem": imagem}
+
+    def validar(self, token: str, resposta: str) -> bool:
+        with self.lock:
+            entrada = self.tokens.get(token)
+            valido = entrada is not None and resposta is not None and entrada[0].lower() == resposta.strip().lower()
+            if valido:
+                entrada[1] += 1
+                if self.usos_por_token and entrada[1] >= self.usos_por_token:
+                    del self.tokens[token]
+            self.estatisticas["respostas_corretas" if valido else "respostas_incorretas"] += 1
+        return valido
+
+    def falha_injetada(self) -> int:
+        """Status de falha a devolver (429 ou 500), ou None; também aplica a latência"""
+        if self.latencia:
+            time.sleep(self.latencia * (0.5 + self.rng.random()))
+        with self.lock:
+            if self.limite_rps:
+                agora = time.monotonic()
+                self.fichas = min(self.limite_rps, self.fichas + (agora - self.ultima_recarga) * self.limite_rps)
+                self.ultima_recarga = agora
+                if self.fichas < 1:
+                    self.estatisticas["throttled"] += 1
+                    return 429
+                self.fichas -= 1
+            if self.taxa_erro and self.rng.random() < self.taxa_erro:
+                self.estatisticas["erros_injetados"] += 1
+                return 500
+        return None
+
+    def pagina(self, assunto: str, posicao: int, tamanho: int) -> list[dict]:
+        inicio = (max(posicao, 1) - 1) * tamanho
+        fim = min(inicio + tamanho, self.total_documentos)
+        with self.lock:
+            self.estatisticas["paginas"] += 1
+            self.estatisticas["documentos"] += max(0, fim - inicio)
+        return [documento_sintetico(assunto, f"{assunto}-{i}") for i in range(inicio, fim)]
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que fecham a conexão keep-alive ao descartar a sessão não são erro do servidor
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def criar_servidor(estado: EstadoBackend, porta: int = PORTA_PADRAO, endereco: str = "127.0.0.1") -> _Servidor:
+    """ Servidor HTTP com as rotas da API de jurisprudência
+
+    Rotas:
+        GET  /juris-backend/api/captcha
+        POST /juris-backend/api/documentos?tokenDesafio=&resposta=         (pesquisa paginada)
+        POST /juris-backend/api/documentos/<linkId>?tokenDesafio=&resposta= (detalhe)
+        GET  /estatisticas
+    """
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Cabeçalho e corpo saem em duas escritas; com Nagle ligado a segunda espera o ACK atrasado (~40 ms)
+        disable_nagle_algorithm = True
+
+        def _responder(self, status: int, corpo: dict):
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _ler_corpo(self) -> dict:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            corpo = self.rfile.read(tamanho) if tamanho else b""
+            try:
+                return json.loads(corpo) if corpo else {}
+            except ValueError:
+                return {}
+
+        def do_GET(self):
+            caminho = urlparse(self.path).path
+            if caminho == "/estatisticas":
+                with estado.lock:
+                    self._responder(200, dict(estado.estatisticas))
+                return
+            if caminho != f"{PREFIXO_API}/captcha":
+                self._responder(404, {"mensagem": "Rota inexistente"})
+                return
+            falha = estado.falha_injetada()
+            if falha:
+                self._responder(falha, {"mensagem": "Falha injetada"})
+                return
+            self._responder(200, estado.emitir_captcha())
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            corpo = self._ler_corpo()
+            partes = url.path[len(PREFIXO_API):].strip("/").split("/")
+            if not url.path.startswith(PREFIXO_API) or partes[0] != "documentos" or len(partes) > 2:
+                self._responder(404, {"mensagem": "Rota inexistente"})
+                return
+            falha = estado.falha_injetada()
+            if falha:
+                self._responder(falha, {"mensagem": "Falha injetada"})
+                return
+
+            query = parse_qs(url.query)
+            token = (query.get("tokenDesafio") or [corpo.get("tokenDesafio")])[0]
+            resposta = (query.get("resposta") or [corpo.get("resposta")])[0]
+            if token is None and len(partes) == 2:
+                # Primeiro acesso ao detalhe (PdfProcessor.acessar_pagina), sem CAPTCHA
+                self._responder(200, {"mensagem": "CAPTCHA necessário"})
+                return
+            if not estado.validar(token, resposta):
+                self._responder(200, {"mensagem": MENSAGEM_CAPTCHA_INCORRETO, "documents": []})
+                return
+
+            if len(partes) == 2:
+                with estado.lock:
+                    estado.estatisticas["detalhes"] += 1
+                link_id = partes[1]
+                assunto = link_id.rsplit("-", 1)[0]
+                self._responder(200, documento_detalhe(assunto, link_id))
+                return
+
+            assunto = " ".join(corpo.get("andField") or ["assunto"])
+            documentos = estado.pagina(assunto, int(corpo.get("paginationPosition") or 1),
+                                       int(corpo.get("paginationSize") or 10))
+            self._responder(200, {"documents": documentos, "totalDocuments": estado.total_documentos,
+                                  "mensagem": None})
+
+        def log_message(self, *args):
+            pass
+
+    return _Servidor((endereco, porta), Manipulador)
+
+
+def iniciar_em_segundo_plano(estado: EstadoBackend, porta: int = 0) -> tuple[_Servidor, str]:
+    """ Inicia o servidor numa thread
+
+    Returns:
+        (servidor, URL base da API para PJE_JURIS_URL)
+    """
+    servidor = criar_servidor(estado, porta)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    endereco, porta = servidor.server_address[:2]
+    return servidor, f"http://{endereco}:{porta}{PREFIXO_API}"
+
+
+def adicionar_argumentos(parser: argparse.ArgumentParser):
+    parser.add_argument("--imagens", default=PASTA_IMAGENS, help="pasta de CAPTCHAs rotulados pelo nome do arquivo")
+    parser.add_argument("--documentos", type=int, default=10000, help="documentos por assunto")
+    parser.add_argument("--latencia", type=float, default=0.0, help="atraso médio por resposta, em segundos")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="probabilidade de resposta 500")
+    parser.add_argument("--limite-rps", type=float, default=0, help="requisições por segundo antes de responder 429")
+    parser.add_argument("--usos-por-token", type=int, default=0, help="páginas aceitas por CAPTCHA (0 = sem limite)")
+    parser.add_argument("--semente", type=int)
+
+
+def estado_de_argumentos(args) -> EstadoBackend:
+    return EstadoBackend(carregar_captchas(args.imagens), args.documentos, args.latencia, args.taxa_erro,
+                         args.limite_rps, args.usos_por_token, args.semente)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de jurisprudência do PJE TRT2")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    adicionar_argumentos(parser)
+    args = parser.parse_args()
+
+    estado = estado_de_argumentos(args)
+    servidor = criar_servidor(estado, args.porta)
+    print(f"Juris-backend falso em \033[32mhttp://127.0.0.1:{args.porta}{PREFIXO_API}\033[0m "
+          f"({len(estado.captchas)} CAPTCHAs); use PJE_JURIS_URL para apontar os bots")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,5 +1,7 @@
 
 import re
+from collections import Counter
+from functools import lru_cache
 from typing import Literal
 
 
@@ -15,7 +17,7 @@ POLO_TIPOS: dict[str, set[str]] = {
         "RECORRENTE", "EXQTE", "REQUERENTE", "REMETENTE", "DEPRECANTE", "APELANTE", "AGRAVTE",
         "EXEQUENTE", "EXEQÜENTE", "EMBARGANTE", "EMBTE", "AGRAVANTE", "AGRAVANT", "POLO ATIVO", "ATIVA",
         "INVENTARIANTE", "IMPUGNANTE", "SUSCITANTE", "CONFTE", "PROMOVENTE", "DEMANDANTE", "DEPRECAN", "OPOENTE",
-        "CONSIGNANTE", "MPF", "MINISTÉRIO PÚBLICO", "MP", "ORDENANTE", "RECORREN", "REQUISITANTE"
+        "CONSIGNANTE", "MPF", "MINISTÉRIO PÚBLICO", "MP", "ORDENANTE", "RECORREN", "REQUISITANTE",
 
         # Processos Criminais
         "VÍTIMA", "PACIENTE",
@@ -25,14 +27,14 @@ POLO_TIPOS: dict[str, set[str]] = {
         "AGRAVDO", "AGRAVADA", "AGRAVADO", "AGRAVDA", "EXCDO", "EXECTDA", "EXECUTADO", "EXECUTADA", "EXECTDO", "EXEQUIDO", "EXEQUIDA",
         "RECORRIDO", "RECORRIDA", "IMPETRADO", "DEPRECADO", "IMPUGNADO", "RECONVINDO", "RECLAMADO", "RECLAMADA", "SUCEDIDO",
         "IMPTDO", "LIQDTEPA", "EMBARGADO", "EMBARGADA", "EMBDO", "EMBARGDO", "INTIMADO",  "POLO PASSIVO", "ORDENADO",
-        "APELADO", "APELADA", "SUSCITADO", "PROMOVIDO", "DEMANDADO", "DEPRECAD", "OPOSTO" "CONSIGNADO", "RECORRID"
+        "APELADO", "APELADA", "SUSCITADO", "PROMOVIDO", "DEMANDADO", "DEPRECAD", "OPOSTO", "CONSIGNADO", "RECORRID",
 
         # Processos Criminais
         "INDICIADO", "INVESTIGADO",
     },
     "REP":  {
         "ADV", "ADVOGADA", "ADVOGADO", "SOC ADVOGADO", "SOCIEDADE DE ADVOGADO",
-        "REPRELEG", "REPRESENTANTE", "REPRESENTANTE LEGAL", "REPRTATE", "REPR POR"
+        "REPRELEG", "REPRESENTANTE", "REPRESENTANTE LEGAL", "REPRTATE", "REPR POR",
         "PROC/S/OAB", "PROCURADOR",
 
         # Processos Criminais
@@ -68,6 +70,111 @@ def list_to_str(lconv: list[str]) -> str:
     return str(lconv).replace("'", "").replace('"', '')
 
 
+AREA_MAP: dict[str, str] = {
+    "1": "STF", "2": "CNJ", "3": "STJ", "4": "Federal",
+    "5": "Trabalhista", "6": "Eleitoral", "8": "Civil",
+    "7": "Militar Federal", "9": "Militar Estadual"
+}
+
+ELEIT_TRIB_MAP: dict[str, str] = {
+    "1": "TRE-AC", "2": "TRE-AL", "3": "TRE-AP", "4": "TRE-AM", "5": "TRE-BA",
+    "6": "TRE-CE", "7": "TRE-DF", "8": "TRE-ES", "9": "TRE-GO", "10": "TRE-MA",
+    "11": "TRE-MT", "12": "TRE-MS", "13": "TRE-MG", "14": "TRE-PA",
+    "15": "TRE-PB", "16": "TRE-PR", "17": "TRE-PE", "18": "TRE-PI",
+    "19": "TRE-RJ", "20": "TRE-RN", "21": "TRE-RS", "22": "TRE-RO",
+    "23": "TRE-RR", "24": "TRE-SC", "25": "TRE-SE", "26": "TRE-SP", "27": "TRE-TO"
+}
+
+CIVIL_TRIB_MAP: dict[str, str] = {
+    "1": "TJAC", "2": "TJAL", "3": "TJAP", "4": "TJAM", "5": "TJBA",
+    "6": "TJCE", "7": "TJDF", "8": "TJES", "9": "TJGO", "10": "TJMA",
+    "11": "TJMT", "12": "TJMS", "13": "TJMG", "14": "TJPA",
+    "15": "TJPB", "16": "TJPR", "17": "TJPE", "18": "TJPI",
+    "19": "TJRJ", "20": "TJRN", "21": "TJRS", "22": "TJRO",
+    "23": "TJRR", "24": "TJSC", "25": "TJSE", "26": "TJSP", "27": "TJTO"
+}
+
+MIL_FED_MAP: dict[str, str] = {
+    "1": "TJMMG", "2": "TJMRS", "3": "TJMSP"
+}
+
+# NNNNNNN-DD.AAAA.J.TR.OOOO, com ou sem pontuação
+PADRAO_CNJ = re.compile(r"^\s*(\d{1,7})-?(\d{2})\.?(\d{4})\.?(\d)\.?(\d{2})\.?(\d{4})\s*$")
+
+# Códigos de motivo devolvidos para números inválidos
+MOTIVO_VAZIO = "vazio"
+MOTIVO_FORMATO = "formato"
+MOTIVO_AREA = "area_desconhecida"
+MOTIVO_DIGITO = "digito_verificador"
+
+_CAMPOS_CNJ = ("area_code", "tribunal_code", "vara_code", "ano", "area", "tribunal")
+
+
+def _nome_tribunal(area_code: str, tribunal_code: str) -> str:
+    if area_code == "4":
+        return "TRF" + tribunal_code
+    if area_code == "5":
+        return "TST" if len(tribunal_code) == 0 else "TRT-" + tribunal_code
+    if area_code == "6":
+        return ELEIT_TRIB_MAP.get(tribunal_code, "UKN")
+    if area_code == "7":
+        return "CJM" + tribunal_code
+    if area_code == "8":
+        return CIVIL_TRIB_MAP.get(tribunal_code, "UKN")
+    if area_code == "9":
+        return MIL_FED_MAP.get(tribunal_code, "UKN")
+    return AREA_MAP[area_code]
+
+
+def digito_verificador_cnj(sequencial: str, ano: str, area_code: str, tribunal: str, origem: str) -> str:
+    """ Calcula o dígito verificador (módulo 97, Resolução CNJ 65/2008)
+
+    Returns:
+        dígito verificador com dois caracteres
+    """
+    resto = int(f"{int(sequencial):07d}{ano}{area_code}{tribunal}{origem}00") % 97
+    return f"{98 - resto:02d}"
+
+
+@lru_cache(maxsize=65536)
+def analisar_cnj(cnj: str) -> tuple[tuple, str]:
+    """ Analisa o numero cnj, com cache para números repetidos
+
+    Args:
+        cnj: numero cnj do processo
+
+    Returns:
+        (area_code, tribunal_code, vara_code, ano, area, tribunal) ou None, e o motivo
+        da invalidez (None se o número for válido)
+    """
+    if not cnj:
+        return None, MOTIVO_VAZIO
+    m = PADRAO_CNJ.match(cnj)
+    if m is None:
+        return None, MOTIVO_FORMATO
+    sequencial, digito, ano, area_code, tribunal, vara_code = m.groups()
+    if area_code not in AREA_MAP:
+        return None, MOTIVO_AREA
+
+    tribunal_code = tribunal.lstrip("0")
+    campos = (area_code, tribunal_code, vara_code, ano, AREA_MAP[area_code], _nome_tribunal(area_code, tribunal_code))
+    if digito_verificador_cnj(sequencial, ano, area_code, tribunal, vara_code) != digito:
+        return campos, MOTIVO_DIGITO
+    return campos, None
+
+
+def validar_cnj(cnj: str) -> bool:
+    """ Verifica formato, área e dígito verificador do numero cnj
+
+    Args:
+        cnj: numero cnj do processo
+
+    Returns:
+        True se o número for válido
+    """
+    return analisar_cnj(cnj)[1] is None
+
+
 def parse_cnj(cnj: str) -> tuple[str, str, str, str, str, str]:
     """ Coleta informações importantes do numero cnj do processo
 
@@ -76,60 +183,44 @@ def parse_cnj(cnj: str) -> tuple[str, str, str, str, str, str]:
 
     Returns:
         area_code, tribunal_code, vara_code, ano, area, tribunal
+
+    Raises:
+        ValueError: número fora do formato CNJ ou com código de área desconhecido
     """
-    area_map = {
-        "1": "STF", "2": "CNJ", "3": "STJ", "4": "Federal",
-        "5": "Trabalhista", "6": "Eleitoral", "8": "Civil",
-        "7": "Militar Federal", "9": "Militar Estadual"
-    }
+    campos, motivo = analisar_cnj(cnj)
+    if campos is None:
+        raise ValueError(f"Numero CNJ invalido ({motivo}): {cnj!r}")
+    return campos
 
-    eleit_trib_map = {
-        "1": "TRE-AC", "2": "TRE-AL", "3": "TRE-AP", "4": "TRE-AM", "5": "TRE-BA",
-        "6": "TRE-CE", "7": "TRE-DF", "8": "TRE-ES", "9": "TRE-GO", "10": "TRE-MA",
-        "11": "TRE-MT", "12": "TRE-MS", "13": "TRE-MG", "14": "TRE-PA",
-        "15": "TRE-PB", "16": "TRE-PR", "17": "TRE-PE", "18": "TRE-PI",
-        "19": "TRE-RJ", "20": "TRE-RN", "21": "TRE-RS", "22": "TRE-RO",
-        "23": "TRE-RR", "24": "TRE-SC", "25": "TRE-SE", "26": "TRE-SP", "27": "TRE-TO"
-    }
 
-    civil_trib_map = {
-        "1": "TJAC", "2": "TJAL", "3": "TJAP", "4": "TJAM", "5": "TJBA",
-        "6": "TJCE", "7": "TJDF", "8": "TJES", "9": "TJGO", "10": "TJMA",
-        "11": "TJMT", "12": "TJMS", "13": "TJMG", "14": "TJPA",
-        "15": "TJPB", "16": "TJPR", "17": "TJPE", "18": "TJPI",
-        "19": "TJRJ", "20": "TJRN", "21": "TJRS", "22": "TJRO",
-        "23": "TJRR", "24": "TJSC", "25": "TJSE", "26": "TJSP", "27": "TJTO"
-    }
+def parse_cnj_lote(numeros) -> dict[str, list]:
+    """ Parseia uma coleção de numeros cnj em colunas
 
-    mil_fed_map = {
-        "1": "TJMMG", "2": "TJMRS", "3": "TJMSP"
-    }
+    Args:
+        numeros: lista (ou pandas Series) de numeros cnj
 
-    ano = cnj.split(".")[-4]
-    area_code = cnj.split(".")[-3]
-    tribunal_code = cnj.split(".")[-2].lstrip('0')
-    vara_code = cnj.split(".")[-1]
-
-    if area_code == "1":
-        tribunal = "STF"
-    elif area_code == "2":
-        tribunal = "CNJ"
-    elif area_code == "3":
-        tribunal = "STJ"
-    elif area_code == "4":
-        tribunal = "TRF" + tribunal_code
-    elif area_code == "5":
-       tribunal = "TST" if len(tribunal_code) == 0 else "TRT-" + tribunal_code
-    elif area_code == "6":
-        tribunal = eleit_trib_map.get(tribunal_code, "UKN")
-    elif area_code == "7":
-        tribunal = "CJM" + tribunal_code
-    elif area_code == "8":
-        tribunal = civil_trib_map.get(tribunal_code, "UKN")
-    elif area_code == "9":
-        tribunal = mil_fed_map.get(tribunal_code, "UKN")
-
-    return area_code, tribunal_code, vara_code, ano, area_map[area_code], tribunal
+    Returns:
+        colunas area_code, tribunal_code, vara_code, ano, area, tribunal, valido e motivo;
+        um pandas DataFrame com o mesmo índice quando a entrada for uma Series
+    """
+    indice = getattr(numeros, "index", None) if hasattr(numeros, "tolist") else None
+    valores = numeros.tolist() if hasattr(numeros, "tolist") else list(numeros)
+
+    colunas = {campo: [] for campo in _CAMPOS_CNJ}
+    colunas["valido"], colunas["motivo"] = [], []
+    listas = [colunas[campo] for campo in _CAMPOS_CNJ]
+    vazio = (None,) * len(_CAMPOS_CNJ)
+    for numero in valores:
+        campos, motivo = analisar_cnj(numero if isinstance(numero, str) else None)
+        for lista, valor in zip(listas, campos or vazio):
+            lista.append(valor)
+        colunas["valido"].append(motivo is None)
+        colunas["motivo"].append(motivo)
+
+    if indice is not None:
+        import pandas as pd
+        return pd.DataFrame(colunas, index=indice)
+    return colunas
 
 
 def parse_cnpj(cnpj: str) -> tuple[str, str]:
@@ -186,9 +277,69 @@ def parse_phone(telefone: str) -> str:
     return f"({match.group(1)}) {match.group(2)}-{match.group(3)}"
 
 
+# Tabelas de str.translate: uma única passada remove dígitos ou pontuação
+_PONTUACAO_NOME = "|\\!?[]{}();:.,'–-+_\"…“”"
+_SEM_DIGITOS = str.maketrans("", "", "0123456789")
+_SEM_PONTUACAO_POLO = str.maketrans("", "", _PONTUACAO_NOME.replace("_", "") + "º")
+_SEM_PONTUACAO_TIPO = str.maketrans("", "", _PONTUACAO_NOME + "º")
+_SEM_PONTUACAO_NOME = str.maketrans("", "", _PONTUACAO_NOME)
+
+_PADRAO_PARENTESES = re.compile(r"\(.+\)")
+_TERMINACOES_EMPRESA = tuple(re.compile(end) for end in (
+    r" s\.a\.$", r" s\.a$", r" s\/a$", r" sa$", r" l\.t\.d\.a\.$", r" l\.t\.d\.a$", r" ltda$"))
+
+# Polo de cada tipo, na ordem de POLO_TIPOS (o primeiro polo que contém o tipo)
+TIPO_POLO: dict[str, str] = {}
+for _polo, _tipos in POLO_TIPOS.items():
+    for _tipo in _tipos:
+        TIPO_POLO.setdefault(_tipo, _polo)
+
+# Valores não reconhecidos por parse_polo/parse_tipo, com a quantidade de ocorrências
+DESCONHECIDOS: dict[str, Counter] = {"polo": Counter(), "tipo": Counter()}
+
+TAMANHO_CACHE = 65536
+
+
+def _limpar(valor: str, prefixo: str, tabela: dict) -> str:
+    """Maiúsculas, sem parênteses, dígitos, prefixo e pontuação, espaços simples"""
+    valor = _PADRAO_PARENTESES.sub("", valor.upper().strip()).translate(_SEM_DIGITOS)
+    if valor.startswith(prefixo):
+        valor = valor[len(prefixo):]
+    return " ".join(p for p in valor.translate(tabela).split(" ") if p)
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _normalizar_polo(env_polo: str) -> tuple[str, str]:
+    env_polo = _limpar(env_polo, "POLO", _SEM_PONTUACAO_POLO)
+    env_polo = {"TERCEIRO": "OUTROS", "ADVOGADO": "REP"}.get(env_polo, env_polo)
+    if env_polo not in POLOS:
+        return None, None if env_polo in {"DESCONHECIDO", "NENHUM"} else env_polo
+    return env_polo, None
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _normalizar_tipo(env_tipo: str) -> tuple[str, str]:
+    env_tipo = _limpar(env_tipo, "PARTE", _SEM_PONTUACAO_TIPO).rstrip("S").strip(" ")
+    if env_tipo not in TIPOS:
+        return None, env_tipo
+    return env_tipo, None
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _normalizar_nome(env_nome: str, rem_comp_indent: bool) -> str:
+    env_nome = env_nome.lower().strip()
+    if rem_comp_indent:
+        for end in _TERMINACOES_EMPRESA:
+            env_nome = end.sub("", env_nome)
+    env_nome = " ".join(p for p in env_nome.translate(_SEM_PONTUACAO_NOME).split(" ") if p).rstrip("s")
+    return env_nome.title()
+
+
 def parse_polo(env_polo: str) -> str:
     """ Remove patterns indesejadas do polo do envolvido
 
+    Valores não reconhecidos são contados em DESCONHECIDOS["polo"].
+
     Args:
         env_polo: Polo do envolvido
 
@@ -197,23 +348,17 @@ def parse_polo(env_polo: str) -> str:
     """
     if env_polo is None:
         return None
-
-    env_polo = re.sub("^POLO", "", re.sub(r"\d", "", re.sub(r"\(.+\)", "", env_polo.upper().strip())))
-    env_polo = re.sub(r"[\|\\!?\[\]\{\}\(\);:\.,'\–\-\+\"\…\“\”º]", "", env_polo)
-    env_polo = re.sub(" +", " ", env_polo).strip(" ")
-    env_polo = "OUTROS" if env_polo == "TERCEIRO" else env_polo
-    env_polo = "REP" if env_polo == "ADVOGADO" else env_polo
-
-    if env_polo not in POLOS:
-        if env_polo not in {"DESCONHECIDO", "NENHUM"}:
-            print(f"env_polo desconhecido: {env_polo}")
-        return None
+    env_polo, desconhecido = _normalizar_polo(env_polo)
+    if desconhecido is not None:
+        DESCONHECIDOS["polo"][desconhecido] += 1
     return env_polo
 
 
 def parse_tipo(env_tipo: str) -> str:
     """ Remove patterns indesejadas do tipo do envolvido
 
+    Valores não reconhecidos são contados em DESCONHECIDOS["tipo"].
+
     Args:
         env_tipo: tipo do envolvido
 
@@ -222,14 +367,9 @@ def parse_tipo(env_tipo: str) -> str:
     """
     if env_tipo is None:
         return None
-
-    env_tipo = re.sub("^PARTE", "", re.sub(r"\d", "", re.sub(r"\(.+\)", "", env_tipo.upper().strip())))
-    env_tipo = re.sub(r"[\|\\!?\[\]\{\}\(\);:\.,'\–\-\+\_\"\…\“\”º]", "", env_tipo)
-    env_tipo = re.sub(" +", " ", env_tipo).rstrip("S").strip(" ")
-
-    if env_tipo not in TIPOS:
-        print(f"env_tipo desconhecido: {env_tipo}")
-        return None
+    env_tipo, desconhecido = _normalizar_tipo(env_tipo)
+    if desconhecido is not None:
+        DESCONHECIDOS["tipo"][desconhecido] += 1
     return env_tipo
 
 
@@ -245,17 +385,7 @@ def parse_nome(env_nome: str, rem_comp_indent: bool = False) -> str:
     """
     if env_nome is None:
         return None
-
-    env_nome = env_nome.lower().strip()
-    if rem_comp_indent:
-        bad_ending = [r" s\.a\.$", r" s\.a$", r" s\/a$", r" sa$",
-                    r" l\.t\.d\.a\.$", r" l\.t\.d\.a$", r" ltda$"]
-        for end in bad_ending:
-            env_nome = re.sub(end, "", env_nome)
-
-    env_nome = re.sub(r"[\|\\!?\[\]\{\}\(\);:\.,'\–\-\+\_\"\…\“\”]", "", env_nome)
-    env_nome = re.sub(" +", " ", env_nome).strip(" ").rstrip("s")
-    return env_nome.title()
+    return _normalizar_nome(env_nome, rem_comp_indent)
 
 
 def parse_env_data(env_polo: str, env_tipo: str, env_nome: str) -> tuple[Literal['ATIVO/PASSIVO', 'ATIVO', 'PASSIVO', 'REP', 'OUTROS'], str, str]:
@@ -273,13 +403,81 @@ def parse_env_data(env_polo: str, env_tipo: str, env_nome: str) -> tuple[Literal
     env_tipo = parse_tipo(env_tipo)
     env_nome = parse_nome(env_nome)
 
-    if env_polo in POLOS:
+    if env_polo in POLOS or env_tipo is None:
         return env_polo, env_tipo, env_nome
+    return TIPO_POLO.get(env_tipo), env_tipo, env_nome
 
-    if env_tipo is None:
-        return env_polo, env_tipo, env_nome
 
-    for polo, words in POLO_TIPOS.items():
-        if env_tipo in words:
-            return polo, env_tipo, env_nome
-    return None, env_tipo, env_nome
+_NORMALIZADORES = {"polo": parse_polo, "tipo": parse_tipo, "nome": parse_nome}
+
+
+def normalizar_coluna(valores, campo: Literal["polo", "tipo", "nome"], rem_comp_indent: bool = False):
+    """ Normaliza uma coluna inteira de polos, tipos ou nomes
+
+    Cada valor distinto é limpo uma única vez; as repetições saem do cache.
+
+    Args:
+        valores: lista (ou pandas Series) de valores
+        campo: "polo", "tipo" ou "nome"
+        rem_comp_indent: repassado a parse_nome
+
+    Returns:
+        lista de valores normalizados; uma pandas Series com o mesmo índice quando a entrada for uma Series
+    """
+    funcao = _NORMALIZADORES[campo]
+    if campo == "nome" and rem_comp_indent:
+        funcao = lambda nome: parse_nome(nome, True)
+
+    indice = getattr(valores, "index", None) if hasattr(valores, "tolist") else None
+    lista = valores.tolist() if hasattr(valores, "tolist") else list(valores)
+    resultado = [funcao(v) if isinstance(v, str) else None for v in lista]
+
+    if indice is not None:
+        import pandas as pd
+        return pd.Series(resultado, index=indice, name=getattr(valores, "name", None))
+    return resultado
+
+
+def normalizar_envolvidos(envolvidos) -> list[tuple[str, str, str]]:
+    """ Aplica parse_env_data a um iterável de (polo, tipo, nome)
+
+    Returns:
+        lista de (polo, tipo, nome) normalizados
+    """
+    return [parse_env_data(polo, tipo, nome) for polo, tipo, nome in envolvidos]
+
+
+def relatorio_desconhecidos(limite: int = 20) -> dict[str, list[tuple[str, int]]]:
+    """ Valores de polo e tipo não reconhecidos, dos mais frequentes aos menos
+
+    Args:
+        limite: quantidade máxima de valores por campo
+
+    Returns:
+        {"polo": [(valor, ocorrências)], "tipo": [...]}
+    """
+    return {campo: contador.most_common(limite) for campo, contador in DESCONHECIDOS.items()}
+
+
+# Campos do detalhe em que a API entrega o corpo do documento (HTML/RTF), em ordem de preferência
+CAMPOS_CONTEUDO = ("conteudo", "conteudoDocumento", "documento", "html", "rtf")
+
+
+def conteudo_detalhe(dados: dict):
+    """(corpo, tipoConteudo) de um registro de detalhe, ou (None, None) se ele não tiver corpo"""
+    for campo in CAMPOS_CONTEUDO:
+        valor = dados.get(campo)
+        if isinstance(valor, str) and valor.strip():
+            return valor, dados.get("tipoConteudo")
+    return None, None
+
+
+def sem_corpo(dados):
+    """ Cópia do detalhe sem o corpo bruto do documento
+
+    O corpo fica só no BancoProcessos (e no armazém de blobs, se houver); os
+    arquivos JSON e a saída do terminal recebem o detalhe sem ele.
+    """
+    if not isinstance(dados, dict) or "conteudo" not in dados:
+        return dados
+    return {chave: valor for chave, valor in dict.items(dados) if chave != "conteudo"}
@@ -0,0 +1,23 @@
+import os
+
+# Pasta base dos arquivos de dados (PJE_DADOS); vazia mantém os caminhos relativos à pasta atual
+VARIAVEL_DADOS = "PJE_DADOS"
+PASTA_DADOS = os.environ.get(VARIAVEL_DADOS, "")
+
+
+def caminho_dados(nome: str) -> str:
+    """Caminho de `nome` dentro da pasta de dados"""
+    return os.path.join(PASTA_DADOS, nome)
+
+
+PASTA_DOCUMENTOS = caminho_dados("processos")
+ARQUIVO_INFORMACOES = caminho_dados("informacoes_processos_completo.json")
+ARQUIVO_DADOS = caminho_dados("dados_especificos.json")
+ARQUIVO_BANCO = caminho_dados("processos.db")
+ARQUIVO_METRICAS = caminho_dados("metricas.json")
+PASTA_PARQUET = caminho_dados("parquet")
+PASTA_BLOBS = caminho_dados("blobs")
+PASTA_DELTAS = caminho_dados("deltas")
+ARQUIVO_INDICE = caminho_dados("indice_textual.db")
+ARQUIVO_PARTES = caminho_dados("partes.db")
+ARQUIVO_FILA = caminho_dados("fila_trabalho.db")
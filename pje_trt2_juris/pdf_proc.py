@@ -1,12 +1,20 @@
-import requests
 from captcha_local_solver import solve_captcha_local
+from http_client import criar_sessao, ler_json, MENSAGEM_CAPTCHA_INCORRETO, URL_API
+from merge import mesclar_arquivos
+from metrics import CAPTCHAS, CAPTCHA_SEGUNDOS, DETALHES, TENTATIVAS_DETALHE
+from parsing import conteudo_detalhe, sem_corpo
+from paths import ARQUIVO_INFORMACOES, ARQUIVO_DADOS
+from tracing import span
 import json
+import queue
+import threading
+
 
 class PdfProcessor:
     def __init__(self, link_id):
-        self.URL_CAPTCHA = 'https://pje.trt2.jus.br/juris-backend/api/captcha'
-        self.URL_PAGE = f'https://pje.trt2.jus.br/juris-backend/api/documentos/{link_id}'
-        self.sessao = requests.Session()
+        self.URL_CAPTCHA = f'{URL_API}/captcha'
+        self.URL_PAGE = f'{URL_API}/documentos/{link_id}'
+        self.sessao = criar_sessao()
         self.token_desafio = None
         self.resposta_captcha = None
         self.cookies = {}
@@ -14,9 +22,10 @@ class PdfProcessor:
     def fazer_requisicao_captcha(self):
         """Fazer a requisicao do captcha para ser resolvido (GET)"""
         try:
-            resposta = self.sessao.get(self.URL_CAPTCHA, headers={'Accept': 'application/json'})
-            resposta.raise_for_status()
-            dados = resposta.json()
+            with span("captcha_busca"):
+                resposta = self.sessao.get(self.URL_CAPTCHA, headers={'Accept': 'application/json'})
+                resposta.raise_for_status()
+                dados = resposta.json()
             self.token_desafio = dados.get('tokenDesafio')
             self.resolver_captcha(dados.get('imagem'))
             return True
@@ -29,7 +38,8 @@ class PdfProcessor:
         try:
             if (base64_string):
                 base64_string = base64_string.split(',')[1] if base64_string.startswith('data:image') else base64_string
-                self.resposta_captcha = solve_captcha_local(base64_string)
+                with span("captcha_resolucao"), CAPTCHA_SEGUNDOS.cronometrar(etapa="detalhe"):
+                    self.resposta_captcha = solve_captcha_local(base64_string)
                 print(f"Resposta do CAPTCHA: \033[1;32m{self.resposta_captcha}\033[0m")
                 self.configurar_cookies()
         except Exception as e:
@@ -63,22 +73,28 @@ class PdfProcessor:
 
             try:
                 url_post = f"{self.URL_PAGE}?tokenDesafio={self.token_desafio}&resposta={self.resposta_captcha}"
-                resposta = self.sessao.post(url_post)
-                resposta.raise_for_status()
+                with self.sessao.post(url_post, stream=True) as resposta:
+                    resposta.raise_for_status()
+                    conteudo = ler_json(resposta)
 
-                if "A resposta informada é incorreta" in resposta.text:
+                if isinstance(conteudo, dict) and conteudo.get("mensagem") == MENSAGEM_CAPTCHA_INCORRETO:
                     print("\033[1;31mCAPTCHA incorreto.\033[0m Gerando novo...")
+                    CAPTCHAS.inc(etapa="detalhe", resultado="incorreto")
                     continue
 
-                return resposta.text
+                CAPTCHAS.inc(etapa="detalhe", resultado="correto")
+                DETALHES.inc(resultado="ok")
+                TENTATIVAS_DETALHE.observar(tentativa + 1)
+                return conteudo
 
             except Exception as e:
                 print(f"Erro na tentativa {tentativa + 1}: {e}")
 
+        DETALHES.inc(resultado="falha")
         return None
 
     def extrair_dados_especificos(self, pagina_json):
-        """Extrai dados específicos do JSON"""
+        """Extrai dados específicos do JSON (texto ou já decodificado)"""
         dados = {
             "nome": [],
             "poloPassivo": "",
@@ -89,7 +105,7 @@ class PdfProcessor:
         }
         
         try:
-            conteudo = json.loads(pagina_json)
+            conteudo = json.loads(pagina_json) if isinstance(pagina_json, (str, bytes)) else pagina_json
             
             dados["nome"] = conteudo.get("poloAtivo", [])
             dados["poloPassivo"] = ", ".join(conteudo.get("poloPassivo", []))
@@ -97,6 +113,14 @@ class PdfProcessor:
             dados["anoProcesso"] = conteudo.get("anoProcesso", "")
             dados["tipoDocumento"] = conteudo.get("tipoDocumento", "")
             dados["movimentoDecisao"] = conteudo.get("movimentoDecisao", [])
+            # Número CNJ: chave de detalhes.numero e do casamento por número/hash em merge.IndiceDetalhes
+            if conteudo.get("processo"):
+                dados["numero"] = conteudo["processo"]
+            # Corpo bruto da decisão (HTML/RTF), lido depois por text_extraction
+            corpo, tipo = conteudo_detalhe(conteudo)
+            if corpo:
+                dados["conteudo"] = corpo
+                dados["tipoConteudo"] = tipo
                 
             return dados
         except Exception as e:
@@ -115,11 +139,11 @@ class PdfProcessor:
     def processar(self):
         """Executa o fluxo principal de processamento"""
         if self.acessar_pagina():
-            pagina_html = self.acessar_pagina_com_captcha()
-            if pagina_html:
-                dados_especificos, _ = self.coletar_informacoes(pagina_html)
+            pagina_json = self.acessar_pagina_com_captcha()
+            if pagina_json:
+                dados_especificos, _ = self.coletar_informacoes(pagina_json)
                 print("Informações coletadas:")
-                for chave, valor in dados_especificos.items():
+                for chave, valor in sem_corpo(dados_especificos).items():
                     print(f"{chave}: {valor}")
                 return dados_especificos
             else:
@@ -129,73 +153,126 @@ class PdfProcessor:
 
 def atualizar_informacoes_completas(dados_especificos):
     try:
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\informacoes_processos_completo.json", "r", encoding="utf-8") as f:
-            informacoes_completas = json.load(f)
-        
-        for processo in informacoes_completas:
-            numero_processo = processo["numero"]
-            if numero_processo in dados_especificos:
-                dados = dados_especificos[numero_processo]
-                processo["poloAtivo"] = dados.get("poloAtivo", "")
-                processo["poloPassivo"] = dados.get("poloPassivo", "")
-                processo["classeJudicial"] = dados.get("classeJudicial", "")
-                processo["anoProcesso"] = dados.get("anoProcesso", "")
-                processo["tipoDocumento"] = dados.get("tipoDocumento", "")
-                processo["movimentoDecisao"] = dados.get("movimentoDecisao", "")
-        
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\informacoes_processos_completo.json", "w", encoding="utf-8") as f:
-            json.dump(informacoes_completas, f, ensure_ascii=False, indent=2)
-            
+        mesclar_arquivos(ARQUIVO_INFORMACOES, dados_especificos)
     except Exception as e:
         print(f"Erro ao atualizar informacoes_processos_completo.json: {e}")
 
 def merge_json_files():
     try:
-        print("Carregando informacoes_processos_completo.json...")
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\informacoes_processos_completo.json", "r", encoding="utf-8") as f:
-            informacoes_completas = json.load(f)
-        
-        print("Carregando dados_especificos.json...")
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\dados_especificos.json", "r", encoding="utf-8") as f:
-            dados_especificos = json.load(f)
-        
-        print("Mesclando dados...")
-        for processo in informacoes_completas:
-            link_id = processo.get("linkId")
-            if link_id and link_id in dados_especificos:
-                dados = dados_especificos[link_id]
-                processo.update(dados)
-        
-        print("Salvando informacoes_processos_completo.json...")
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\informacoes_processos_completo.json", "w", encoding="utf-8") as f:
-            json.dump(informacoes_completas, f, ensure_ascii=False, indent=2)
-        
+        print("Mesclando dados_especificos.json em informacoes_processos_completo.json...")
+        mesclar_arquivos(ARQUIVO_INFORMACOES, ARQUIVO_DADOS)
         print("Arquivos JSON mesclados com sucesso.")
     except Exception as e:
         print(f"Erro ao mesclar arquivos JSON: {e}")
 
-def main(link_ids=None):
+def link_id_de(item):
+    """LinkId de um item da fila: o próprio linkId ou um documento da pesquisa"""
+    return item.get("linkId") if isinstance(item, dict) else item
+
+class FilaDetalhes:
+    """Fila de linkIds processados em segundo plano enquanto a pesquisa continua
+
+    Os linkIds sao enfileirados assim que cada pagina de resultados chega, e as
+    threads de trabalho buscam os detalhes de cada documento em paralelo com a
+    coleta das proximas paginas.
+    """
+    def __init__(self, num_workers: int = 1):
+        self.num_workers = max(1, int(num_workers))
+        self.fila = queue.Queue()
+        self.resultados = {}
+        self.vistos = set()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def iniciar(self):
+        """Inicia as threads de trabalho da fila"""
+        for _ in range(self.num_workers):
+            thread = threading.Thread(target=self._trabalhar, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def adicionar(self, link_ids):
+        """Enfileira os linkIds (ou documentos da pesquisa) ainda nao vistos para busca de detalhes"""
+        for item in link_ids:
+            link_id = link_id_de(item)
+            if not link_id:
+                continue
+            with self.lock:
+                if link_id in self.vistos:
+                    continue
+                self.vistos.add(link_id)
+            self.fila.put(link_id)
+
+    def _trabalhar(self):
+        """Consome a fila ate receber o sinal de parada"""
+        while True:
+            link_id = self.fila.get()
+            try:
+                if link_id is None:
+                    return
+                print(f"\nProcessando ID: {link_id}")
+                with span("detalhe", link_id=link_id):
+                    result = PdfProcessor(link_id).processar()
+                if result:
+                    with self.lock:
+                        self.resultados[link_id] = result
+            except Exception as e:
+                print(f"Erro ao processar o ID {link_id}: {e}")
+            finally:
+                self.fila.task_done()
+
+    def finalizar(self):
+        """Aguarda o esvaziamento da fila e retorna os dados coletados por linkId"""
+        for _ in self.threads:
+            self.fila.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        return self.resultados
+
+def salvar_dados_especificos(all_processed_data, banco=None):
+    """Salva os dados especificos coletados e atualiza o arquivo de informacoes (e o BancoProcessos, se houver)
+
+    O corpo bruto dos documentos vai so para o BancoProcessos; os arquivos JSON recebem os dados sem ele.
+    """
+    if banco is not None:
+        banco.salvar_detalhes(all_processed_data)
+
+    dados_arquivos = {link_id: sem_corpo(dados) for link_id, dados in all_processed_data.items()}
+    with open(ARQUIVO_DADOS, "w", encoding="utf-8") as f:
+        json.dump(dados_arquivos, f, ensure_ascii=False, indent=2)
+
+    atualizar_informacoes_completas(dados_arquivos)
+
+def main(link_ids=None, workers=1, banco=None, pesos=None, prazo=None, max_requisicoes=None):
+    """ Busca os detalhes dos linkIds por prioridade e salva os dados especificos
+
+    Args:
+        link_ids: linkIds ou documentos da pesquisa (com dataPublicacao, assunto e processo)
+        workers: threads que buscam os detalhes
+        banco: BancoProcessos que recebe os detalhes e informa quais ja existem
+        pesos: detail_scheduler.PesosPrioridade
+        prazo: segundos disponiveis para a busca
+        max_requisicoes: requisicoes HTTP disponiveis para a busca
+
+    Returns:
+        linkIds que ficaram fora do orcamento, em ordem de prioridade
+    """
     try:
         if link_ids is None:
             print("Nenhum link_id fornecido para processamento!")
-            return
-        
-        all_processed_data = {}
-            
-        for link_id in link_ids:
-            print(f"\nProcessando ID: {link_id}")
-            processor = PdfProcessor(link_id)
-            result = processor.processar()
-            if result:
-                all_processed_data[link_id] = result
-        
-        with open(r"c:\Users\IsraelAntunes\OneDrive\pje_trt2\dados_especificos.json", "w", encoding="utf-8") as f:
-            json.dump(all_processed_data, f, ensure_ascii=False, indent=2)
-        
-        atualizar_informacoes_completas(all_processed_data)
-            
+            return []
+
+        from detail_scheduler import AgendadorDetalhes
+        agenda = AgendadorDetalhes(workers, pesos, prazo, max_requisicoes, banco=banco)
+        agenda.adicionar(link_ids)
+        agenda.iniciar()
+        salvar_dados_especificos(agenda.finalizar(), banco=banco)
+        return agenda.pendentes
+
     except Exception as e:
         print(f"Erro inesperado: {e}")
+        return []
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import sqlite3
+import time
+from paths import ARQUIVO_BANCO, ARQUIVO_DADOS, ARQUIVO_INFORMACOES
+from records import EscritorRegistros
+
+TAMANHO_LOTE = 1000
+
+
+def _data_publicacao(registro: dict):
+    """Data de publicação do registro, lida das movimentações montadas por construir_registro"""
+    try:
+        for movimentacao in registro["fontes"][0]["instancias"][0]["movimentacoes"]:
+            if isinstance(movimentacao, dict) and movimentacao.get("data"):
+                return movimentacao["data"]
+    except (KeyError, IndexError, TypeError):
+        pass
+    return registro.get("dataPublicacao")
+
+
+def chave_processo(registro: dict) -> str:
+    """Chave do registro na tabela processos: o linkId ou, sem ele, o número CNJ"""
+    return registro.get("linkId") or f"numero:{registro.get('numero')}"
+
+
+def _lotes(itens, tamanho: int):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class BancoProcessos:
+    """ Base de processos em SQLite com upserts indexados
+
+    Substitui a reescrita completa de informacoes_processos_completo.json e
+    dados_especificos.json a cada atualização: cada registro de pesquisa e
+    cada registro de detalhe é uma linha, atualizada no lugar por chave.
+    Os arquivos JSON continuam disponíveis através de `exportar_json`.
+
+    Com `blobs` (um blob_store.ArmazemBlobs), os campos acima do limiar
+    do armazém ficam no armazém de blobs e a coluna guarda só a
+    referência: as linhas e as varreduras ficam pequenas, e os registros
+    lidos são RegistroPreguicoso, que carregam cada blob só quando o campo
+    é acessado.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_BANCO, blobs=None):
+        self.caminho = caminho
+        self.blobs = blobs
+        self.conn = sqlite3.connect(caminho, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS processos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                link_id TEXT UNIQUE,
+                numero TEXT,
+                tribunal TEXT,
+                ano TEXT,
+                data_publicacao TEXT,
+                registro TEXT NOT NULL,
+                atualizado_em REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_processos_numero ON processos (numero);
+            CREATE INDEX IF NOT EXISTS idx_processos_tribunal ON processos (tribunal);
+            CREATE INDEX IF NOT EXISTS idx_processos_ano ON processos (ano);
+            CREATE INDEX IF NOT EXISTS idx_processos_data ON processos (data_publicacao);
+
+            CREATE TABLE IF NOT EXISTS detalhes (
+                link_id TEXT PRIMARY KEY,
+                numero TEXT,
+                dados TEXT NOT NULL,
+                atualizado_em REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_detalhes_numero ON detalhes (numero);
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        self.conn.close()
+
+    def _serializar(self, valor) -> str:
+        if self.blobs is not None and isinstance(valor, dict):
+            from blob_store import descarregar_campos
+            valor = descarregar_campos(valor, self.blobs)
+        return json.dumps(valor, ensure_ascii=False)
+
+    def _ler(self, texto: str):
+        valor = json.loads(texto)
+        if self.blobs is not None and isinstance(valor, dict):
+            from blob_store import RegistroPreguicoso
+            valor = RegistroPreguicoso(valor, self.blobs)
+        return valor
+
+    def _completo(self, valor):
+        """Registro com os blobs carregados, para os arquivos JSON"""
+        if self.blobs is None:
+            return valor
+        from blob_store import materializar
+        return materializar(valor, self.blobs)
+
+    def salvar_processos(self, registros, tamanho_lote: int = TAMANHO_LOTE) -> int:
+        """ Insere ou atualiza registros de pesquisa em lotes transacionais
+
+        Args:
+            registros: iterável de registros no formato de construir_registro
+            tamanho_lote: registros por transação
+
+        Returns:
+            quantidade de registros gravados
+        """
+        total = 0
+        for lote in _lotes(registros, tamanho_lote):
+            agora = time.time()
+            linhas = [(chave_processo(r), r.get("numero"), r.get("tribunal"), r.get("ano"),
+                       _data_publicacao(r), self._serializar(r), agora) for r in lote]
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO processos (link_id, numero, tribunal, ano, data_publicacao, registro, atualizado_em)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (link_id) DO UPDATE SET
+                        numero = excluded.numero, tribunal = excluded.tribunal, ano = excluded.ano,
+                        data_publicacao = excluded.data_publicacao, registro = excluded.registro,
+                        atualizado_em = excluded.atualizado_em
+                """, linhas)
+            total += len(linhas)
+        return total
+
+    def salvar_detalhes(self, detalhes: dict, tamanho_lote: int = TAMANHO_LOTE) -> int:
+        """ Insere ou atualiza os dados específicos por linkId
+
+        Args:
+            detalhes: mapa linkId -> dados específicos (formato de dados_especificos.json)
+            tamanho_lote: registros por transação
+
+        Returns:
+            quantidade de registros gravados
+
+        Sem "numero" nos dados, a coluna numero vem do registro de pesquisa do mesmo linkId.
+        """
+        total = 0
+        for lote in _lotes(detalhes.items(), tamanho_lote):
+            agora = time.time()
+            linhas = [(link_id, (dados.get("numero") or None) if isinstance(dados, dict) else None, link_id,
+                       self._serializar(dados), agora) for link_id, dados in lote]
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO detalhes (link_id, numero, dados, atualizado_em)
+                    VALUES (?, COALESCE(?, (SELECT numero FROM processos WHERE link_id = ?)), ?, ?)
+                    ON CONFLICT (link_id) DO UPDATE SET
+                        numero = COALESCE(excluded.numero, detalhes.numero), dados = excluded.dados,
+                        atualizado_em = excluded.atualizado_em
+                """, linhas)
+            total += len(linhas)
+        return total
+
+    def processo(self, link_id: str = None, numero: str = None) -> dict:
+        """Busca um registro de pesquisa por linkId ou número CNJ"""
+        if link_id is not None:
+            row = self.conn.execute("SELECT registro FROM processos WHERE link_id = ?", (link_id,)).fetchone()
+        else:
+            row = self.conn.execute("SELECT registro FROM processos WHERE numero = ? ORDER BY id DESC LIMIT 1",
+                                    (numero,)).fetchone()
+        return self._ler(row[0]) if row else None
+
+    def detalhe(self, link_id: str) -> dict:
+        """Busca os dados específicos de um linkId"""
+        row = self.conn.execute("SELECT dados FROM detalhes WHERE link_id = ?", (link_id,)).fetchone()
+        return self._ler(row[0]) if row else None
+
+    def metadados_detalhe(self, link_ids, tamanho_lote: int = 500) -> dict:
+        """ Metadados usados para priorizar a busca de detalhes
+
+        Returns:
+            linkId -> {"tribunal", "data_publicacao", "assuntos", "tem_detalhe"}, só para linkIds conhecidos
+        """
+        metadados = {}
+        for lote in _lotes(list(link_ids), tamanho_lote):
+            marcadores = ",".join("?" * len(lote))
+            for link_id, registro, tribunal, data in self.conn.execute(f"""
+                SELECT link_id, registro, tribunal, data_publicacao FROM processos WHERE link_id IN ({marcadores})
+            """, lote):
+                try:
+                    # _ler resolve as referências de blob (assuntos grandes ficam no armazém)
+                    assuntos = self._ler(registro)["fontes"][0]["instancias"][0].get("assuntos") or []
+                except (KeyError, IndexError, TypeError, ValueError):
+                    assuntos = []
+                metadados[link_id] = {"tribunal": tribunal, "data_publicacao": data,
+                                      "assuntos": list(assuntos) if isinstance(assuntos, list) else [],
+                                      "tem_detalhe": False}
+            for (link_id,) in self.conn.execute(f"SELECT link_id FROM detalhes WHERE link_id IN ({marcadores})", lote):
+                metadados.setdefault(link_id, {})["tem_detalhe"] = True
+        return metadados
+
+    def iterar_processos(self, tribunal: str = None, ano: str = None, desde: str = None, ate: str = None,
+                         com_detalhes: bool = False):
+        """ Itera os registros de pesquisa em ordem de inserção, usando os índices para filtrar
+
+        Args:
+            tribunal: filtro por tribunal (ex: "TRT-2")
+            ano: filtro por ano do processo
+            desde: data de publicação mínima
+            ate: data de publicação máxima
+            com_detalhes: mescla os dados específicos do linkId no registro (como merge_json_files)
+
+        Returns:
+            gerador de registros
+        """
+        condicoes, params = [], []
+        for coluna, operador, valor in (("p.tribunal", "=", tribunal), ("p.ano", "=", ano),
+                                        ("p.data_publicacao", ">=", desde), ("p.data_publicacao", "<=", ate)):
+            if valor is not None:
+                condicoes.append(f"{coluna} {operador} ?")
+                params.append(valor)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        cursor = self.conn.execute(f"""
+            SELECT p.registro, d.dados FROM processos p LEFT JOIN detalhes d ON d.link_id = p.link_id
+            {where} ORDER BY p.id
+        """, params)
+        for registro, dados in cursor:
+            registro = self._ler(registro)
+            if com_detalhes and dados:
+                registro.update(json.loads(dados))
+            yield registro
+
+    def iterar_alterados(self, desde: float):
+        """ Itera os processos inseridos ou atualizados (inclusive nos detalhes) após `desde`
+
+        Returns:
+            gerador de (registro com detalhes mesclados, instante da última alteração)
+        """
+        cursor = self.conn.execute("""
+            SELECT p.registro, d.dados, MAX(p.atualizado_em, COALESCE(d.atualizado_em, 0)) AS alterado
+            FROM processos p LEFT JOIN detalhes d ON d.link_id = p.link_id
+            WHERE p.atualizado_em > ? OR d.atualizado_em > ? ORDER BY p.id
+        """, (desde, desde))
+        for registro, dados, alterado in cursor:
+            registro = self._ler(registro)
+            if dados:
+                registro.update(json.loads(dados))
+            yield registro, alterado
+
+    def iterar_detalhes(self):
+        """Itera (linkId, dados específicos)"""
+        for link_id, dados in self.conn.execute("SELECT link_id, dados FROM detalhes ORDER BY rowid"):
+            yield link_id, self._ler(dados)
+
+    def remover(self, link_ids) -> int:
+        """ Remove os processos e os detalhes dos linkIds
+
+        Returns:
+            quantidade de processos efetivamente removidos
+        """
+        removidos = 0
+        with self.conn:
+            for lote in _lotes(link_ids, TAMANHO_LOTE):
+                marcadores = ",".join("?" * len(lote))
+                removidos += self.conn.execute(f"DELETE FROM processos WHERE link_id IN ({marcadores})", lote).rowcount
+                self.conn.execute(f"DELETE FROM detalhes WHERE link_id IN ({marcadores})", lote)
+        return removidos
+
+    def contagem(self) -> dict:
+        return {
+            "processos": self.conn.execute("SELECT COUNT(*) FROM processos").fetchone()[0],
+            "detalhes": self.conn.execute("SELECT COUNT(*) FROM detalhes").fetchone()[0],
+        }
+
+    def exportar_json(self, arquivo_informacoes: str = None, arquivo_dados: str = None, compacto: bool = False):
+        """ Exporta a base no layout dos arquivos JSON usados hoje
+
+        Args:
+            arquivo_informacoes: destino de informacoes_processos_completo.json (com os detalhes mesclados)
+            arquivo_dados: destino de dados_especificos.json
+            compacto: com blobs, mantém as referências no lugar dos campos grandes
+                (leia com blob_store.registros_preguicosos)
+
+        O corpo bruto dos documentos (campo "conteudo") só entra nos arquivos
+        como referência de blob, na exportação compacta; fora dela fica só na base.
+        """
+        from parsing import sem_corpo
+        if compacto and self.blobs is not None:
+            from blob_store import cru as completo
+        else:
+            completo = lambda valor: self._completo(sem_corpo(valor))
+        if arquivo_informacoes:
+            with EscritorRegistros(arquivo_informacoes) as escritor:
+                for registro in self.iterar_processos(com_detalhes=True):
+                    escritor.escrever(completo(registro))
+            print(f"Exportado: \033[32m{arquivo_informacoes}\033[0m ({escritor.total} processos)")
+        if arquivo_dados:
+            with open(arquivo_dados, "w", encoding="utf-8") as f:
+                json.dump({link_id: completo(dados) for link_id, dados in self.iterar_detalhes()}, f,
+                          ensure_ascii=False, indent=2)
+            print(f"Exportado: \033[32m{arquivo_dados}\033[0m")
+
+    def importar_json(self, arquivo_informacoes: str = None, arquivo_dados: str = None):
+        """Carrega os arquivos JSON atuais na base"""
+        if arquivo_informacoes:
+            with open(arquivo_informacoes, "r", encoding="utf-8") as f:
+                print(f"{self.salvar_processos(json.load(f))} processos importados")
+        if arquivo_dados:
+            with open(arquivo_dados, "r", encoding="utf-8") as f:
+                print(f"{self.salvar_detalhes(json.load(f))} detalhes importados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Base SQLite de processos do PJE TRT2")
+    parser.add_argument("--banco", default=ARQUIVO_BANCO)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    for nome, ajuda in (("exportar", "gera os arquivos JSON a partir da base"),
+                        ("importar", "carrega os arquivos JSON na base")):
+        cmd = sub.add_parser(nome, help=ajuda)
+        cmd.add_argument("--informacoes", default=ARQUIVO_INFORMACOES)
+        cmd.add_argument("--dados", default=ARQUIVO_DADOS)
+    args = parser.parse_args()
+
+    with BancoProcessos(args.banco) as banco:
+        if args.comando == "exportar":
+            banco.exportar_json(args.informacoes, args.dados)
+        else:
+            banco.importar_json(args.informacoes, args.dados)
+        print(banco.contagem())
@@ -0,0 +1,325 @@
+import json
+import os
+import time
+from metrics import GRAVACAO_SEGUNDOS
+from parsing import analisar_cnj
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Campo:
+    """Valor lido do documento: doc.get(chave, padrao)"""
+    __slots__ = ("chave", "padrao")
+
+    def __init__(self, chave: str, padrao=None):
+        self.chave = chave
+        self.padrao = padrao
+
+
+class Primeiro:
+    """Primeiro item da lista do documento, ou None se ausente/vazia"""
+    __slots__ = ("chave",)
+
+    def __init__(self, chave: str):
+        self.chave = chave
+
+
+class Unido:
+    """Itens da lista do documento unidos por um separador"""
+    __slots__ = ("chave", "separador")
+
+    def __init__(self, chave: str, separador: str = ", "):
+        self.chave = chave
+        self.separador = separador
+
+
+class Cnj:
+    """Componente do numero CNJ já parseado (índice da tupla de parse_cnj)"""
+    __slots__ = ("indice",)
+
+    def __init__(self, indice: int):
+        self.indice = indice
+
+
+class SePresente:
+    """Valor do documento se a chave existir, senão o modelo"""
+    __slots__ = ("chave", "modelo")
+
+    def __init__(self, chave: str, modelo):
+        self.chave = chave
+        self.modelo = modelo
+
+
+def _representante(polo: str, cpf=None, endereco=None) -> dict:
+    return {
+        "nome": Campo("nome_adv"),
+        "tipo": "ADVOGADO",
+        "polo": polo,
+        "id_sistema": {"login": None},
+        "documento": [
+            {"tipo": "CPF", "uf": None, "valor": cpf},
+            {"tipo": "RG", "uf": None, "valor": None},
+            {"tipo": "OAB-ADVOGADO", "uf": None, "valor": None},
+        ],
+        "endereco": endereco or {"logradouro": None, "numero": None, "complemento": None, "bairro": None,
+                                 "municipio": None, "estado": None, "cep": None},
+    }
+
+
+def _envolvido(nome, tipo, polo, representantes: list, documento: list = None) -> dict:
+    return {
+        "nome": nome,
+        "tipo": tipo,
+        "polo": polo,
+        "id_sistema": {"login": None},
+        "documento": [{"tipo": "CPF", "uf": None, "valor": None}] if documento is None else documento,
+        "endereco": {},
+        "representantes": representantes,
+    }
+
+
+# Layout do registro de informacoes_processos_completo.json
+ESPECIFICACAO_PROCESSO = {
+    "linkId": Campo("linkId"),
+    "numero": Campo("processo"),
+    "area_code": Cnj(0),
+    "tribunal_code": Cnj(1),
+    "vara_code": Cnj(2),
+    "ano": Cnj(3),
+    "area:": Cnj(4),
+    "tribunal": Cnj(5),
+    "comarca": None,
+    "valor_causa": Campo("valorCausa"),
+    "moeda_causa": "R$",
+    "fontes": [{
+        "provider": "Interno",
+        "provider_fonte_id": "Interno",
+        "sigla": Campo("sistema", "PJE-TRT2"),
+        "sistema": "PJE",
+        "tipo": "TRIBUNAL",
+        "instancias": [{
+            "url": "https://pje.trt2.jus.br/jurisprudencia/",
+            "grau": Campo("instancia"),
+            "classe": Campo("classeJudicialSigla"),
+            "orgao_julgador": Campo("orgaoJulgador"),
+            "justica_gratuita": Campo("justicaGratuita"),
+            "assunto_principal": Primeiro("assunto"),
+            "assuntos": Campo("assunto", []),
+            "envolvidos": [
+                _envolvido(Campo("poloAtivo", []), Campo("reclamante", "RECLAMANTE"), Campo("polo", "ATIVO"), [
+                    _representante("ATIVO", cpf=Campo("cpf"), endereco={
+                        "logradouro": Campo("longradouro"),
+                        "numero": Campo("numero"),
+                        "complemento": Campo("complemento"),
+                        "bairro": Campo("bairro"),
+                        "municipio": Campo("municipio"),
+                        "estado": Campo("estado"),
+                        "cep": Campo("cep"),
+                    }),
+                ]),
+                _envolvido(Campo("poloPassivo", []), Campo("reclamado", "RECLAMADO"), Campo("polo", "PASSIVO"), [
+                    _representante("PASSIVO"),
+                ]),
+                _envolvido(Campo("nome_perito"), "PERITO", Campo("polo", "OUTROS"), [], documento=[]),
+            ],
+            "movimentacoes": SePresente("movimentacoes", [
+                {
+                    "titulo": Campo("movimentoDecisao", []),
+                    "tipoConteudo": Campo("html"),
+                    "data": Campo("dataPublicacao"),
+                    "ativo": Campo("ativo"),
+                    "documento": Campo("f_ou_t"),
+                    "mostrarHeaderData": Campo("header_data"),
+                    "usuarioCriador": Campo("usuarioCriador"),
+                },
+                {
+                    "titulo": Campo("titulo"),
+                    "tipoConteudo": Campo("html"),
+                    "data": Campo("dataPublicacao"),
+                    "ativo": Campo("ativo"),
+                    "documento": Campo("f_ou_t"),
+                    "mostrarHeaderData": Campo("header_data"),
+                    "usuarioCriador": Campo("usuarioCriador"),
+                },
+                {
+                    "id": Campo("id"),
+                    "idUnicoDocumento": Campo("idUnicoDocumento"),
+                    "titulo": Campo("titulo"),
+                    "tipo": Campo("tipoDocumento"),
+                    "tipoConteudo": Campo("tipoConteudo", "RTF"),
+                    "data": Campo("dataPublicacao"),
+                    "ativo": Campo("ativo"),
+                    "documentoSigiloso": Campo("sigiloso"),
+                    "usuarioPerito": Campo("usuarioPerito"),
+                    "documento": Campo("tipo_doc"),
+                    "publico": Campo("tipo_publico"),
+                    "usuarioJuntada": Campo("usuarioJuntada"),
+                    "usuarioCriador": Campo("usuarioCriador"),
+                    "instancia": Campo("instancia"),
+                },
+            ]),
+        }],
+    }],
+    "nome": Campo("poloAtivo", []),
+    "poloPassivo": Unido("poloPassivo"),
+    "classeJudicial": Campo("classeJudicial", ""),
+    "anoProcesso": Campo("anoProcesso", ""),
+    "tipoDocumento": Campo("tipoDocumento", ""),
+    "movimentoDecisao": Campo("movimentoDecisao", []),
+}
+
+
+def _primeiro(lista):
+    return lista[0] if lista else None
+
+
+def _expressao(valor) -> str:
+    """Gera o código Python que constrói `valor` a partir de `doc` e `cnj`"""
+    if isinstance(valor, dict):
+        return "{" + ", ".join(f"{k!r}: {_expressao(v)}" for k, v in valor.items()) + "}"
+    if isinstance(valor, list):
+        return "[" + ", ".join(_expressao(v) for v in valor) + "]"
+    if isinstance(valor, Campo):
+        return f"_get({valor.chave!r}, {_expressao(valor.padrao)})"
+    if isinstance(valor, Primeiro):
+        return f"_primeiro(_get({valor.chave!r}))"
+    if isinstance(valor, Unido):
+        return f"{valor.separador!r}.join(_get({valor.chave!r}, []))"
+    if isinstance(valor, Cnj):
+        return f"cnj[{valor.indice}]"
+    if isinstance(valor, SePresente):
+        return f"(doc[{valor.chave!r}] if {valor.chave!r} in doc else {_expressao(valor.modelo)})"
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return repr(valor)
+    raise TypeError(f"Valor não suportado na especificação: {valor!r}")
+
+
+def compilar_construtor(especificacao: dict):
+    """ Compila a especificação num construtor de registros
+
+    A especificação é percorrida uma única vez e vira o código de uma função
+    que devolve o registro como um único literal de dicionário, sem laços nem
+    consultas à especificação por documento.
+
+    Args:
+        especificacao: modelo do registro com Campo, Primeiro, Unido, Cnj e SePresente
+
+    Returns:
+        função construir(doc, cnj) -> dict
+    """
+    codigo = f"def construir(doc, cnj):\n    _get = doc.get\n    return {_expressao(especificacao)}\n"
+    namespace = {"_primeiro": _primeiro}
+    exec(compile(codigo, "<construtor_registro>", "exec"), namespace)
+    return namespace["construir"]
+
+
+_construir_processo = compilar_construtor(ESPECIFICACAO_PROCESSO)
+_CNJ_VAZIO = (None, None, None, None, None, None)
+
+
+def construir_registro(doc: dict) -> dict:
+    """ Monta o registro de processo a partir do documento da pesquisa
+
+    Args:
+        doc: documento da página de resultados
+
+    Returns:
+        registro no formato de informacoes_processos_completo.json
+    """
+    cnj, _ = analisar_cnj(doc.get("processo"))
+    return _construir_processo(doc, cnj or _CNJ_VAZIO)
+
+
+def aplicar_dados_especificos(registro: dict, dados_proc: dict):
+    """ Sobrepõe ao registro os dados específicos coletados para o processo
+
+    Args:
+        registro: registro montado por construir_registro
+        dados_proc: entrada de dados_especificos.json do processo
+    """
+    for envolvido in registro["fontes"][0]["instancias"][0]["envolvidos"]:
+        polo = envolvido["polo"]
+        if polo == "ATIVO" and "poloAtivo" in dados_proc:
+            envolvido["nome"] = [dados_proc["poloAtivo"]]
+        elif polo == "PASSIVO" and "poloPassivo" in dados_proc:
+            envolvido["nome"] = [dados_proc["poloPassivo"]]
+
+        documentos = dados_proc.get("documentos")
+        if documentos:
+            if polo == "ATIVO" and "cpf_ativo" in documentos:
+                envolvido["documento"][0]["valor"] = documentos["cpf_ativo"]
+            elif polo == "PASSIVO" and "cpf_passivo" in documentos:
+                envolvido["documento"][0]["valor"] = documentos["cpf_passivo"]
+
+        for representante in envolvido.get("representantes", []):
+            if representante["tipo"] == "ADVOGADO":
+                if polo == "ATIVO" and "advogado_ativo" in dados_proc:
+                    representante["nome"] = dados_proc["advogado_ativo"]
+                elif polo == "PASSIVO" and "advogado_passivo" in dados_proc:
+                    representante["nome"] = dados_proc["advogado_passivo"]
+
+
+def _compacto(registro) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(registro)
+    return json.dumps(registro, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class EscritorRegistros:
+    """ Serializa registros em streaming, à medida que são produzidos
+
+    Formatos:
+        "json": array JSON; com `compativel=True` o arquivo é idêntico byte a byte
+            ao de json.dump(lista, ensure_ascii=False, indent=4), senão compacto
+        "ndjson": um registro compacto por linha
+
+    A serialização compacta usa orjson quando instalado. A saída é gravada em
+    <caminho>.tmp e só substitui o arquivo no fim do bloco `with` sem erro;
+    numa exceção o temporário é apagado e o arquivo anterior fica intacto.
+    O tempo de serialização e gravação vai para pje_gravacao_segundos
+    (destino="registros"), uma observação por arquivo.
+    """
+
+    def __init__(self, caminho: str, formato: str = "json", compativel: bool = True):
+        if formato not in ("json", "ndjson"):
+            raise ValueError(f"Formato desconhecido: {formato}")
+        self.caminho = caminho
+        self.formato = formato
+        self.compativel = compativel
+        self.total = 0
+        self.arquivo = None
+        self.temporario = caminho + ".tmp"
+        self.segundos = 0.0
+
+    def __enter__(self):
+        self.arquivo = open(self.temporario, "wb", buffering=1024 * 1024)
+        return self
+
+    def __exit__(self, tipo, *exc):
+        inicio = time.perf_counter()
+        try:
+            if tipo is None and self.formato == "json":
+                self.arquivo.write(b"\n]" if self.total and self.compativel else b"]" if self.total else b"[]")
+            self.arquivo.close()
+            if tipo is None:
+                os.replace(self.temporario, self.caminho)
+                GRAVACAO_SEGUNDOS.observar(self.segundos + time.perf_counter() - inicio, destino="registros")
+        finally:
+            if os.path.exists(self.temporario):
+                os.remove(self.temporario)
+
+    def escrever(self, registro: dict):
+        """Serializa e grava um registro"""
+        inicio = time.perf_counter()
+        if self.formato == "ndjson":
+            self.arquivo.write(_compacto(registro) + b"\n")
+        elif self.compativel:
+            texto = json.dumps(registro, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+            self.arquivo.write((("[\n    " if self.total == 0 else ",\n    ") + texto).encode("utf-8"))
+        else:
+            self.arquivo.write((b"[" if self.total == 0 else b",\n") + _compacto(registro))
+        self.total += 1
+        self.segundos += time.perf_counter() - inicio
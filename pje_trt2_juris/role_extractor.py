@@ -0,0 +1,259 @@
+import re
+import unicodedata
+from collections import deque
+from typing import NamedTuple
+
+from parsing import POLO_TIPOS, TIPO_POLO
+
+TAMANHO_MAXIMO_NOME = 150
+
+# Fim do nome da parte: quebra de linha, ponto e vírgula, vírgula, parênteses, " - " ou OAB
+_FIM_NOME = re.compile(r"[\n;,(]| [-–—] | OAB\b")
+_SEPARADORES = " \t:-–—"
+# Marca de rótulo depois do papel ("Perito:", "RECLAMADO -") e início de trecho antes dele
+_MARCAS_ROTULO = ":-–—"
+_INICIO_TRECHO = "\n;,()"
+
+# Tipos cujo nome preenche os campos do documento que a pesquisa deixa vazios
+CAMPOS_PAPEIS = {
+    "nome_perito": {"PERITO"},
+    "nome_adv": {"ADV", "ADVOGADA", "ADVOGADO"},
+}
+
+
+class _Dobra(dict):
+    """Tabela de str.translate que leva cada caractere a um único caractere maiúsculo sem acento"""
+
+    def __missing__(self, codigo: int) -> str:
+        caractere = chr(codigo)
+        base = unicodedata.normalize("NFKD", caractere)[0].upper()
+        self[codigo] = base if len(base) == 1 else caractere
+        return self[codigo]
+
+
+_DOBRA = _Dobra()
+
+
+def dobrar(texto: str) -> str:
+    """Maiúsculas sem acento, preservando o comprimento (as posições valem para o texto original)"""
+    return texto.translate(_DOBRA)
+
+
+class Papel(NamedTuple):
+    """Papel processual encontrado no texto e o trecho [inicio, fim) do nome da parte"""
+    tipo: str
+    polo: str
+    inicio: int
+    fim: int
+
+
+class ExtratorPapeis:
+    """ Extrator de papéis processuais por autômato de Aho-Corasick
+
+    Todo o vocabulário de POLO_TIPOS vira um único autômato, percorrido uma
+    vez sobre o texto inteiro: o custo é linear no tamanho do texto e não
+    depende da quantidade de tipos. Ocorrências sobrepostas ficam com a mais
+    longa à esquerda, e só contam as que caem em limites de palavra e são
+    usadas como rótulo (ver `ocorrencias`).
+    """
+
+    def __init__(self, polo_tipos: dict[str, set[str]] = POLO_TIPOS):
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.saidas = [[]]
+        self.padroes = []
+        vistos = set()
+        for tipos in polo_tipos.values():
+            for tipo in sorted(tipos):
+                chave = dobrar(tipo)
+                if chave not in vistos:
+                    vistos.add(chave)
+                    self._inserir(chave, (tipo, TIPO_POLO.get(tipo)))
+        self._ligar_falhas()
+
+    def _inserir(self, chave: str, padrao: tuple):
+        estado = 0
+        for caractere in chave:
+            proximo = self.transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self.transicoes)
+                self.transicoes[estado][caractere] = proximo
+                self.transicoes.append({})
+                self.falhas.append(0)
+                self.saidas.append([])
+            estado = proximo
+        self.saidas[estado].append((len(chave), len(self.padroes)))
+        self.padroes.append(padrao)
+
+    def _ligar_falhas(self):
+        fila = deque(self.transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self.transicoes[estado].items():
+                fila.append(proximo)
+                falha = self.falhas[estado]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                destino = self.transicoes[falha].get(caractere, 0)
+                self.falhas[proximo] = destino if destino != proximo else 0
+                self.saidas[proximo].extend(self.saidas[self.falhas[proximo]])
+
+    def ocorrencias(self, texto: str) -> list[tuple[int, int, int]]:
+        """ Ocorrências do vocabulário usadas como rótulo, em limites de palavra e sem sobreposição
+
+        Um papel é rótulo se vier seguido de ":" ou traço, ou se estiver em
+        maiúsculas no início de um trecho (começo do texto ou da linha, depois
+        de ";", "," ou parênteses, ou logo depois do rótulo anterior). Assim
+        "os reclamantes pedem" e o "Perito" de "PERITO: Jose Perito da Silva"
+        não são papéis.
+
+        Returns:
+            lista de (inicio, fim, índice do padrão) em ordem de posição
+        """
+        dobrado = dobrar(texto)
+        transicoes, falhas, saidas = self.transicoes, self.falhas, self.saidas
+        tamanho = len(dobrado)
+        encontrados = []
+        estado = 0
+        for i, caractere in enumerate(dobrado):
+            while estado and caractere not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            for comprimento, padrao in saidas[estado]:
+                inicio, fim = i + 1 - comprimento, i + 1
+                if inicio > 0 and dobrado[inicio - 1].isalnum():
+                    continue
+                if fim < tamanho and dobrado[fim] == "S" and (fim + 1 == tamanho or not dobrado[fim + 1].isalnum()):
+                    fim += 1
+                if fim < tamanho and dobrado[fim].isalnum():
+                    continue
+                encontrados.append((inicio, fim, padrao))
+
+        encontrados.sort(key=lambda o: (o[0], o[0] - o[1]))
+        resultado, limite, fim_rotulo = [], 0, 0
+        for inicio, fim, padrao in encontrados:
+            if inicio < limite:
+                continue
+            limite = fim
+            if not self._rotulo(texto, inicio, fim, fim_rotulo):
+                continue
+            resultado.append((inicio, fim, padrao))
+            fim_rotulo = fim
+        return resultado
+
+    @staticmethod
+    def _rotulo(texto: str, inicio: int, fim: int, fim_rotulo: int) -> bool:
+        """Se a ocorrência [inicio, fim) é um rótulo de papel (ver `ocorrencias`)"""
+        seguinte = fim
+        while seguinte < len(texto) and texto[seguinte] in " \t":
+            seguinte += 1
+        if seguinte < len(texto) and texto[seguinte] in _MARCAS_ROTULO:
+            return True
+        if texto[inicio:fim] != texto[inicio:fim].upper():
+            return False
+        anterior = inicio
+        while anterior > fim_rotulo and texto[anterior - 1] in _SEPARADORES:
+            anterior -= 1
+        return anterior == 0 or anterior == fim_rotulo or texto[anterior - 1] in _INICIO_TRECHO
+
+    def extrair(self, texto: str) -> list[Papel]:
+        """ Papéis processuais do texto com o trecho do nome da parte que segue cada um
+
+        O nome começa depois de espaços, dois-pontos ou traços e termina na
+        primeira quebra de linha, pontuação de separação, OAB ou no próximo
+        papel. Só é aceito se começar por letra maiúscula; senão o trecho é vazio.
+
+        Args:
+            texto: conteúdo do documento
+
+        Returns:
+            lista de Papel(tipo, polo, inicio, fim)
+        """
+        if not texto:
+            return []
+        ocorrencias = self.ocorrencias(texto)
+        papeis = []
+        for n, (_, fim_papel, padrao) in enumerate(ocorrencias):
+            tipo, polo = self.padroes[padrao]
+            limite = ocorrencias[n + 1][0] if n + 1 < len(ocorrencias) else len(texto)
+            limite = min(limite, fim_papel + TAMANHO_MAXIMO_NOME)
+
+            inicio = fim_papel
+            while inicio < limite and texto[inicio] in _SEPARADORES:
+                inicio += 1
+            if inicio < limite and texto[inicio] == "\n":
+                inicio += 1
+                while inicio < limite and texto[inicio] in _SEPARADORES:
+                    inicio += 1
+
+            fim = inicio
+            if inicio < limite and texto[inicio].isupper():
+                corte = _FIM_NOME.search(texto, inicio, limite)
+                fim = corte.start() if corte else limite
+                while fim > inicio and texto[fim - 1] in " \t.:-":
+                    fim -= 1
+            papeis.append(Papel(tipo, polo, inicio, fim if fim > inicio else inicio))
+        return papeis
+
+
+_extrator = None
+
+
+def extrator() -> ExtratorPapeis:
+    """Autômato do vocabulário padrão, compilado no primeiro uso"""
+    global _extrator
+    if _extrator is None:
+        _extrator = ExtratorPapeis()
+    return _extrator
+
+
+def extrair_papeis(texto: str) -> list[tuple[str, str, str]]:
+    """ Extrai (tipo, polo, nome) do texto com o autômato padrão
+
+    Args:
+        texto: conteúdo do documento
+
+    Returns:
+        lista de (tipo, polo, nome da parte ou None)
+    """
+    return [(p.tipo, p.polo, texto[p.inicio:p.fim] or None) for p in extrator().extrair(texto)]
+
+
+def completar_envolvidos(doc: dict, texto: str = None) -> dict:
+    """ Preenche nome_perito e nome_adv a partir do texto quando a pesquisa não os traz
+
+    Args:
+        doc: documento da pesquisa, alterado no lugar
+        texto: conteúdo do documento; por padrão os campos textuais do próprio documento
+
+    Returns:
+        o próprio documento
+    """
+    faltando = [campo for campo in CAMPOS_PAPEIS if not doc.get(campo)]
+    if not faltando:
+        return doc
+    if texto is None:
+        from search_index import campos_documento
+        texto = "\n".join(campos_documento(doc))
+
+    for tipo, _, nome in extrair_papeis(texto):
+        if nome is None:
+            continue
+        for campo in faltando:
+            if tipo in CAMPOS_PAPEIS[campo] and not doc.get(campo):
+                doc[campo] = nome
+    return doc
+
+
+def completar_lote(documentos, campo_texto: str = None):
+    """ Aplica completar_envolvidos a um iterável de documentos
+
+    Args:
+        documentos: iterável de documentos da pesquisa
+        campo_texto: chave do documento com o texto integral, se houver
+
+    Returns:
+        gerador dos documentos completados
+    """
+    for doc in documentos:
+        yield completar_envolvidos(doc, doc.get(campo_texto) if campo_texto else None)
@@ -0,0 +1,300 @@
+import argparse
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import defaultdict
+
+from paths import ARQUIVO_INDICE, PASTA_DOCUMENTOS
+
+DOCUMENTOS_POR_SEGMENTO = 5000
+INTERVALO_CAMPOS = 50
+K1 = 1.2
+B = 0.75
+
+CAMPOS_TEXTO = ("classeJudicial", "assunto", "movimentoDecisao", "poloAtivo", "poloPassivo",
+                "orgaoJulgador", "magistrado", "tipoDocumento")
+
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em", "entre", "era", "essa",
+    "esse", "esta", "este", "eu", "foi", "ha", "isso", "ja", "la", "lhe", "mais", "mas", "me", "mesmo", "na",
+    "nas", "nao", "no", "nos", "num", "numa", "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos", "por",
+    "qual", "quando", "que", "se", "sem", "ser", "seu", "sua", "suas", "seus", "so", "tambem", "te", "tem",
+    "um", "uma", "umas", "uns",
+}
+
+_PADRAO_TOKEN = re.compile(r"[a-z0-9]+")
+_PADRAO_FRASE = re.compile(r'"([^"]+)"')
+
+# Sufixos de plural/flexão removidos pelo radicalizador leve, do mais longo ao mais curto
+_SUFIXOS = (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"), ("ns", "m"),
+            ("res", "r"), ("zes", "z"), ("ses", "s"), ("s", ""))
+
+
+def dobrar_acentos(texto: str) -> str:
+    """Remove acentos e cedilha: "Ação" -> "acao" """
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def radical(token: str) -> str:
+    """Radicalização leve para o português: reduz plurais ao singular"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for sufixo, troca in _SUFIXOS:
+        if token.endswith(sufixo) and len(token) - len(sufixo) >= 2:
+            return token[:-len(sufixo)] + troca
+    return token
+
+
+def tokenizar(texto: str) -> list[str]:
+    """ Tokeniza texto em português: minúsculas, sem acento, sem stopwords, radicalizado
+
+    Args:
+        texto: texto livre
+
+    Returns:
+        lista de termos, na ordem do texto
+    """
+    return [radical(t) for t in _PADRAO_TOKEN.findall(dobrar_acentos(texto)) if t not in STOPWORDS]
+
+
+def _textos(valor):
+    if isinstance(valor, str):
+        yield valor
+    elif isinstance(valor, list):
+        for item in valor:
+            yield from _textos(item)
+    elif isinstance(valor, dict):
+        for item in valor.values():
+            yield from _textos(item)
+
+
+def campos_documento(doc: dict):
+    """Textos indexáveis do documento: campos conhecidos e fragmentos/destaques devolvidos pela pesquisa"""
+    for chave, valor in doc.items():
+        if chave in CAMPOS_TEXTO or "fragment" in chave.lower() or "highlight" in chave.lower():
+            yield from _textos(valor)
+
+
+def _varint(numero: int, saida: bytearray):
+    while numero >= 0x80:
+        saida.append((numero & 0x7F) | 0x80)
+        numero >>= 7
+    saida.append(numero)
+
+
+def codificar_postings(postings: list) -> bytes:
+    """ Codifica postings [(doc, [posições])] ordenados por doc em varints com deltas
+
+    Layout: delta do doc, frequência, deltas das posições, para cada documento.
+    """
+    saida = bytearray()
+    anterior = 0
+    for doc, posicoes in postings:
+        _varint(doc - anterior, saida)
+        _varint(len(posicoes), saida)
+        ultima = 0
+        for posicao in posicoes:
+            _varint(posicao - ultima, saida)
+            ultima = posicao
+        anterior = doc
+    return bytes(saida)
+
+
+def decodificar_postings(dados: bytes):
+    """Gerador de (doc, [posições]) a partir de codificar_postings"""
+    i, doc, n = 0, 0, len(dados)
+
+    def ler():
+        nonlocal i
+        numero, deslocamento = 0, 0
+        while True:
+            byte = dados[i]
+            i += 1
+            numero |= (byte & 0x7F) << deslocamento
+            if byte < 0x80:
+                return numero
+            deslocamento += 7
+
+    while i < n:
+        doc += ler()
+        frequencia = ler()
+        posicoes, posicao = [], 0
+        for _ in range(frequencia):
+            posicao += ler()
+            posicoes.append(posicao)
+        yield doc, posicoes
+
+
+class IndiceTextual:
+    """ Índice invertido local do conteúdo das decisões
+
+    O índice fica num arquivo SQLite: a tabela de documentos guarda o linkId
+    e o comprimento de cada documento, e cada segmento gravado acrescenta,
+    por termo, uma lista de postings com posições codificada em varints com
+    deltas. A indexação é incremental: novos documentos viram novos
+    segmentos e linkIds já indexados são ignorados. As consultas pontuam por
+    BM25 e aceitam frases entre aspas, verificadas pelas posições.
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_INDICE, documentos_por_segmento: int = DOCUMENTOS_POR_SEGMENTO):
+        self.conn = sqlite3.connect(caminho)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documentos (num INTEGER PRIMARY KEY, link_id TEXT UNIQUE, tamanho INTEGER);
+            CREATE TABLE IF NOT EXISTS postings (termo TEXT, segmento INTEGER, df INTEGER, dados BLOB,
+                                                 PRIMARY KEY (termo, segmento)) WITHOUT ROWID;
+        """)
+        self.documentos_por_segmento = documentos_por_segmento
+        self.pendentes = defaultdict(list)
+        self.docs_pendentes = []
+        self.vistos = set()
+        self.tamanhos = None
+        row = self.conn.execute("SELECT MAX(num) FROM documentos").fetchone()
+        self.proximo_num = (row[0] or 0) + 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        self.descarregar()
+        self.conn.close()
+
+    def adicionar(self, doc: dict) -> bool:
+        """ Indexa um documento da pesquisa
+
+        Returns:
+            False se o linkId já estava indexado
+        """
+        link_id = doc.get("linkId")
+        if link_id is None or link_id in self.vistos or \
+                self.conn.execute("SELECT 1 FROM documentos WHERE link_id = ?", (link_id,)).fetchone():
+            return False
+        self.vistos.add(link_id)
+
+        num = self.proximo_num
+        self.proximo_num += 1
+        posicoes = defaultdict(list)
+        posicao = 0
+        for texto in campos_documento(doc):
+            for termo in tokenizar(texto):
+                posicoes[termo].append(posicao)
+                posicao += 1
+            posicao += INTERVALO_CAMPOS
+        for termo, lista in posicoes.items():
+            self.pendentes[termo].append((num, lista))
+        self.docs_pendentes.append((num, link_id, sum(len(p) for p in posicoes.values())))
+
+        if len(self.docs_pendentes) >= self.documentos_por_segmento:
+            self.descarregar()
+        return True
+
+    def adicionar_varios(self, documentos) -> int:
+        """Indexa um iterável de documentos, retornando quantos eram novos"""
+        return sum(1 for doc in documentos if self.adicionar(doc))
+
+    def descarregar(self):
+        """Grava os documentos pendentes como um novo segmento"""
+        if not self.docs_pendentes:
+            return
+        segmento = self.docs_pendentes[0][0]
+        with self.conn:
+            self.conn.executemany("INSERT INTO documentos (num, link_id, tamanho) VALUES (?, ?, ?)", self.docs_pendentes)
+            self.conn.executemany("INSERT INTO postings (termo, segmento, df, dados) VALUES (?, ?, ?, ?)",
+                                  ((termo, segmento, len(lista), codificar_postings(lista))
+                                   for termo, lista in self.pendentes.items()))
+        self.pendentes = defaultdict(list)
+        self.docs_pendentes = []
+        self.tamanhos = None
+
+    def _postings(self, termo: str) -> dict:
+        resultado = {}
+        for (dados,) in self.conn.execute("SELECT dados FROM postings WHERE termo = ? ORDER BY segmento", (termo,)):
+            for doc, posicoes in decodificar_postings(dados):
+                resultado[doc] = posicoes
+        return resultado
+
+    def _contem_frase(self, termos: list[str], postings: dict, doc: int) -> bool:
+        seguintes = [set(postings[termo][doc]) for termo in termos[1:]]
+        return any(all(inicio + i in posicoes for i, posicoes in enumerate(seguintes, 1))
+                   for inicio in postings[termos[0]][doc])
+
+    def buscar(self, consulta: str, limite: int = 10) -> list[tuple[str, float]]:
+        """ Consulta o índice, ordenando por BM25
+
+        Termos soltos são combinados com OU; trechos entre aspas são frases
+        que o documento precisa conter na mesma ordem.
+
+        Args:
+            consulta: ex: 'horas extras "dano moral"'
+            limite: quantidade máxima de resultados
+
+        Returns:
+            lista de (linkId, pontuação)
+        """
+        self.descarregar()
+        frases = [tokenizar(frase) for frase in _PADRAO_FRASE.findall(consulta)]
+        frases = [f for f in frases if f]
+        termos = set(tokenizar(_PADRAO_FRASE.sub(" ", consulta)))
+        for frase in frases:
+            termos.update(frase)
+        if not termos:
+            return []
+
+        total_docs, soma_tamanhos = self.conn.execute("SELECT COUNT(*), SUM(tamanho) FROM documentos").fetchone()
+        if not total_docs:
+            return []
+        media = soma_tamanhos / total_docs
+
+        postings = {termo: self._postings(termo) for termo in termos}
+        candidatos = None
+        for frase in frases:
+            docs = set.intersection(*(set(postings[t]) for t in frase))
+            docs = {d for d in docs if self._contem_frase(frase, postings, d)}
+            candidatos = docs if candidatos is None else candidatos & docs
+
+        pontuacoes = defaultdict(float)
+        for termo, lista in postings.items():
+            if not lista:
+                continue
+            idf = math.log(1 + (total_docs - len(lista) + 0.5) / (len(lista) + 0.5))
+            for doc, posicoes in lista.items():
+                if candidatos is not None and doc not in candidatos:
+                    continue
+                pontuacoes[doc] += idf * len(posicoes) * (K1 + 1) / (len(posicoes) + K1 * (1 - B + B * self._tamanho(doc) / media))
+
+        melhores = sorted(pontuacoes.items(), key=lambda item: -item[1])[:limite]
+        link_ids = dict(self.conn.execute(
+            f"SELECT num, link_id FROM documentos WHERE num IN ({','.join('?' * len(melhores))})",
+            [doc for doc, _ in melhores]).fetchall()) if melhores else {}
+        return [(link_ids[doc], pontuacao) for doc, pontuacao in melhores]
+
+    def _tamanho(self, doc: int) -> int:
+        if self.tamanhos is None:
+            self.tamanhos = dict(self.conn.execute("SELECT num, tamanho FROM documentos"))
+        return self.tamanhos[doc]
+
+
+if __name__ == "__main__":
+    from storage import fonte_documentos
+
+    parser = argparse.ArgumentParser(description="Índice textual local das decisões coletadas")
+    parser.add_argument("--indice", default=ARQUIVO_INDICE)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    idx = sub.add_parser("indexar", help="indexa os documentos novos do armazém de páginas")
+    idx.add_argument("--pasta", default=PASTA_DOCUMENTOS)
+    idx.add_argument("--assunto")
+    bus = sub.add_parser("buscar", help="consulta o índice")
+    bus.add_argument("consulta")
+    bus.add_argument("--limite", type=int, default=10)
+    args = parser.parse_args()
+
+    with IndiceTextual(args.indice) as indice:
+        if args.comando == "indexar":
+            print(f"\033[32m{indice.adicionar_varios(fonte_documentos(args.pasta, assunto=args.assunto))}\033[0m documentos indexados")
+        else:
+            for link_id, pontuacao in indice.buscar(args.consulta, args.limite):
+                print(f"{pontuacao:8.3f}  {link_id}")
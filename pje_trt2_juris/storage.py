@@ -0,0 +1,291 @@
+import glob
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TAMANHO_SEGMENTO_PADRAO = 64 * 1024 * 1024
+REGISTROS_POR_BLOCO_PADRAO = 500
+SUFIXO_INDICE = ".idx.json"
+PADRAO_PAGINA_LEGADA = re.compile(r"^assunto_(?P<assunto>.*)_pagina_(?P<pagina>\d+)_data_(?P<dia>\d\d)-(?P<mes>\d\d)-(?P<ano>\d{4})\.json$")
+
+
+def _comprimir(dados: bytes, compressao: str) -> bytes:
+    if compressao == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(dados)
+    return gzip.compress(dados, compresslevel=6)
+
+
+def _descomprimir(dados: bytes, compressao: str) -> bytes:
+    if compressao == "zstd":
+        return zstandard.ZstdDecompressor().decompress(dados)
+    return gzip.decompress(dados)
+
+
+def _gravar_atomico(caminho: str, conteudo: str):
+    """Grava o arquivo via temporário + rename, com fsync"""
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+class ArmazemSegmentos:
+    """ Armazenamento append-only dos documentos das páginas de resultado
+
+    Cada documento vira uma linha NDJSON compacta com os metadados da coleta
+    (assunto, página, data). As linhas são acumuladas em blocos; cada bloco é
+    comprimido (zstd quando disponível, senão gzip) como um frame independente,
+    anexado ao segmento atual e sincronizado em disco com um único fsync. Ao
+    ultrapassar `tamanho_segmento` bytes, um novo segmento é aberto.
+
+    Ao lado de cada segmento fica um índice pequeno (`.idx.json`) com o
+    deslocamento de cada bloco gravado e o resumo do conteúdo (assuntos,
+    datas, total de registros). Somente blocos presentes no índice são lidos,
+    então um bloco parcialmente escrito numa queda é ignorado. Cada processo
+    escreve nos próprios segmentos, permitindo vários escritores na mesma pasta.
+
+    Com `blobs` (um blob_store.ArmazemBlobs), os campos grandes de cada
+    documento vão para o armazém de blobs e os segmentos guardam só a
+    referência; leia-os passando o mesmo armazém a fonte_documentos.
+    """
+
+    def __init__(self, pasta: str, tamanho_segmento: int = TAMANHO_SEGMENTO_PADRAO,
+                 registros_por_bloco: int = REGISTROS_POR_BLOCO_PADRAO, compressao: str = None, blobs=None):
+        self.pasta = pasta
+        self.tamanho_segmento = tamanho_segmento
+        self.registros_por_bloco = registros_por_bloco
+        self.compressao = compressao or ("zstd" if zstandard is not None else "gzip")
+        if self.compressao == "zstd" and zstandard is None:
+            raise ImportError("Compressão zstd requer o pacote zstandard")
+        self.buffer = []
+        self.segmento = None
+        self.indice = None
+        self.num_segmento = 0
+        self.blobs = blobs
+        if blobs is not None:
+            from blob_store import descarregar_campos
+            self._descarregar_campos = descarregar_campos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def _novo_segmento(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        self.num_segmento += 1
+        extensao = "zst" if self.compressao == "zstd" else "gz"
+        nome = f"segmento_{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{os.getpid()}_{self.num_segmento:04d}.ndjson.{extensao}"
+        self.segmento = os.path.join(self.pasta, nome)
+        self.indice = {"arquivo": nome, "compressao": self.compressao, "blocos": [], "registros": 0,
+                       "bytes": 0, "assuntos": [], "data_min": None, "data_max": None}
+
+    def gravar(self, documento: dict, assunto: str = None, pagina: int = None, data: str = None):
+        """ Acrescenta um documento ao bloco em construção
+
+        Args:
+            documento: documento da página de resultados
+            assunto: assunto pesquisado
+            pagina: página de origem
+            data: data da coleta (AAAA-MM-DD), hoje por padrão
+        """
+        if self.blobs is not None:
+            documento = self._descarregar_campos(documento, self.blobs)
+        registro = {"assunto": assunto, "pagina": pagina, "data": data or datetime.now().strftime("%Y-%m-%d"),
+                    "doc": documento}
+        self.buffer.append(registro)
+        if len(self.buffer) >= self.registros_por_bloco:
+            self.descarregar()
+
+    def descarregar(self):
+        """Comprime o bloco pendente, anexa ao segmento, faz o fsync e atualiza o índice"""
+        if not self.buffer:
+            return
+        if self.segmento is None or self.indice["bytes"] >= self.tamanho_segmento:
+            self._novo_segmento()
+
+        linhas = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in self.buffer)
+        bloco = _comprimir(linhas.encode("utf-8"), self.compressao)
+        with open(self.segmento, "ab") as f:
+            deslocamento = f.tell()
+            f.write(bloco)
+            f.flush()
+            os.fsync(f.fileno())
+
+        indice = self.indice
+        indice["blocos"].append([deslocamento, len(bloco), len(self.buffer)])
+        indice["registros"] += len(self.buffer)
+        indice["bytes"] = deslocamento + len(bloco)
+        assuntos = set(indice["assuntos"])
+        for registro in self.buffer:
+            if registro["assunto"] is not None:
+                assuntos.add(registro["assunto"])
+            data = registro["data"]
+            indice["data_min"] = data if indice["data_min"] is None else min(indice["data_min"], data)
+            indice["data_max"] = data if indice["data_max"] is None else max(indice["data_max"], data)
+        indice["assuntos"] = sorted(assuntos)
+        _gravar_atomico(self.segmento + SUFIXO_INDICE, json.dumps(indice, ensure_ascii=False))
+        self.buffer = []
+
+    def fechar(self):
+        """Descarrega o bloco pendente e encerra o segmento atual"""
+        self.descarregar()
+        self.segmento = None
+        self.indice = None
+
+
+def listar_indices(pasta: str) -> list[dict]:
+    """ Lê os índices dos segmentos da pasta, em ordem de criação
+
+    Args:
+        pasta: pasta do armazém
+
+    Returns:
+        lista de índices de segmento
+    """
+    indices = []
+    for caminho in sorted(glob.glob(os.path.join(pasta, "segmento_*" + SUFIXO_INDICE))):
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                indices.append(json.load(f))
+        except Exception as e:
+            print(f"Erro ao ler o índice {caminho}: {e}")
+    return indices
+
+
+def ler_registros(pasta: str, indices: list[dict] = None, blobs=None):
+    """ Lê os registros gravados pelo ArmazemSegmentos, um bloco por vez
+
+    Args:
+        pasta: pasta do armazém
+        indices: índices a percorrer, todos os da pasta por padrão
+        blobs: ArmazemBlobs dos campos descarregados; os documentos saem como RegistroPreguicoso
+
+    Returns:
+        gerador de registros {"assunto", "pagina", "data", "doc"}
+    """
+    if blobs is not None:
+        from blob_store import RegistroPreguicoso
+    indices = listar_indices(pasta) if indices is None else indices
+    for indice in indices:
+        caminho = os.path.join(pasta, indice["arquivo"])
+        with open(caminho, "rb") as f:
+            for deslocamento, tamanho, _ in indice["blocos"]:
+                f.seek(deslocamento)
+                linhas = _descomprimir(f.read(tamanho), indice["compressao"])
+                for linha in linhas.splitlines():
+                    if linha:
+                        registro = json.loads(linha)
+                        if blobs is not None:
+                            registro["doc"] = RegistroPreguicoso(registro["doc"], blobs)
+                        yield registro
+
+
+def estatisticas(pasta: str) -> dict:
+    """Resumo do armazém: segmentos, registros e bytes em disco"""
+    indices = listar_indices(pasta)
+    return {"segmentos": len(indices), "registros": sum(i["registros"] for i in indices),
+            "bytes": sum(i["bytes"] for i in indices)}
+
+
+def _arquivos_legados(pasta: str, assunto: str = None, desde: str = None, ate: str = None) -> list[tuple]:
+    """Arquivos de página no formato antigo que passam nos filtros, como (arquivo, assunto, página, data), em ordem cronológica"""
+    if not os.path.isdir(pasta):
+        return []
+    arquivos = []
+    for arquivo in os.listdir(pasta):
+        m = PADRAO_PAGINA_LEGADA.match(arquivo)
+        if m is None:
+            continue
+        data = f"{m['ano']}-{m['mes']}-{m['dia']}"
+        if (assunto is not None and m["assunto"] != assunto) or (desde and data < desde) or (ate and data > ate):
+            continue
+        arquivos.append((arquivo, m["assunto"], int(m["pagina"]), data))
+    # O nome traz a data como DD-MM-AAAA: a ordem é pela data lida, não pelo texto do nome
+    arquivos.sort(key=lambda a: (a[3], a[1], a[2]))
+    return arquivos
+
+
+def _paginas_legadas(pasta: str, arquivos: list[tuple]):
+    """Itera os documentos dos arquivos de página no formato antigo (um JSON por página)"""
+    for arquivo, assunto, pagina, data in arquivos:
+        try:
+            with open(os.path.join(pasta, arquivo), "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except Exception as e:
+            print(f"Erro ao processar o arquivo {arquivo}: {e}")
+            continue
+        for doc in conteudo.get("documents", []):
+            yield {"assunto": assunto, "pagina": pagina, "data": data, "doc": doc}
+
+
+def fonte_documentos(pasta: str, assunto: str = None, desde: str = None, ate: str = None, unicos: bool = True,
+                     blobs=None):
+    """ Fonte de documentos em streaming, um documento por vez
+
+    Percorre os segmentos do ArmazemSegmentos (pulando os que o índice mostra
+    não conter o assunto ou o intervalo de datas) e os arquivos de página
+    legados da mesma pasta. Apenas o bloco corrente fica em memória.
+
+    Args:
+        pasta: pasta do armazém
+        assunto: apenas documentos coletados para este assunto
+        desde: data mínima de coleta (AAAA-MM-DD)
+        ate: data máxima de coleta (AAAA-MM-DD)
+        unicos: ignora linkIds repetidos entre páginas e reexecuções, ficando com a cópia mais
+            recente (maior data de coleta; no mesmo dia, segmentos depois de páginas legadas e, entre
+            eles, a última gravada). Custa uma passada a mais sobre a fonte, que só guarda a posição
+            da cópia escolhida de cada linkId: a memória cresce com a quantidade de linkIds distintos
+        blobs: ArmazemBlobs usado na gravação, para ler os campos descarregados sob demanda
+
+    Returns:
+        gerador de documentos, na ordem de gravação (segmentos, depois páginas legadas)
+    """
+    indices = [
+        i for i in listar_indices(pasta)
+        if (assunto is None or assunto in i["assuntos"])
+        and (desde is None or (i["data_max"] or "") >= desde)
+        and (ate is None or (i["data_min"] or "") <= ate)
+    ]
+    legados = _arquivos_legados(pasta, assunto, desde, ate)
+
+    def registros():
+        """(ordinal, chave de recência, registro) de cada registro que passa nos filtros"""
+        fontes = ((1, ler_registros(pasta, indices, blobs)), (0, _paginas_legadas(pasta, legados)))
+        ordinal = 0
+        for fonte, origem in fontes:
+            for registro in origem:
+                if (assunto is not None and registro["assunto"] != assunto) or \
+                        (desde and registro["data"] < desde) or (ate and registro["data"] > ate):
+                    continue
+                ordinal += 1
+                yield ordinal, (registro["data"] or "", fonte, ordinal), registro
+
+    escolhidos = None
+    if unicos:
+        # Primeira passada: posição da cópia mais recente de cada linkId
+        recentes = {}
+        for _, chave, registro in registros():
+            link_id = registro["doc"].get("linkId")
+            if link_id is not None and (link_id not in recentes or chave > recentes[link_id]):
+                recentes[link_id] = chave
+        escolhidos = {link_id: chave[2] for link_id, chave in recentes.items()}
+        del recentes
+
+    for ordinal, _, registro in registros():
+        doc = registro["doc"]
+        if escolhidos is not None:
+            link_id = doc.get("linkId")
+            if link_id is not None and escolhidos.get(link_id) != ordinal:
+                continue
+        yield doc
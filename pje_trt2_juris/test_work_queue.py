@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from work_queue import FilaRedis, FilaSQLite, FilaTrabalho
+
+
+def _fila_sqlite(tmp_path):
+    return FilaSQLite(str(tmp_path / "fila.db"))
+
+
+def _fila_redis(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return FilaRedis(cliente=fakeredis.FakeRedis(), namespace="teste")
+
+
+@pytest.fixture(params=[_fila_sqlite, _fila_redis], ids=["sqlite", "redis"])
+def fila(request, tmp_path):
+    return request.param(tmp_path)
+
+
+def test_worker_com_lease_expirado_nao_conclui_tarefa_reservada_de_novo(fila):
+    fila.publicar("detalhe", {"linkId": "a"}, chave="a")
+    antiga = fila.reservar(["detalhe"], worker="w1", lease=0.05)
+    time.sleep(0.1)
+    nova = fila.reservar(["detalhe"], worker="w2", lease=60)
+    assert nova.id == antiga.id and nova.worker == "w2"
+
+    assert fila.concluir(antiga, "stale") is False
+    assert fila.falhar(antiga, "erro antigo") is False
+    assert fila.concluir(nova, "fresh") is True
+    assert list(fila.resultados("detalhe")) == [("a", "fresh")]
+    assert fila.contagem() == {"concluida": 1}
+
+
+def test_concluir_duas_vezes_grava_um_resultado(fila):
+    fila.publicar("detalhe", {"linkId": "b"}, chave="b")
+    tarefa = fila.reservar(["detalhe"], worker="w1")
+    assert fila.concluir(tarefa, {"ok": True}) is True
+    assert fila.concluir(tarefa, {"ok": True}) is False
+    assert list(fila.resultados("detalhe")) == [("b", {"ok": True})]
+
+
+def test_publicar_chave_repetida_nao_enfileira_de_novo(fila):
+    assert fila.publicar("detalhe", {"linkId": "c"}, chave="c") is True
+    assert fila.publicar("detalhe", {"linkId": "c"}, chave="c") is False
+    assert fila.publicar("detalhe", {"linkId": "sem chave"}) is True
+    assert fila.contagem() == {"pendente": 2}
+    tarefa = fila.reservar(["detalhe"], worker="w1")
+    assert tarefa.carga == {"linkId": "c"}
+
+
+def test_fila_incompleta_falha_ao_instanciar():
+    class FilaIncompleta(FilaTrabalho):
+        def publicar(self, tipo, carga, chave=None, max_tentativas=5):
+            return True
+
+    with pytest.raises(TypeError):
+        FilaIncompleta()
@@ -0,0 +1,373 @@
+import argparse
+import multiprocessing
+import re
+from html.parser import HTMLParser
+
+from parsing import conteudo_detalhe
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+SECOES = ("relatorio", "fundamentacao", "dispositivo")
+TAMANHO_BLOCO = 65536
+WORKERS_PADRAO = max(1, multiprocessing.cpu_count() - 1)
+
+# Tags que quebram linha no texto extraído, e tags cujo conteúdo não é texto
+_BLOCOS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "blockquote",
+           "section", "article", "header", "footer", "pre", "hr"}
+_IGNORADAS = {"script", "style", "head", "title", "noscript"}
+
+_ESPACOS = re.compile(r"[ \t\f\v\u00a0]+")
+_LINHAS_VAZIAS = re.compile(r"\n\s*\n+")
+
+
+def _normalizar(texto: str) -> str:
+    linhas = (_ESPACOS.sub(" ", linha).strip() for linha in texto.split("\n"))
+    return _LINHAS_VAZIAS.sub("\n", "\n".join(linhas)).strip()
+
+
+class _ColetorTexto:
+    """Alvo comum dos parsers de HTML: recebe tags e texto em ordem e monta as linhas"""
+
+    def __init__(self):
+        self.partes = []
+        self.ignorando = 0
+
+    def start(self, tag, attrib=None):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _IGNORADAS:
+            self.ignorando += 1
+        elif tag in _BLOCOS:
+            self.partes.append("\n")
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag in _IGNORADAS:
+            self.ignorando = max(0, self.ignorando - 1)
+        elif tag in _BLOCOS:
+            self.partes.append("\n")
+
+    def data(self, texto):
+        if not self.ignorando:
+            self.partes.append(texto)
+
+    def close(self):
+        return "".join(self.partes)
+
+
+class _ParserPadrao(HTMLParser):
+    """HTMLParser da biblioteca padrão repassando os eventos ao _ColetorTexto (sem lxml)"""
+
+    def __init__(self, coletor: _ColetorTexto):
+        super().__init__(convert_charrefs=True)
+        self.coletor = coletor
+
+    def handle_starttag(self, tag, attrs):
+        self.coletor.start(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.coletor.start(tag)
+        self.coletor.end(tag)
+
+    def handle_endtag(self, tag):
+        self.coletor.end(tag)
+
+    def handle_data(self, texto):
+        self.coletor.data(texto)
+
+
+class ExtratorHTML:
+    """ Extrator incremental de texto de HTML
+
+    Recebe o documento em blocos (`alimentar`) e só guarda o texto: com lxml,
+    o HTMLParser dele entrega os eventos direto ao coletor sem montar a
+    árvore; sem lxml, o html.parser da biblioteca padrão faz o mesmo.
+    Scripts e estilos são descartados, e as tags de bloco viram quebras de linha.
+    """
+
+    def __init__(self):
+        self.coletor = _ColetorTexto()
+        if etree is not None:
+            self.parser = etree.HTMLParser(target=self.coletor, encoding="utf-8")
+        else:
+            self.parser = _ParserPadrao(self.coletor)
+
+    def alimentar(self, bloco: str):
+        self.parser.feed(bloco.encode("utf-8") if etree is not None else bloco)
+
+    def finalizar(self) -> str:
+        texto = self.parser.close()
+        if etree is None:
+            texto = self.coletor.close()
+        return _normalizar(texto or "")
+
+
+# Grupos RTF que não fazem parte do texto visível
+_DESTINOS_IGNORADOS = {"fonttbl", "colortbl", "stylesheet", "info", "pict", "header", "footer", "headerl",
+                       "headerr", "footerl", "footerr", "object", "themedata", "colorschememapping",
+                       "latentstyles", "datastore", "xmlnstbl", "listtable", "listoverridetable", "rsidtbl",
+                       "generator", "filetbl", "revtbl", "fldinst"}
+_QUEBRAS_RTF = {"par": "\n", "line": "\n", "row": "\n", "sect": "\n", "page": "\n", "cell": " ", "tab": "\t"}
+_TOKEN_RTF = re.compile(r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])|([^\\{}\r\n]+)|[\r\n]+",
+                        re.DOTALL)
+# Fim de bloco que pode cortar uma palavra de controle (barras escapadas incluídas): fica para o próximo bloco
+_CAUDA_RTF = re.compile(r"(?<!\\)(?:\\\\)*\\(?:[a-zA-Z]{0,32}-?\d{0,10}|'[0-9a-fA-F]?)?$")
+
+
+class ExtratorRTF:
+    """ Extrator incremental de texto de RTF
+
+    Interpreta o RTF em blocos com uma pilha de grupos: \\par e \\line viram
+    quebras de linha, \\'hh e \\uN viram caracteres (com o \\ucN de
+    substitutos pulados), e tabelas de fontes, cores, estilos, imagens e
+    demais destinos (\\*) são descartados.
+    """
+
+    def __init__(self, codificacao: str = "cp1252"):
+        self.codificacao = codificacao
+        self.partes = []
+        self.resto = ""
+        # Estado de cada grupo: (ignorado, caracteres de substituição após \uN)
+        self.pilha = [(False, 1)]
+        self.pular = 0
+        self.bytes_hex = bytearray()
+
+    def _escrever(self, texto: str):
+        if self.bytes_hex:
+            self.partes.append(self.bytes_hex.decode(self.codificacao, errors="replace"))
+            self.bytes_hex.clear()
+        if texto and not self.pilha[-1][0]:
+            self.partes.append(texto)
+
+    def _processar(self, texto: str):
+        for m in _TOKEN_RTF.finditer(texto):
+            palavra, parametro, hexa, simbolo, chave, literal = m.groups()
+            ignorado, uc = self.pilha[-1]
+            if self.pular and (literal or hexa or simbolo is not None):
+                if literal:
+                    # Pula só os primeiros caracteres do texto
+                    n = min(self.pular, len(literal))
+                    self.pular -= n
+                    literal = literal[n:]
+                    if not literal:
+                        continue
+                else:
+                    self.pular -= 1
+                    continue
+            if chave == "{":
+                self._escrever("")
+                self.pilha.append((ignorado, uc))
+            elif chave == "}":
+                self._escrever("")
+                if len(self.pilha) > 1:
+                    self.pilha.pop()
+            elif palavra:
+                if palavra in _DESTINOS_IGNORADOS:
+                    self.pilha[-1] = (True, uc)
+                elif palavra == "uc":
+                    self.pilha[-1] = (ignorado, int(parametro or 1))
+                elif palavra == "u":
+                    codigo = int(parametro or 0)
+                    self._escrever(chr(codigo + 65536 if codigo < 0 else codigo))
+                    self.pular = uc
+                elif palavra in _QUEBRAS_RTF:
+                    self._escrever(_QUEBRAS_RTF[palavra])
+                else:
+                    self._escrever("")
+            elif hexa:
+                if not ignorado:
+                    self.bytes_hex.append(int(hexa, 16))
+            elif simbolo is not None:
+                if simbolo == "*":
+                    self.pilha[-1] = (True, uc)
+                elif simbolo in "\\{}":
+                    self._escrever(simbolo)
+                elif simbolo == "~":
+                    self._escrever("\u00a0")
+                elif simbolo in "\r\n":
+                    self._escrever("\n")
+                else:
+                    self._escrever("")
+            elif literal:
+                self._escrever(literal)
+
+    def alimentar(self, bloco: str):
+        texto = self.resto + bloco
+        cauda = _CAUDA_RTF.search(texto)
+        corte = cauda.start() if cauda else len(texto)
+        self.resto = texto[corte:]
+        self._processar(texto[:corte])
+
+    def finalizar(self) -> str:
+        self._processar(self.resto)
+        self.resto = ""
+        self._escrever("")
+        return _normalizar("".join(self.partes))
+
+
+def detectar_tipo(conteudo: str, tipo: str = None) -> str:
+    """ "rtf", "html" ou "texto", pelo início do conteúdo (o tipoConteudo da API só desempata) """
+    inicio = conteudo.lstrip()[:256].lower()
+    if inicio.startswith("{\\rtf"):
+        return "rtf"
+    if inicio.startswith("<") or re.search(r"<(html|body|p|div|br|span|table)\b", inicio):
+        return "html"
+    if tipo and tipo.lower() in ("html", "rtf") and "<" in conteudo:
+        return "html"
+    return "texto"
+
+
+def extrair_texto(conteudo: str, tipo: str = None, tamanho_bloco: int = TAMANHO_BLOCO) -> str:
+    """ Texto corrido de um corpo HTML, RTF ou texto simples
+
+    Args:
+        conteudo: corpo do documento
+        tipo: tipoConteudo informado pela API, se houver
+        tamanho_bloco: caracteres entregues por vez ao extrator
+
+    Returns:
+        texto com uma linha por parágrafo
+    """
+    if not conteudo:
+        return ""
+    formato = detectar_tipo(conteudo, tipo)
+    if formato == "texto":
+        return _normalizar(conteudo)
+    extrator = ExtratorRTF() if formato == "rtf" else ExtratorHTML()
+    for inicio in range(0, len(conteudo), tamanho_bloco):
+        extrator.alimentar(conteudo[inicio:inicio + tamanho_bloco])
+    return extrator.finalizar()
+
+
+# Títulos das seções, sozinhos na linha (com numeração opcional). Acórdãos e sentenças variam no título
+# (ex: "FUNDAMENTOS", "VOTO"), então cada seção aceita as formas mais comuns.
+_TITULOS_SECOES = {
+    "relatorio": r"relat[óo]rio",
+    "fundamentacao": r"fundamenta[çc][ãa]o|fundamentos|voto|m[ée]rito|admissibilidade",
+    "dispositivo": r"dispositivo|conclus[ãa]o",
+}
+# Expressões que abrem o dispositivo no começo de um parágrafo; ficam no texto da seção
+_EXPRESSOES_DISPOSITIVO = (r"isto\s+posto|posto\s+isso|ante\s+o\s+exposto|diante\s+do\s+exposto|pelo\s+exposto"
+                           r"|em\s+face\s+do\s+exposto|acordam")
+_PADRAO_SECOES = re.compile(
+    "|".join(rf"^[ \t\d.IVX-]*(?P<{secao}>{titulo})[ \t:.\-–]*$" for secao, titulo in _TITULOS_SECOES.items())
+    + rf"|^[ \t]*(?P<expressao>{_EXPRESSOES_DISPOSITIVO})\b",
+    re.IGNORECASE | re.MULTILINE)
+
+
+def segmentar(texto: str) -> dict:
+    """ Divide o texto em relatório, fundamentação e dispositivo pelos títulos das seções
+
+    Cada seção vai do seu título até o título da próxima seção; títulos
+    repetidos da mesma seção (ex: "MÉRITO" dentro da fundamentação) não a
+    interrompem, e títulos de uma seção anterior que aparecem depois (ex:
+    "voto" citado no dispositivo) são ignorados. Expressões como "Ante o
+    exposto" e "ACORDAM" abrem o dispositivo e ficam no texto dele. O que vem
+    antes do primeiro título (ementa, cabeçalho) fica em "cabecalho".
+
+    Returns:
+        {"cabecalho", "relatorio", "fundamentacao", "dispositivo"} com o texto
+        de cada seção encontrada (as ausentes não aparecem)
+    """
+    marcas = []
+    for m in _PADRAO_SECOES.finditer(texto):
+        secao = "dispositivo" if m.lastgroup == "expressao" else m.lastgroup
+        if marcas and SECOES.index(secao) <= SECOES.index(marcas[-1][0]):
+            continue
+        inicio = m.start(m.lastgroup) if m.lastgroup == "expressao" else m.end()
+        marcas.append((secao, m.start(), inicio))
+
+    secoes = {}
+    cabecalho = texto[:marcas[0][1]] if marcas else texto
+    if cabecalho.strip():
+        secoes["cabecalho"] = cabecalho.strip()
+    for i, (secao, _, inicio) in enumerate(marcas):
+        fim = marcas[i + 1][1] if i + 1 < len(marcas) else len(texto)
+        conteudo = texto[inicio:fim].strip()
+        if conteudo:
+            secoes[secao] = conteudo
+    return secoes
+
+
+def _extrair_detalhe(tarefa: tuple):
+    """Tarefa do pool: (linkId, {"texto", "secoes"}) de um corpo de documento"""
+    link_id, conteudo, tipo = tarefa
+    try:
+        texto = extrair_texto(conteudo, tipo)
+        return link_id, {"texto": texto, "secoes": segmentar(texto)}
+    except Exception as e:
+        print(f"Erro ao extrair o texto do documento {link_id}: {e}")
+        return link_id, None
+
+
+def extrair_corpus(banco, workers: int = WORKERS_PADRAO, chunksize: int = 16, reprocessar: bool = False) -> int:
+    """ Extrai o texto e as seções dos corpos dos documentos num pool de processos
+
+    O corpo bruto continua no detalhe; o texto vai para "texto" e as seções
+    para "secoes", no mesmo registro de detalhe (e, pelo merge, no registro do
+    processo). Detalhes que já têm "texto" são pulados, salvo com `reprocessar`.
+    Os corpos são lidos da base em lotes de TAMANHO_LOTE, então a memória não
+    cresce com o corpus.
+
+    Args:
+        banco: BancoProcessos com os detalhes coletados
+        workers: processos do pool; com 1 tudo roda no processo atual
+        chunksize: documentos enviados por vez a cada processo
+        reprocessar: refaz também os detalhes já extraídos
+
+    Returns:
+        quantidade de detalhes atualizados
+    """
+    from process_store import TAMANHO_LOTE, _lotes
+
+    link_ids = [link_id for (link_id,) in banco.conn.execute("SELECT link_id FROM detalhes ORDER BY rowid")]
+    total = 0
+    with multiprocessing.Pool(workers) if workers > 1 else _SemPool() as pool:
+        for lote in _lotes(link_ids, TAMANHO_LOTE):
+            # Lidos aqui, na thread principal: a conexão SQLite não pode ir para a thread do pool
+            detalhes, tarefas = {}, []
+            for link_id in lote:
+                dados = banco.detalhe(link_id)
+                if not isinstance(dados, dict) or (not reprocessar and "texto" in dados):
+                    continue
+                conteudo, tipo = conteudo_detalhe(dados)
+                if conteudo:
+                    detalhes[link_id] = dados
+                    tarefas.append((link_id, conteudo, tipo))
+            atualizados = {}
+            for link_id, extraido in pool.imap(_extrair_detalhe, tarefas, chunksize):
+                if extraido is not None:
+                    detalhes[link_id].update(extraido)
+                    atualizados[link_id] = detalhes[link_id]
+            if atualizados:
+                total += banco.salvar_detalhes(atualizados)
+    return total
+
+
+class _SemPool:
+    """Mesma interface do Pool rodando no processo atual"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def imap(self, funcao, itens, chunksize=1):
+        return map(funcao, itens)
+
+
+if __name__ == "__main__":
+    from process_store import BancoProcessos, ARQUIVO_BANCO
+
+    parser = argparse.ArgumentParser(description="Extrai o texto e as seções dos corpos HTML/RTF dos documentos")
+    parser.add_argument("--banco", default=ARQUIVO_BANCO)
+    parser.add_argument("--workers", type=int, default=WORKERS_PADRAO)
+    parser.add_argument("--reprocessar", action="store_true", help="refaz os documentos já extraídos")
+    args = parser.parse_args()
+
+    with BancoProcessos(args.banco) as banco:
+        total = extrair_corpus(banco, args.workers, reprocessar=args.reprocessar)
+    print(f"\033[32m{total}\033[0m documentos extraídos")
@@ -0,0 +1,288 @@
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from metrics import REGISTRO
+
+# Variáveis de ambiente: spans em JSON lines e perfil de uma etapa
+VARIAVEL_TRACE = "PJE_TRACE"
+VARIAVEL_PERFIL = "PJE_PERFIL"
+VARIAVEL_MODO = "PJE_PERFIL_MODO"
+VARIAVEL_SAIDA = "PJE_PERFIL_SAIDA"
+INTERVALO_AMOSTRAGEM = 0.005
+MODOS_PERFIL = ("amostragem", "cprofile")
+
+# Etapas do pipeline instrumentadas
+ETAPAS = ("captcha_busca", "captcha_resolucao", "pagina_post", "detalhe", "registro", "mesclagem")
+
+ETAPA_SEGUNDOS = REGISTRO.histograma("pje_etapa_segundos", "Duração de cada span, por etapa")
+
+_local = threading.local()
+_lock = threading.Lock()
+_arquivo_trace = None
+_perfil = None
+
+
+def _pilha() -> list:
+    pilha = getattr(_local, "pilha", None)
+    if pilha is None:
+        pilha = _local.pilha = []
+    return pilha
+
+
+@contextmanager
+def span(etapa: str, **atributos):
+    """ Mede um trecho do pipeline
+
+    O custo fixo é o de duas leituras de relógio e uma observação no
+    histograma pje_etapa_segundos, então os spans ficam sempre ligados. Com
+    PJE_TRACE=<arquivo> cada span também vira uma linha JSON (etapa, início,
+    duração, thread, span pai e atributos). Se a etapa for a escolhida em
+    PJE_PERFIL, o trecho também é perfilado.
+
+    Args:
+        etapa: nome da etapa (ver ETAPAS)
+        atributos: valores extras gravados no trace
+    """
+    pilha = _pilha()
+    pai = pilha[-1] if pilha else None
+    pilha.append(etapa)
+    perfil = _perfil_do_processo() if _perfil is not None and _perfil.etapa == etapa else None
+    if perfil is not None:
+        perfil.entrar()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        if perfil is not None:
+            perfil.sair()
+        pilha.pop()
+        ETAPA_SEGUNDOS.observar(duracao, etapa=etapa)
+        if _arquivo_trace is not None:
+            linha = json.dumps({"etapa": etapa, "inicio": time.time() - duracao, "duracao": duracao,
+                                "thread": threading.current_thread().name, "pai": pai, **atributos},
+                               ensure_ascii=False, default=str)
+            with _lock:
+                _arquivo_trace.write(linha + "\n")
+
+
+def _em_processo_filho() -> bool:
+    """Se este é um processo filho do multiprocessing (ex: worker de um ProcessPoolExecutor)"""
+    multiprocessing = sys.modules.get("multiprocessing")
+    return multiprocessing is not None and multiprocessing.parent_process() is not None
+
+
+def _saida_processo(saida: str) -> str:
+    """Arquivo de perfil do processo atual: nos processos filhos, com o PID antes da extensão"""
+    if not _em_processo_filho():
+        return saida
+    raiz, extensao = os.path.splitext(saida)
+    return f"{raiz}.{os.getpid()}{extensao}"
+
+
+def _nome_quadro(frame) -> str:
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+def _nome_funcao(funcao: tuple) -> str:
+    arquivo, linha, nome = funcao
+    return f"{nome} ({os.path.basename(arquivo)}:{linha})" if linha else nome
+
+
+class PerfilEtapa:
+    """ Perfil sob demanda de uma única etapa, gravado em pilhas colapsadas
+
+    Modos:
+        "amostragem": uma thread lê a pilha das threads que estão dentro da
+            etapa a cada INTERVALO_AMOSTRAGEM segundos; cada linha da saída é
+            uma pilha real com a quantidade de amostras
+        "cprofile": cProfile ligado só enquanto a etapa executa; as pilhas são
+            reconstruídas do grafo de chamadas e pesadas em microssegundos, e o
+            .prof do pstats é gravado ao lado. O cProfile só mede a thread que
+            o ligou: com a etapa rodando em várias threads ao mesmo tempo, só a
+            que entrou nela primeiro aparece (use "amostragem" nesses casos)
+
+    A saída (uma pilha "raiz;...;folha contagem" por linha) é lida por
+    flamegraph.pl, speedscope e inferno. Em processos filhos (workers de
+    pool) cada processo tem o seu perfil, gravado em <saida>.<pid>.folded.
+    """
+
+    def __init__(self, etapa: str, modo: str = "amostragem", saida: str = None):
+        if modo not in MODOS_PERFIL:
+            raise ValueError(f"Modo de perfil desconhecido: {modo}")
+        self.etapa = etapa
+        self.modo = modo
+        self.base = saida or f"perfil_{etapa}.folded"
+        self.saida = _saida_processo(self.base)
+        self.pid = os.getpid()
+        self.threads_ativas = {}
+        self.amostras = Counter()
+        self.perfilador = cProfile.Profile() if modo == "cprofile" else None
+        self.ativo = 0
+        self.parar = threading.Event()
+        self.amostrador = None
+        if modo == "amostragem":
+            self.amostrador = threading.Thread(target=self._amostrar, daemon=True)
+            self.amostrador.start()
+
+    def entrar(self):
+        with _lock:
+            if self.perfilador is not None:
+                if self.ativo == 0:
+                    self.perfilador.enable()
+                self.ativo += 1
+            else:
+                ident = threading.get_ident()
+                self.threads_ativas[ident] = self.threads_ativas.get(ident, 0) + 1
+
+    def sair(self):
+        with _lock:
+            if self.perfilador is not None:
+                self.ativo -= 1
+                if self.ativo == 0:
+                    self.perfilador.disable()
+            else:
+                ident = threading.get_ident()
+                self.threads_ativas[ident] -= 1
+                if not self.threads_ativas[ident]:
+                    del self.threads_ativas[ident]
+
+    def _amostrar(self):
+        while not self.parar.wait(INTERVALO_AMOSTRAGEM):
+            with _lock:
+                ativas = set(self.threads_ativas)
+            if not ativas:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident not in ativas:
+                    continue
+                quadros = []
+                while frame is not None:
+                    quadros.append(_nome_quadro(frame))
+                    frame = frame.f_back
+                self.amostras[";".join(reversed(quadros))] += 1
+
+    def _pilhas_cprofile(self) -> Counter:
+        """Pilhas colapsadas reconstruídas do grafo de chamadas do cProfile, em microssegundos"""
+        self.perfilador.create_stats()
+        if not self.perfilador.stats:
+            return Counter()
+        estatisticas = pstats.Stats(self.perfilador).stats
+        chamados = {}
+        for funcao, (_, _, _, _, chamadores) in estatisticas.items():
+            for chamador, (_, _, tt, ct) in chamadores.items():
+                chamados.setdefault(chamador, []).append((funcao, tt, ct))
+        raizes = [f for f, dados in estatisticas.items() if not dados[4]]
+        pilhas = Counter()
+
+        def descer(funcao, caminho: list, fracao: float, visitados: set):
+            caminho = caminho + [_nome_funcao(funcao)]
+            micros = int(estatisticas[funcao][2] * fracao * 1e6)
+            if micros:
+                pilhas[";".join(caminho)] += micros
+            if len(caminho) > 200:
+                return
+            for filho, _, ct_aresta in chamados.get(funcao, []):
+                total_filho = estatisticas[filho][3]
+                if filho in visitados or total_filho <= 0:
+                    continue
+                parcela = fracao * ct_aresta / total_filho
+                if parcela > 1e-6:
+                    descer(filho, caminho, parcela, visitados | {filho})
+
+        for raiz in raizes:
+            descer(raiz, [], 1.0, {raiz})
+        return pilhas
+
+    def descarregar(self):
+        """Grava as pilhas acumuladas até agora, sem encerrar o perfil (o arquivo é reescrito a cada chamada)"""
+        with _lock:
+            pilhas = Counter(self.amostras) if self.perfilador is None else None
+        if pilhas is None:
+            if self.ativo:
+                return
+            pilhas = self._pilhas_cprofile()
+            if pilhas:
+                self.perfilador.dump_stats(os.path.splitext(self.saida)[0] + ".prof")
+        with open(self.saida, "w", encoding="utf-8") as f:
+            for pilha, contagem in pilhas.most_common():
+                f.write(f"{pilha} {contagem}\n")
+
+    def gravar(self):
+        """Encerra a amostragem e grava as pilhas colapsadas"""
+        if self.parar.is_set():
+            return
+        self.parar.set()
+        if self.amostrador is not None:
+            self.amostrador.join()
+        self.descarregar()
+        print(f"Perfil da etapa {self.etapa} ({self.modo}) salvo em: \033[32m{self.saida}\033[0m")
+
+
+def configurar_trace(caminho: str):
+    """Grava cada span como uma linha JSON em `caminho` (None desliga)"""
+    global _arquivo_trace
+    if _arquivo_trace is not None:
+        _arquivo_trace.close()
+    _arquivo_trace = open(caminho, "a", encoding="utf-8", buffering=1) if caminho else None
+
+
+def _perfil_do_processo() -> PerfilEtapa:
+    """Perfil ativo neste processo; um filho criado por fork ganha um perfil próprio (com amostrador e arquivo por PID)"""
+    global _perfil
+    if _perfil is not None and _perfil.pid != os.getpid():
+        _perfil = PerfilEtapa(_perfil.etapa, _perfil.modo, _perfil.base)
+    return _perfil
+
+
+def descarregar_perfil():
+    """ Grava o perfil de um processo filho até aqui
+
+    Os workers de pool terminam com os._exit, sem rodar o atexit que grava o
+    perfil; o código que roda a etapa em workers chama esta função ao fim de
+    cada chunk. No processo principal não faz nada (o perfil é gravado na saída).
+    """
+    if _perfil is not None and _em_processo_filho():
+        _perfil_do_processo().descarregar()
+
+
+def configurar_perfil(etapa: str, modo: str = "amostragem", saida: str = None) -> PerfilEtapa:
+    """ Liga o perfil de uma etapa; as pilhas são gravadas ao fim do processo
+
+    Etapas que rodam num pool de processos (ex: "registro" com workers > 1)
+    são perfiladas em cada worker, um arquivo por PID (ver descarregar_perfil).
+    No modo "cprofile" só a primeira thread a entrar na etapa é medida.
+
+    Args:
+        etapa: etapa perfilada (ver ETAPAS)
+        modo: "amostragem" ou "cprofile"
+        saida: arquivo de pilhas colapsadas, por padrão perfil_<etapa>.folded
+    """
+    global _perfil
+    if _perfil is not None:
+        _perfil.gravar()
+    _perfil = PerfilEtapa(etapa, modo, saida) if etapa else None
+    if _perfil is not None:
+        atexit.register(_perfil.gravar)
+    return _perfil
+
+
+def configurar_ambiente():
+    """Aplica PJE_TRACE, PJE_PERFIL, PJE_PERFIL_MODO e PJE_PERFIL_SAIDA"""
+    if os.environ.get(VARIAVEL_TRACE):
+        configurar_trace(os.environ[VARIAVEL_TRACE])
+    if os.environ.get(VARIAVEL_PERFIL):
+        configurar_perfil(os.environ[VARIAVEL_PERFIL], os.environ.get(VARIAVEL_MODO, "amostragem"),
+                          os.environ.get(VARIAVEL_SAIDA))
+
+
+configurar_ambiente()
@@ -0,0 +1,249 @@
+import argparse
+import multiprocessing
+import re
+
+from parsing import parse_valor
+
+# Um único scanner para todos os tipos; a ordem das alternativas resolve as ambiguidades
+# (CNPJ antes de CPF, valores com R$ antes de números soltos)
+PADRAO_VALORES = re.compile(r"""
+    (?P<valor>R\$\s*(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d{2})?)
+  | (?<![\d./-])(?P<cnpj>\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})(?![\d/-]|\.\d)
+  | (?<![\d./-])(?P<cpf>\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?![\d/-]|\.\d)
+  | (?<![\d./-])(?P<cep>\d{2}\.?\d{3}-\d{3})(?![\d-]|\.\d)
+  | (?<![\d)])(?P<telefone>\(\d{2}\)\s?9?\d{4}-?\d{4}|\d{2}\s9?\d{4}-\d{4})(?![\d-])
+""", re.VERBOSE)
+
+_NAO_DIGITO = re.compile(r"\D")
+_CONTEXTO_CAUSA = re.compile(r"causa\W*(?:[a-zà-ú]+\W+){0,4}$", re.IGNORECASE)
+
+TIPOS_VALORES = ("cpf", "cnpj", "telefone", "cep", "valor")
+TIPOS_PARTE = ("cpf", "cnpj", "cep")
+# Distância máxima (em caracteres) entre o fim do nome da parte e o CPF/CNPJ/CEP atribuído a ela
+JANELA_PARTE = 120
+WORKERS_PADRAO = max(1, multiprocessing.cpu_count() - 1)
+
+
+def _digitos_verificadores(base: str, pesos: list[int]) -> str:
+    soma = sum(int(d) * p for d, p in zip(base, pesos))
+    resto = soma % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def validar_cpf(cpf: str) -> bool:
+    """Confere os dois dígitos verificadores do CPF (com ou sem pontuação)"""
+    numero = _NAO_DIGITO.sub("", cpf)
+    if len(numero) != 11 or numero == numero[0] * 11:
+        return False
+    primeiro = _digitos_verificadores(numero[:9], list(range(10, 1, -1)))
+    segundo = _digitos_verificadores(numero[:9] + primeiro, list(range(11, 1, -1)))
+    return numero[9:] == primeiro + segundo
+
+
+def validar_cnpj(cnpj: str) -> bool:
+    """Confere os dois dígitos verificadores do CNPJ (com ou sem pontuação)"""
+    numero = _NAO_DIGITO.sub("", cnpj)
+    if len(numero) != 14 or numero == numero[0] * 14:
+        return False
+    pesos = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    primeiro = _digitos_verificadores(numero[:12], pesos)
+    segundo = _digitos_verificadores(numero[:12] + primeiro, [6] + pesos)
+    return numero[12:] == primeiro + segundo
+
+
+def _normalizar(tipo: str, texto: str):
+    """Formato padrão do valor encontrado, ou None se ele não passar na validação"""
+    if tipo == "valor":
+        try:
+            return parse_valor("".join(texto.split()))
+        except ValueError:
+            return None
+    numero = _NAO_DIGITO.sub("", texto)
+    if tipo == "cpf":
+        return f"{numero[:3]}.{numero[3:6]}.{numero[6:9]}-{numero[9:]}" if validar_cpf(numero) else None
+    if tipo == "cnpj":
+        return f"{numero[:2]}.{numero[2:5]}.{numero[5:8]}/{numero[8:12]}-{numero[12:]}" if validar_cnpj(numero) else None
+    if tipo == "cep":
+        return f"{numero[:5]}-{numero[5:]}"
+    return f"({numero[:2]}) {numero[2:-4]}-{numero[-4:]}"
+
+
+def _ocorrencias_nomes(texto: str, nomes) -> list:
+    """(fim, nome) de cada ocorrência dos nomes no texto, em ordem, sem diferenciar maiúsculas"""
+    nomes = sorted({n.strip() for n in nomes if isinstance(n, str) and n.strip()}, key=len, reverse=True)
+    if not nomes:
+        return []
+    padrao = re.compile("|".join(re.escape(n) for n in nomes), re.IGNORECASE)
+    canonico = {n.casefold(): n for n in nomes}
+    return [(m.end(), canonico[m.group().casefold()]) for m in padrao.finditer(texto)]
+
+
+def extrair_valores(texto: str, nomes=()) -> dict:
+    """ Encontra todos os CPFs, CNPJs, telefones, CEPs e valores em R$ do texto numa única passada
+
+    CPF e CNPJ só entram com dígitos verificadores válidos. Cada valor aparece
+    uma vez, na ordem da primeira ocorrência. Com `nomes`, cada CPF, CNPJ e
+    CEP é atribuído à parte cujo nome aparece mais perto antes dele (até
+    JANELA_PARTE caracteres); o primeiro de cada tipo vale.
+
+    Args:
+        texto: texto integral do documento
+        nomes: nomes das partes do processo (ex: nomes_documento)
+
+    Returns:
+        {"cpf": [...], "cnpj": [...], "telefone": [...], "cep": [...], "valor": [...],
+         "valor_causa": valor em R$ precedido de "causa", ou None,
+         "partes": {nome: {"cpf"/"cnpj"/"cep": valor}}}
+    """
+    valores = {tipo: [] for tipo in TIPOS_VALORES}
+    valores["valor_causa"] = None
+    valores["partes"] = {}
+    if not texto:
+        return valores
+    ocorrencias = _ocorrencias_nomes(texto, nomes)
+    proxima, ultimo_nome = 0, None
+    for m in PADRAO_VALORES.finditer(texto):
+        tipo = m.lastgroup
+        normalizado = _normalizar(tipo, m.group(tipo))
+        if normalizado is None:
+            continue
+        if normalizado not in valores[tipo]:
+            valores[tipo].append(normalizado)
+        if tipo == "valor" and valores["valor_causa"] is None and \
+                _CONTEXTO_CAUSA.search(texto, max(0, m.start() - 60), m.start()):
+            valores["valor_causa"] = normalizado
+        if tipo in TIPOS_PARTE and ocorrencias:
+            while proxima < len(ocorrencias) and ocorrencias[proxima][0] <= m.start():
+                ultimo_nome = ocorrencias[proxima]
+                proxima += 1
+            if ultimo_nome is not None and m.start() - ultimo_nome[0] <= JANELA_PARTE:
+                valores["partes"].setdefault(ultimo_nome[1], {}).setdefault(tipo, normalizado)
+    return valores
+
+
+def texto_documento(doc: dict) -> str:
+    """Texto integral do documento da pesquisa, campo a campo"""
+    from search_index import campos_documento
+    return "\n".join(campos_documento(doc))
+
+
+def nomes_documento(doc: dict) -> list:
+    """Nomes das partes do documento da pesquisa (polos ativo e passivo)"""
+    nomes = []
+    for chave in ("poloAtivo", "poloPassivo"):
+        valor = doc.get(chave)
+        nomes.extend(valor if isinstance(valor, list) else [valor])
+    return [n for n in nomes if isinstance(n, str) and n]
+
+
+def _extrair_documento(doc: dict):
+    """Tarefa do pool: (linkId, valores) de um documento"""
+    try:
+        return doc.get("linkId"), extrair_valores(texto_documento(doc), nomes_documento(doc))
+    except Exception as e:
+        print(f"Erro ao extrair valores do documento {doc.get('linkId')}: {e}")
+        return doc.get("linkId"), None
+
+
+def _pessoas(registro: dict):
+    """Envolvidos e representantes do registro, em todas as instâncias"""
+    for fonte in registro.get("fontes") or []:
+        for instancia in fonte.get("instancias") or []:
+            for envolvido in instancia.get("envolvidos") or []:
+                yield envolvido
+                yield from envolvido.get("representantes") or []
+
+
+def _preencher_parte(pessoa: dict, valores: dict):
+    """Preenche documento (CPF/CNPJ) e CEP vazios de um envolvido ou representante"""
+    documentos = pessoa.get("documento")
+    if isinstance(documentos, list):
+        for tipo in ("cpf", "cnpj"):
+            if not valores.get(tipo):
+                continue
+            vaga = next((d for d in documentos if isinstance(d, dict) and d.get("tipo") == tipo.upper()), None)
+            if vaga is None:
+                documentos.append({"tipo": tipo.upper(), "uf": None, "valor": valores[tipo]})
+            elif vaga.get("valor") is None:
+                vaga["valor"] = valores[tipo]
+    if valores.get("cep") and isinstance(pessoa.get("endereco"), dict) and not pessoa["endereco"].get("cep"):
+        pessoa["endereco"]["cep"] = valores["cep"]
+
+
+def aplicar_valores(registro: dict, valores: dict) -> dict:
+    """ Grava os valores extraídos no registro do processo
+
+    Os valores vão para "valores_extraidos"; valor_causa só é preenchido se
+    estiver vazio e o texto trouxer o valor da causa. CPF, CNPJ e CEP
+    atribuídos a uma parte (valores["partes"]) preenchem o documento e o CEP
+    vazios do envolvido ou representante com esse nome; envolvidos com vários
+    nomes num mesmo polo só recebem o valor se apenas um dos nomes tiver valores.
+
+    Args:
+        registro: registro no formato de construir_registro, alterado no lugar
+        valores: saída de extrair_valores
+
+    Returns:
+        o próprio registro
+    """
+    registro["valores_extraidos"] = {tipo: valores[tipo] for tipo in TIPOS_VALORES if valores[tipo]}
+    if registro.get("valor_causa") is None and valores.get("valor_causa") is not None:
+        registro["valor_causa"] = valores["valor_causa"]
+    partes = valores.get("partes") or {}
+    if partes:
+        registro["valores_extraidos"]["partes"] = partes
+        for pessoa in _pessoas(registro):
+            nomes = pessoa.get("nome")
+            nomes = nomes if isinstance(nomes, list) else [nomes]
+            encontrados = [partes[n] for n in nomes if isinstance(n, str) and n in partes]
+            if len(encontrados) == 1:
+                _preencher_parte(pessoa, encontrados[0])
+    return registro
+
+
+def extrair_corpus(documentos, banco, workers: int = WORKERS_PADRAO, chunksize: int = 64) -> int:
+    """ Extrai os valores de todo o corpus num pool de processos e grava nos processos da base
+
+    Args:
+        documentos: iterável de documentos (ex: storage.fonte_documentos)
+        banco: BancoProcessos com os registros a completar
+        workers: processos do pool
+        chunksize: documentos enviados por vez a cada processo
+
+    Returns:
+        quantidade de processos atualizados
+    """
+    from process_store import TAMANHO_LOTE
+
+    total, lote = 0, []
+    with multiprocessing.Pool(workers) as pool:
+        for link_id, valores in pool.imap(_extrair_documento, documentos, chunksize):
+            if not valores or link_id is None:
+                continue
+            registro = banco.processo(link_id=link_id)
+            if registro is None:
+                continue
+            lote.append(aplicar_valores(registro, valores))
+            if len(lote) >= TAMANHO_LOTE:
+                total += banco.salvar_processos(lote)
+                lote = []
+    if lote:
+        total += banco.salvar_processos(lote)
+    return total
+
+
+if __name__ == "__main__":
+    from paths import PASTA_DOCUMENTOS
+    from process_store import BancoProcessos, ARQUIVO_BANCO
+    from storage import fonte_documentos
+
+    parser = argparse.ArgumentParser(description="Extrai CPF, CNPJ, telefones, CEPs e valores dos documentos coletados")
+    parser.add_argument("--pasta", default=PASTA_DOCUMENTOS)
+    parser.add_argument("--assunto")
+    parser.add_argument("--banco", default=ARQUIVO_BANCO)
+    parser.add_argument("--workers", type=int, default=WORKERS_PADRAO)
+    args = parser.parse_args()
+
+    with BancoProcessos(args.banco) as banco:
+        total = extrair_corpus(fonte_documentos(args.pasta, assunto=args.assunto), banco, args.workers)
+    print(f"\033[32m{total}\033[0m processos atualizados")
@@ -0,0 +1,448 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+LEASE_PADRAO = 300.0
+MAX_TENTATIVAS_PADRAO = 5
+
+
+@dataclass
+class Tarefa:
+    """Tarefa reservada por um worker"""
+    id: str
+    tipo: str
+    carga: dict = field(default_factory=dict)
+    tentativas: int = 0
+    max_tentativas: int = MAX_TENTATIVAS_PADRAO
+    worker: str = None
+    lease_ate: float = None
+    erro: str = None
+
+
+def id_worker() -> str:
+    """Identificador padrão do worker: host e pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FilaTrabalho(ABC):
+    """ Interface das filas de trabalho distribuídas
+
+    Uma tarefa publicada fica pendente até ser reservada por um worker, que
+    recebe um lease com prazo. Enquanto trabalha, o worker renova o lease
+    (heartbeat); se ele morrer, o lease expira e a tarefa volta a ficar
+    pendente. Tarefas que esgotam `max_tentativas` vão para a fila de mortas.
+    """
+
+    @abstractmethod
+    def publicar(self, tipo: str, carga: dict, chave: str = None, max_tentativas: int = MAX_TENTATIVAS_PADRAO) -> bool:
+        """ Publica uma tarefa
+
+        Args:
+            tipo: tipo da tarefa ("pagina", "detalhe", ...)
+            carga: dados da tarefa, serializáveis em JSON
+            chave: chave de deduplicação, tarefas com chave repetida são ignoradas
+            max_tentativas: tentativas antes de ir para a fila de mortas
+
+        Returns:
+            True se a tarefa foi publicada, False se já existia
+        """
+
+    @abstractmethod
+    def reservar(self, tipos: list[str] = None, worker: str = None, lease: float = LEASE_PADRAO) -> Tarefa:
+        """ Reserva a próxima tarefa pendente, devolvendo à fila as de lease expirado
+
+        Args:
+            tipos: tipos aceitos pelo worker, todos se None
+            worker: identificador do worker
+            lease: duração do lease em segundos
+
+        Returns:
+            tarefa reservada ou None se não houver tarefas pendentes
+        """
+
+    @abstractmethod
+    def renovar(self, tarefa: Tarefa, lease: float = LEASE_PADRAO) -> bool:
+        """ Renova o lease de uma tarefa (heartbeat)
+
+        Returns:
+            False se o lease foi perdido para outro worker
+        """
+
+    @abstractmethod
+    def concluir(self, tarefa: Tarefa, resultado=None) -> bool:
+        """ Marca a tarefa como concluída, guardando o resultado
+
+        Returns:
+            False se o lease foi perdido para outro worker (o resultado é descartado)
+        """
+
+    @abstractmethod
+    def falhar(self, tarefa: Tarefa, erro: str) -> bool:
+        """ Devolve a tarefa à fila ou a envia para as mortas se esgotou as tentativas
+
+        Returns:
+            False se o lease foi perdido para outro worker
+        """
+
+    @abstractmethod
+    def mortas(self) -> list[Tarefa]:
+        """Lista as tarefas da fila de mortas"""
+
+    @abstractmethod
+    def resultados(self, tipo: str):
+        """Itera (chave, resultado) das tarefas concluídas do tipo"""
+
+    @abstractmethod
+    def contagem(self) -> dict[str, int]:
+        """Quantidade de tarefas por estado"""
+
+
+class FilaSQLite(FilaTrabalho):
+    """Fila de trabalho local em SQLite, compartilhável entre processos da mesma máquina"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.local = threading.local()
+        with self._conexao() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tarefas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    chave TEXT UNIQUE,
+                    carga TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendente',
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    max_tentativas INTEGER NOT NULL,
+                    worker TEXT,
+                    lease_ate REAL,
+                    erro TEXT,
+                    resultado TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tarefas_estado ON tarefas (estado, tipo, id);
+                CREATE INDEX IF NOT EXISTS idx_tarefas_lease ON tarefas (estado, lease_ate);
+            """)
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def _tarefa(self, row) -> Tarefa:
+        return Tarefa(str(row["id"]), row["tipo"], json.loads(row["carga"]), row["tentativas"],
+                      row["max_tentativas"], row["worker"], row["lease_ate"], row["erro"])
+
+    def publicar(self, tipo, carga, chave=None, max_tentativas=MAX_TENTATIVAS_PADRAO):
+        cursor = self._conexao().execute(
+            "INSERT OR IGNORE INTO tarefas (tipo, chave, carga, max_tentativas) VALUES (?, ?, ?, ?)",
+            (tipo, chave, json.dumps(carga, ensure_ascii=False), max_tentativas))
+        return cursor.rowcount == 1
+
+    def reservar(self, tipos=None, worker=None, lease=LEASE_PADRAO):
+        conn = self._conexao()
+        agora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""UPDATE tarefas SET estado = CASE WHEN tentativas >= max_tentativas THEN 'morta' ELSE 'pendente' END,
+                            erro = 'lease expirado', worker = NULL, lease_ate = NULL
+                            WHERE estado = 'reservada' AND lease_ate < ?""", (agora,))
+            filtro, params = "", []
+            if tipos:
+                filtro = f" AND tipo IN ({','.join('?' * len(tipos))})"
+                params = list(tipos)
+            row = conn.execute(f"SELECT * FROM tarefas WHERE estado = 'pendente'{filtro} ORDER BY id LIMIT 1", params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("""UPDATE tarefas SET estado = 'reservada', tentativas = tentativas + 1, worker = ?, lease_ate = ?
+                            WHERE id = ?""", (worker or id_worker(), agora + lease, row["id"]))
+            row = conn.execute("SELECT * FROM tarefas WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+            return self._tarefa(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def renovar(self, tarefa, lease=LEASE_PADRAO):
+        cursor = self._conexao().execute(
+            "UPDATE tarefas SET lease_ate = ? WHERE id = ? AND estado = 'reservada' AND worker = ?",
+            (time.time() + lease, int(tarefa.id), tarefa.worker))
+        return cursor.rowcount == 1
+
+    def concluir(self, tarefa, resultado=None):
+        cursor = self._conexao().execute(
+            """UPDATE tarefas SET estado = 'concluida', lease_ate = NULL, erro = NULL, resultado = ?
+               WHERE id = ? AND estado = 'reservada' AND worker = ?""",
+            (json.dumps(resultado, ensure_ascii=False), int(tarefa.id), tarefa.worker))
+        return cursor.rowcount == 1
+
+    def falhar(self, tarefa, erro):
+        cursor = self._conexao().execute(
+            """UPDATE tarefas SET estado = CASE WHEN tentativas >= max_tentativas THEN 'morta' ELSE 'pendente' END,
+               erro = ?, worker = NULL, lease_ate = NULL WHERE id = ? AND estado = 'reservada' AND worker = ?""",
+            (str(erro), int(tarefa.id), tarefa.worker))
+        return cursor.rowcount == 1
+
+    def mortas(self):
+        rows = self._conexao().execute("SELECT * FROM tarefas WHERE estado = 'morta' ORDER BY id").fetchall()
+        return [self._tarefa(row) for row in rows]
+
+    def resultados(self, tipo):
+        cursor = self._conexao().execute(
+            "SELECT chave, resultado FROM tarefas WHERE estado = 'concluida' AND tipo = ? ORDER BY id", (tipo,))
+        for chave, resultado in cursor:
+            yield chave, json.loads(resultado)
+
+    def contagem(self):
+        rows = self._conexao().execute("SELECT estado, COUNT(*) FROM tarefas GROUP BY estado").fetchall()
+        return {estado: total for estado, total in rows}
+
+
+_LUA_PUBLICAR = """
+local ns, tipo, chave, carga, max_tentativas, tem_chave = ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5]), ARGV[6] == '1'
+if tem_chave and redis.call('HSETNX', ns .. ':chaves', chave, 1) == 0 then return 0 end
+local id = tostring(redis.call('INCR', ns .. ':seq'))
+local t = {id = id, tipo = tipo, chave = tem_chave and chave or cjson.null, carga = carga, estado = 'pendente',
+           tentativas = 0, max_tentativas = max_tentativas}
+redis.call('SADD', ns .. ':tipos', tipo)
+redis.call('HSET', ns .. ':tarefas', id, cjson.encode(t))
+redis.call('RPUSH', ns .. ':pendentes:' .. tipo, id)
+return 1
+"""
+
+_LUA_RESERVAR = """
+local ns, agora, lease_ate, worker = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4]
+local expiradas = redis.call('ZRANGEBYSCORE', ns .. ':leases', '-inf', agora)
+for _, id in ipairs(expiradas) do
+    redis.call('ZREM', ns .. ':leases', id)
+    local t = cjson.decode(redis.call('HGET', ns .. ':tarefas', id))
+    t.worker = cjson.null
+    t.lease_ate = cjson.null
+    t.erro = 'lease expirado'
+    if t.tentativas >= t.max_tentativas then
+        t.estado = 'morta'
+        redis.call('RPUSH', ns .. ':mortas', id)
+    else
+        t.estado = 'pendente'
+        redis.call('RPUSH', ns .. ':pendentes:' .. t.tipo, id)
+    end
+    redis.call('HSET', ns .. ':tarefas', id, cjson.encode(t))
+end
+for i = 5, #ARGV do
+    local id = redis.call('LPOP', ns .. ':pendentes:' .. ARGV[i])
+    if id then
+        local t = cjson.decode(redis.call('HGET', ns .. ':tarefas', id))
+        t.estado = 'reservada'
+        t.tentativas = t.tentativas + 1
+        t.worker = worker
+        t.lease_ate = lease_ate
+        local codificada = cjson.encode(t)
+        redis.call('HSET', ns .. ':tarefas', id, codificada)
+        redis.call('ZADD', ns .. ':leases', lease_ate, id)
+        return codificada
+    end
+end
+return false
+"""
+
+_LUA_RENOVAR = """
+local ns, id, worker, lease_ate = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+local bruta = redis.call('HGET', ns .. ':tarefas', id)
+if not bruta then return 0 end
+local t = cjson.decode(bruta)
+if t.estado ~= 'reservada' or t.worker ~= worker then return 0 end
+t.lease_ate = lease_ate
+redis.call('HSET', ns .. ':tarefas', id, cjson.encode(t))
+redis.call('ZADD', ns .. ':leases', lease_ate, id)
+return 1
+"""
+
+_LUA_CONCLUIR = """
+local ns, id, worker, resultado = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local bruta = redis.call('HGET', ns .. ':tarefas', id)
+if not bruta then return 0 end
+local t = cjson.decode(bruta)
+if t.estado ~= 'reservada' or t.worker ~= worker or not redis.call('ZSCORE', ns .. ':leases', id) then return 0 end
+redis.call('ZREM', ns .. ':leases', id)
+t.estado = 'concluida'
+t.lease_ate = cjson.null
+t.erro = cjson.null
+redis.call('HSET', ns .. ':tarefas', id, cjson.encode(t))
+redis.call('RPUSH', ns .. ':resultados:' .. t.tipo, '[' .. cjson.encode(t.chave) .. ',' .. resultado .. ']')
+return 1
+"""
+
+_LUA_FALHAR = """
+local ns, id, erro, worker = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local bruta = redis.call('HGET', ns .. ':tarefas', id)
+if not bruta then return 0 end
+local t = cjson.decode(bruta)
+if t.estado ~= 'reservada' or t.worker ~= worker then return 0 end
+if redis.call('ZREM', ns .. ':leases', id) == 0 then return 0 end
+t.worker = cjson.null
+t.lease_ate = cjson.null
+t.erro = erro
+if t.tentativas >= t.max_tentativas then
+    t.estado = 'morta'
+    redis.call('RPUSH', ns .. ':mortas', id)
+else
+    t.estado = 'pendente'
+    redis.call('RPUSH', ns .. ':pendentes:' .. t.tipo, id)
+end
+redis.call('HSET', ns .. ':tarefas', id, cjson.encode(t))
+return 1
+"""
+
+
+class FilaRedis(FilaTrabalho):
+    """ Fila de trabalho sobre o protocolo Redis, para vários workers em várias máquinas
+
+    Funciona com um servidor Redis (ou compatível, como Valkey/KeyDB) rodando
+    localmente ou na rede. As transições de estado rodam em scripts Lua para
+    serem atômicas entre workers.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", namespace: str = "pje_trt2", cliente=None):
+        if cliente is None:
+            import redis
+            cliente = redis.Redis.from_url(url)
+        self.redis = cliente
+        self.ns = namespace
+        self.tipos_conhecidos = f"{namespace}:tipos"
+        self._publicar = self.redis.register_script(_LUA_PUBLICAR)
+        self._reservar = self.redis.register_script(_LUA_RESERVAR)
+        self._renovar = self.redis.register_script(_LUA_RENOVAR)
+        self._concluir = self.redis.register_script(_LUA_CONCLUIR)
+        self._falhar = self.redis.register_script(_LUA_FALHAR)
+
+    def publicar(self, tipo, carga, chave=None, max_tentativas=MAX_TENTATIVAS_PADRAO):
+        # Deduplicação e enfileiramento no mesmo script: uma queda no meio não deixa a chave presa sem tarefa
+        return bool(self._publicar(args=[self.ns, tipo, "" if chave is None else chave,
+                                         json.dumps(carga, ensure_ascii=False), max_tentativas,
+                                         "0" if chave is None else "1"]))
+
+    def _tarefa(self, bruta) -> Tarefa:
+        t = json.loads(bruta)
+        return Tarefa(str(t["id"]), t["tipo"], json.loads(t["carga"]), t["tentativas"], t["max_tentativas"],
+                      t.get("worker"), t.get("lease_ate"), t.get("erro"))
+
+    def reservar(self, tipos=None, worker=None, lease=LEASE_PADRAO):
+        if not tipos:
+            tipos = sorted(t.decode() if isinstance(t, bytes) else t for t in self.redis.smembers(self.tipos_conhecidos))
+        agora = time.time()
+        bruta = self._reservar(args=[self.ns, agora, agora + lease, worker or id_worker(), *tipos])
+        return self._tarefa(bruta) if bruta else None
+
+    def renovar(self, tarefa, lease=LEASE_PADRAO):
+        return bool(self._renovar(args=[self.ns, tarefa.id, tarefa.worker, time.time() + lease]))
+
+    def concluir(self, tarefa, resultado=None):
+        # O resultado vai já serializado: o cjson do Lua não preserva a diferença entre {} e []
+        return bool(self._concluir(args=[self.ns, tarefa.id, tarefa.worker, json.dumps(resultado, ensure_ascii=False)]))
+
+    def falhar(self, tarefa, erro):
+        return bool(self._falhar(args=[self.ns, tarefa.id, str(erro), tarefa.worker]))
+
+    def mortas(self):
+        ids = self.redis.lrange(f"{self.ns}:mortas", 0, -1)
+        brutas = self.redis.hmget(f"{self.ns}:tarefas", ids) if ids else []
+        return [self._tarefa(bruta) for bruta in brutas if bruta]
+
+    def resultados(self, tipo):
+        for bruto in self.redis.lrange(f"{self.ns}:resultados:{tipo}", 0, -1):
+            chave, resultado = json.loads(bruto)
+            yield chave, resultado
+
+    def contagem(self):
+        contagem = {}
+        for bruta in self.redis.hvals(f"{self.ns}:tarefas"):
+            estado = json.loads(bruta)["estado"]
+            contagem[estado] = contagem.get(estado, 0) + 1
+        return contagem
+
+
+def abrir_fila(url: str) -> FilaTrabalho:
+    """ Abre a fila de trabalho indicada pela url
+
+    Args:
+        url: "sqlite:///caminho/fila.db", "redis://host:porta/db" ou um caminho de arquivo
+
+    Returns:
+        fila de trabalho
+    """
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return FilaRedis(url)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return FilaSQLite(url)
+
+
+class PublicadorDetalhes:
+    """Adaptador com a interface da FilaDetalhes que publica os linkIds na fila de trabalho"""
+
+    def __init__(self, fila: FilaTrabalho):
+        self.fila = fila
+
+    def iniciar(self):
+        pass
+
+    def adicionar(self, link_ids):
+        for item in link_ids:
+            link_id = item.get("linkId") if isinstance(item, dict) else item
+            self.fila.publicar("detalhe", {"linkId": link_id}, chave=f"detalhe:{link_id}")
+
+    def finalizar(self):
+        return {}
+
+
+def executar_worker(fila: FilaTrabalho, manipuladores: dict, worker: str = None, lease: float = LEASE_PADRAO,
+                    espera: float = 2.0, parar_quando_vazia: bool = False):
+    """ Loop de um worker: reserva, executa com heartbeat e conclui as tarefas
+
+    Args:
+        fila: fila de trabalho
+        manipuladores: mapa tipo -> função que recebe a carga e retorna o resultado
+        worker: identificador do worker
+        lease: duração do lease em segundos, renovado a cada terço desse tempo
+        espera: intervalo entre consultas quando não há tarefas
+        parar_quando_vazia: encerra o loop quando não houver tarefas pendentes
+    """
+    worker = worker or id_worker()
+    tipos = list(manipuladores)
+    while True:
+        tarefa = fila.reservar(tipos, worker, lease)
+        if tarefa is None:
+            if parar_quando_vazia:
+                return
+            time.sleep(espera)
+            continue
+
+        terminou = threading.Event()
+
+        def heartbeat():
+            while not terminou.wait(lease / 3):
+                if not fila.renovar(tarefa, lease):
+                    print(f"\033[1;31mLease perdido\033[0m para a tarefa {tarefa.id}")
+                    return
+
+        batimento = threading.Thread(target=heartbeat, daemon=True)
+        batimento.start()
+        try:
+            resultado = manipuladores[tarefa.tipo](tarefa.carga)
+            terminou.set()
+            batimento.join()
+            if not fila.concluir(tarefa, resultado):
+                print(f"\033[1;31mLease perdido\033[0m: resultado da tarefa {tarefa.id} descartado")
+        except Exception as e:
+            terminou.set()
+            batimento.join()
+            print(f"Erro na tarefa {tarefa.id} ({tarefa.tipo}): {e}")
+            fila.falhar(tarefa, e)
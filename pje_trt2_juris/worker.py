@@ -0,0 +1,85 @@
+import argparse
+from bot_pje_trt2_juris import Bot_trt2_pje_juris, PASTA_DOCUMENTOS
+from paths import ARQUIVO_FILA
+from pdf_proc import PdfProcessor, salvar_dados_especificos
+from storage import ArmazemSegmentos
+from work_queue import abrir_fila, executar_worker, PublicadorDetalhes, LEASE_PADRAO
+
+
+def publicar_pesquisa(fila, assunto: str, procs_por_pagina: int, max_paginas: int) -> int:
+    """ Publica uma tarefa por página da pesquisa
+
+    Returns:
+        quantidade de páginas novas publicadas
+    """
+    publicadas = 0
+    for pagina in range(1, max_paginas + 1):
+        carga = {"assunto": assunto, "procs_por_pagina": int(procs_por_pagina), "pagina": pagina}
+        if fila.publicar("pagina", carga, chave=f"pagina:{assunto}:{procs_por_pagina}:{pagina}"):
+            publicadas += 1
+    return publicadas
+
+
+def criar_manipuladores(fila, max_retries: int = 5) -> dict:
+    """Cria as funções que executam as tarefas de página e de detalhe"""
+    armazem = ArmazemSegmentos(PASTA_DOCUMENTOS)
+
+    def tarefa_pagina(carga):
+        bot = Bot_trt2_pje_juris(carga["assunto"], carga["procs_por_pagina"], fila_detalhes=PublicadorDetalhes(fila),
+                                 armazem=armazem)
+        try:
+            for _ in range(max_retries):
+                if not bot.url_post:
+                    bot.fazer_requisicao_captcha()
+                if bot.url_post and bot.enviar_documento(carga["pagina"]):
+                    print(f"Página \033[34m{carga['pagina']}\033[0m processada com sucesso!")
+                    return {"pagina": carga["pagina"]}
+        finally:
+            armazem.descarregar()
+        raise RuntimeError("Falha em resolver o CAPTCHA repetidamente")
+
+    def tarefa_detalhe(carga):
+        print(f"\nProcessando ID: {carga['linkId']}")
+        resultado = PdfProcessor(carga["linkId"]).processar()
+        if resultado is None:
+            raise RuntimeError(f"Sem dados para o linkId {carga['linkId']}")
+        return resultado
+
+    return {"pagina": tarefa_pagina, "detalhe": tarefa_detalhe}
+
+
+def coletar_resultados(fila) -> dict:
+    """Reúne os dados específicos das tarefas de detalhe concluídas, por linkId"""
+    return {chave.split(":", 1)[1]: resultado for chave, resultado in fila.resultados("detalhe")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker distribuído do PJE TRT2")
+    parser.add_argument("--fila", default=ARQUIVO_FILA, help="sqlite:///arquivo.db, caminho do arquivo ou redis://host:porta/db")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    pub = sub.add_parser("publicar", help="publica as páginas de uma pesquisa")
+    pub.add_argument("assunto")
+    pub.add_argument("--procs-por-pagina", type=int, default=10)
+    pub.add_argument("--max-paginas", type=int, default=10)
+
+    trab = sub.add_parser("trabalhar", help="executa tarefas até a fila esvaziar (ou para sempre)")
+    trab.add_argument("--tipos", nargs="*", default=["pagina", "detalhe"])
+    trab.add_argument("--lease", type=float, default=LEASE_PADRAO)
+    trab.add_argument("--continuo", action="store_true", help="continua aguardando novas tarefas")
+
+    sub.add_parser("coletar", help="grava os dados específicos concluídos e mostra a fila de mortas")
+
+    args = parser.parse_args()
+    fila = abrir_fila(args.fila)
+
+    if args.comando == "publicar":
+        print(f"{publicar_pesquisa(fila, args.assunto, args.procs_por_pagina, args.max_paginas)} páginas publicadas")
+    elif args.comando == "trabalhar":
+        manipuladores = {tipo: f for tipo, f in criar_manipuladores(fila).items() if tipo in args.tipos}
+        executar_worker(fila, manipuladores, lease=args.lease, parar_quando_vazia=not args.continuo)
+    elif args.comando == "coletar":
+        salvar_dados_especificos(coletar_resultados(fila))
+        for tarefa in fila.mortas():
+            print(f"\033[1;31mMorta\033[0m {tarefa.tipo} {tarefa.carga}: {tarefa.erro}")
+    print(fila.contagem())